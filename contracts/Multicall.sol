@@ -0,0 +1,30 @@
+pragma solidity 0.6.2;
+pragma experimental ABIEncoderV2;
+
+
+contract Multicall {
+    struct Call {
+        address target;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    function tryAggregate(Call[] memory calls)
+        public
+        view
+        returns (uint256 blockNumber, Result[] memory returnData)
+    {
+        blockNumber = block.number;
+        returnData = new Result[](calls.length);
+        for (uint256 i = 0; i < calls.length; i++) {
+            (bool success, bytes memory ret) = calls[i].target.staticcall(
+                calls[i].callData
+            );
+            returnData[i] = Result(success, ret);
+        }
+    }
+}
@@ -0,0 +1,28 @@
+"""asyncio variants of the hmt_escrow APIs.
+
+``get_w3`` returns an asyncio ``Web3`` sending its requests over a pooled
+``aiohttp`` session, and the transactions, storage calls and ``AsyncJob``
+methods are coroutines. A single event loop can drive many escrows at once:
+
+    jobs = await bounded_gather(
+        AsyncJob.create(credentials, manifest, factory_addr) for manifest in manifests
+    )
+    await bounded_gather(job.launch(pub_key) for job in jobs)
+
+Call ``close_sessions`` before the event loop is closed.
+"""
+from hmt_escrow.aio.eth_bridge import (
+    AsyncTransactionHandle,
+    call,
+    deploy_factory,
+    get_w3,
+    handle_transaction,
+    handle_transaction_with_retry,
+    submit_transaction,
+    wait_for_receipt,
+    wait_for_transaction,
+)
+from hmt_escrow.aio.job import AsyncJob
+from hmt_escrow.aio.providers import close_sessions
+from hmt_escrow.aio.storage import download, upload
+from hmt_escrow.aio.utils import bounded_gather
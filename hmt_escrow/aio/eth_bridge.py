@@ -0,0 +1,563 @@
+"""asyncio variant of ``hmt_escrow.eth_bridge``.
+
+Contract handles are the ones of ``hmt_escrow.eth_bridge``: they are only used
+to encode the calls and decode the results and events, the requests themselves
+go through the asyncio ``Web3`` of the endpoint.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.contract import ContractConstructor, ContractFunction
+from web3.exceptions import TimeExhausted
+from web3.types import TxReceipt
+
+from hmt_escrow.aio.providers import get_web3
+from hmt_escrow.aio.receipts import get_receipt_waiter
+from hmt_escrow.eth_bridge import (
+    CONTRACT_FOLDER,
+    bump_fees,
+    GAS_LIMIT,
+    HMTOKEN_ADDR,
+    WEB3_TIMEOUT,
+    Retry,
+    get_contract_interface,
+    get_escrow,
+    get_factory,
+    get_hmtoken,
+    out_of_estimated_gas,
+)
+from hmt_escrow.eth_bridge import get_w3 as get_sync_w3
+from hmt_escrow.gas import GAS_ESTIMATION, GAS_ESTIMATOR
+from hmt_escrow.keyring import get_keyring
+from hmt_escrow.nonce import NonceManager, get_nonce_manager
+from hmt_escrow.rpc import decode_result, encode_call
+
+LOG = logging.getLogger("hmt_escrow.aio.eth_bridge")
+
+# Chain ids keyed by web3 instance, they never change for an endpoint.
+_CHAIN_IDS: Dict[Web3, int] = {}
+
+
+def get_w3(hmt_server_addr: str = None) -> Web3:
+    """Returns the shared asyncio web3 instance of the ethereum node.
+
+    >>> w3 = get_w3("http://localhost:8545")
+    >>> w3.eth.is_async
+    True
+
+    Args:
+        hmt_server_addr (str): the HTTP(S) address of the node, defaults to HMT_ETH_SERVER.
+
+    Returns:
+        Web3: the shared web3 instance, its ``eth`` module is ``AsyncEth``.
+
+    """
+    return get_web3(
+        hmt_server_addr or os.getenv("HMT_ETH_SERVER", "http://localhost:8545")
+    )
+
+
+async def call(
+    contract_function: ContractFunction,
+    gas_payer: str,
+    gas: int = GAS_LIMIT,
+    hmt_server_addr: str = None,
+) -> Any:
+    """Calls a view function of a contract.
+
+    Args:
+        contract_function (ContractFunction): the function with its arguments,
+            e.g. ``escrow.functions.status()``.
+        gas_payer (str): the ethereum address calling the contract.
+        gas (int): maximum amount of gas the caller is ready to pay.
+        hmt_server_addr (str): the address of the ethereum node.
+
+    Returns:
+        Any: the decoded return value, a tuple when the function returns several values.
+
+    """
+    w3 = get_w3(hmt_server_addr)
+    result = await w3.manager.coro_request(
+        "eth_call",
+        [encode_call(contract_function, gas_payer, gas or GAS_LIMIT), "latest"],
+    )
+    return decode_result(w3, contract_function, result)
+
+
+class AsyncTransactionHandle(object):
+    """A broadcast transaction whose receipt may not be available yet.
+
+    Returned by ``submit_transaction``, works like
+    ``hmt_escrow.eth_bridge.TransactionHandle``: ``speed_up`` replaces the
+    transaction by the same one, same nonce, with fees bumped by ``FEE_BUMP``
+    up to the caps of ``bump_fees``, and ``result`` waits for whichever of them
+    is mined.
+    """
+
+    def __init__(
+        self,
+        w3: Web3,
+        txn_hash: bytes,
+        nonce: int,
+        nonces: NonceManager,
+        txn_dict: Dict[str, Any] = None,
+        private_key: str = None,
+    ):
+        """Inits
+
+        Args:
+            w3: the asyncio web3 instance the transaction was sent with.
+            txn_hash: the hash of the broadcast transaction.
+            nonce: the nonce of the transaction.
+            nonces: the nonce manager the nonce was reserved from.
+            txn_dict: the unsigned transaction, needed to replace it.
+            private_key: the key the transaction was signed with, needed to replace it.
+        """
+        self.w3 = w3
+        self.txn_hash = HexBytes(txn_hash)
+        self.hashes = [self.txn_hash]
+        self.nonce = nonce
+        self._nonces = nonces
+        self._txn_dict = txn_dict
+        self._private_key = private_key
+        self._bumps = 0
+        self._futures: Dict[HexBytes, asyncio.Future] = {}
+        self._waiter = get_receipt_waiter(w3)
+        self._watch(self.txn_hash)
+
+    @property
+    def gas(self) -> Optional[int]:
+        """The gas the transaction was sent with, None if it is unknown."""
+        return self._txn_dict.get("gas") if self._txn_dict else None
+
+    def done(self) -> bool:
+        """Returns whether the transaction has been mined, without waiting."""
+        return any(
+            future.done() and not future.cancelled()
+            for future in self._futures.values()
+        )
+
+    async def result(self, timeout: float = None) -> TxReceipt:
+        """Waits for the transaction or one of its replacements to be mined.
+
+        Args:
+            timeout: seconds to wait for the receipt, defaults to WEB3_TIMEOUT.
+
+        Returns:
+            AttributeDict: returns the transaction receipt.
+
+        Raises:
+            TimeExhausted: if waiting for the transaction receipt times out.
+
+        """
+        for txn_hash in self.hashes:
+            if txn_hash not in self._futures or self._futures[txn_hash].cancelled():
+                self._watch(txn_hash)
+
+        timeout = WEB3_TIMEOUT if timeout is None else timeout
+        done, _ = await asyncio.wait(
+            list(self._futures.values()),
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        self._forget()
+        if not done:
+            # The node might have dropped the transaction, it knows the next nonce.
+            pending = await _pending_count(self.w3, self._nonces.address)
+            self._nonces.resync(pending)
+            raise TimeExhausted(
+                f"Transaction {self.txn_hash.hex()} is not in the "
+                f"chain after {timeout} seconds"
+            )
+
+        receipt = done.pop().result()
+        self.txn_hash = HexBytes(receipt.get("transactionHash", self.txn_hash))
+        return receipt
+
+    async def speed_up(self) -> HexBytes:
+        """Broadcasts a replacement of the transaction with bumped fees.
+
+        Returns:
+            HexBytes: the hash of the replacement, or of the current
+            transaction if the node refused the replacement, e.g. because
+            the transaction was mined meanwhile, or if its fees reached
+            their cap.
+
+        Raises:
+            ValueError: if the transaction was not signed by ``submit_transaction``.
+
+        """
+        if self._txn_dict is None or self._private_key is None:
+            raise ValueError("Only locally signed transactions can be replaced.")
+
+        txn_dict = bump_fees(self._txn_dict, self._bumps)
+        if txn_dict is None:
+            LOG.info(f"Not replacing {self.txn_hash.hex()}, its fees are capped")
+            return self.txn_hash
+        signed_txn = (
+            get_keyring().key(self._private_key).account.sign_transaction(txn_dict)
+        )
+
+        try:
+            txn_hash = await _send_raw_transaction(self.w3, signed_txn.rawTransaction)
+        except ValueError as e:
+            LOG.info(f"Replacement of {self.txn_hash.hex()} refused: {e}")
+            return self.txn_hash
+
+        LOG.info(f"Replaced {self.txn_hash.hex()} with {txn_hash.hex()}")
+        self._txn_dict = txn_dict
+        self._bumps += 1
+        self.txn_hash = txn_hash
+        self.hashes.append(txn_hash)
+        self._watch(txn_hash)
+        return txn_hash
+
+    async def abandon(self):
+        """Gives up on the transaction once its last wait timed out.
+
+        Same as ``hmt_escrow.eth_bridge.TransactionHandle.abandon``: the nonce
+        of a transaction dropped by the node is released.
+        """
+        self._forget()
+        address = self._nonces.address
+        try:
+            pending = await _pending_count(self.w3, address)
+            known = await asyncio.gather(
+                *[
+                    self.w3.manager.coro_request(
+                        "eth_getTransactionByHash", [txn_hash.hex()]
+                    )
+                    for txn_hash in self.hashes
+                ]
+            )
+            if pending <= self.nonce and not any(known):
+                LOG.info(
+                    f"{self.txn_hash.hex()} was dropped, reusing nonce {self.nonce} of {address}"
+                )
+                self._nonces.release(self.nonce)
+            self._nonces.resync(pending)
+        except Exception as e:
+            LOG.debug(f"Failed to check whether {self.txn_hash.hex()} was dropped: {e}")
+
+    def _forget(self):
+        # Only one transaction of the nonce is mined, the others never will be.
+        for txn_hash in self.hashes:
+            self._waiter.forget(txn_hash)
+
+    def _watch(self, txn_hash: HexBytes):
+        future = self._waiter.watch(txn_hash)
+        future.add_done_callback(self._mined)
+        self._futures[txn_hash] = future
+
+    def _mined(self, future: asyncio.Future):
+        if not future.cancelled():
+            self._nonces.confirm(self.nonce)
+
+
+async def submit_transaction(txn_func, *args, **kwargs) -> AsyncTransactionHandle:
+    """Locally signs, builds and sends a transaction that updates the contract
+    state, without waiting for it to be mined.
+
+    The receipt waiter of the endpoint starts watching the transaction right
+    away, the ``result`` of the returned handle is its receipt.
+
+    Args:
+        txn_func: the transaction function to be handled.
+
+        \*args: all the arguments the function takes.
+
+        \*\*kwargs: the transaction data used to complete the transaction.
+
+    Returns:
+        AsyncTransactionHandle: the handle of the broadcast transaction.
+
+    """
+    gas_payer = kwargs["gas_payer"]
+    gas_payer_priv = kwargs["gas_payer_priv"]
+    gas = kwargs["gas"]
+    hmt_server_addr = kwargs.get("hmt_server_addr")
+
+    w3 = get_w3(hmt_server_addr)
+    txn = txn_func(*args)
+    txn_dict = _encode_transaction(txn)
+    if kwargs.get("estimate_gas", GAS_ESTIMATION):
+        gas = await _estimate_gas(
+            w3, txn, args, dict(txn_dict, **{"from": gas_payer}), gas
+        )
+    txn_dict.update({"from": gas_payer, "gas": gas, "value": 0})
+    fee_strategy = kwargs.get("fee_strategy")
+    txn_dict["chainId"], fees = await asyncio.gather(
+        _chain_id(w3),
+        fee_strategy.fees_async(w3) if fee_strategy else _legacy_fees(w3),
+    )
+    txn_dict.update(fees or await _legacy_fees(w3))
+
+    nonces = get_nonce_manager(w3, gas_payer)
+    pending = await _pending_count(w3, gas_payer) if nonces.needs_sync else None
+    nonce = nonces.reserve(pending)
+    txn_dict["nonce"] = nonce
+
+    try:
+        signed_txn = (
+            get_keyring().key(gas_payer_priv).account.sign_transaction(txn_dict)
+        )
+    except Exception as e:
+        nonces.release(nonce)
+        raise e
+
+    try:
+        txn_hash = await _send_raw_transaction(w3, signed_txn.rawTransaction)
+    except Exception as e:
+        # The node rejected the transaction, it knows the next nonce.
+        nonces.release(nonce)
+        nonces.resync(await _pending_count(w3, gas_payer))
+        raise e
+
+    return AsyncTransactionHandle(
+        w3, txn_hash, nonce, nonces, txn_dict=txn_dict, private_key=gas_payer_priv
+    )
+
+
+async def wait_for_receipt(
+    txn_hash, timeout: float = WEB3_TIMEOUT, **kwargs
+) -> TxReceipt:
+    """Waits for a transaction to be mined, knowing only its hash.
+
+    The ``result`` of the handle returned by ``submit_transaction`` also
+    follows the replacements of the transaction.
+
+    Args:
+        txn_hash: the hash of the broadcast transaction.
+
+        timeout (float): seconds to wait for the receipt.
+
+        \*\*kwargs: the transaction data the transaction was sent with.
+
+    Returns:
+        AttributeDict: returns the transaction receipt.
+
+    Raises:
+        TimeExhausted: if waiting for the transaction receipt times out.
+
+    """
+    gas_payer = kwargs["gas_payer"]
+    w3 = get_w3(kwargs.get("hmt_server_addr"))
+    try:
+        return await get_receipt_waiter(w3).wait(txn_hash, timeout)
+    except Exception as e:
+        # The node might have dropped the transaction, it knows the next nonce.
+        get_nonce_manager(w3, gas_payer).resync(await _pending_count(w3, gas_payer))
+        raise e
+
+
+async def handle_transaction(txn_func, *args, **kwargs) -> TxReceipt:
+    """Handles a transaction that updates the contract state by locally
+    signing, building, sending the transaction and returning a transaction
+    receipt.
+
+    Args:
+        txn_func: the transaction function to be handled.
+
+        \*args: all the arguments the function takes.
+
+        \*\*kwargs: the transaction data used to complete the transaction.
+
+    Returns:
+        AttributeDict: returns the transaction receipt.
+
+    Raises:
+        TimeExhausted: if waiting for the transaction receipt times out.
+
+    """
+    handle = await submit_transaction(txn_func, *args, **kwargs)
+    try:
+        return await handle.result()
+    except TimeExhausted as e:
+        await handle.abandon()
+        raise e
+
+
+async def wait_for_transaction(
+    handle: AsyncTransactionHandle, retries: int = 0
+) -> TxReceipt:
+    """Waits for a submitted transaction, replacing it with bumped fees every
+    time the wait times out.
+
+    Same as ``hmt_escrow.eth_bridge.wait_for_transaction``.
+
+    Args:
+        handle (AsyncTransactionHandle): the handle returned by ``submit_transaction``.
+
+        retries (int): number of replacements before giving up.
+
+    Returns:
+        AttributeDict: returns the transaction receipt.
+
+    Raises:
+        TimeExhausted: if the transaction or its replacements are still not
+            mined after the last wait. They might still be mined later.
+
+    """
+    for i in range(retries + 1):
+        try:
+            return await handle.result()
+        except TimeExhausted as e:
+            if i == retries:
+                LOG.debug(f"giving up on transaction after {i} replacements")
+                await handle.abandon()
+                raise e
+            LOG.debug(f"(x{i + 1}) wait_for_transaction: {e}. Replacing it...")
+            try:
+                await handle.speed_up()
+            except Exception as speed_up_error:
+                LOG.debug(f"Failed to replace the transaction: {speed_up_error}")
+
+    raise Exception("give up on wait_for_transaction")
+
+
+async def handle_transaction_with_retry(
+    txn_func, retry=Retry(), *args, **kwargs
+) -> TxReceipt:
+    """Handle transaction
+
+    Same as ``handle_transaction`` but with retry and backoff.
+
+    Like ``hmt_escrow.eth_bridge.handle_transaction_with_retry``, a transaction
+    still pending when the wait times out is replaced with bumped fees, same
+    nonce, and never sent again with a new one. Only failures to send a
+    transaction lead to a new one, after the backoff delay, and transactions
+    which ran out of their estimated gas, with their gas limit.
+
+    Args:
+        txn_func: the transaction function to be handled.
+
+        retry: Retry object containing retrying parameters.
+
+        \*args: all the arguments the function takes.
+
+        \*\*kwargs: the transaction data used to complete the transaction.
+
+    Returns:
+        AttributeDict: returns the transaction receipt.
+
+    """
+
+    wait_time = retry.delay
+    handle = None
+
+    for i in range(retry.retries + 1):
+        try:
+            if handle is None:
+                handle = await submit_transaction(txn_func, *args, **kwargs)
+            receipt = await handle.result()
+        except TimeExhausted as e:
+            if i == retry.retries:
+                LOG.debug(f"giving up on transaction after {i} retries")
+                await handle.abandon()
+                raise e
+            LOG.debug(f"(x{i + 1}) handle_transaction: {e}. Replacing it...")
+            try:
+                await handle.speed_up()
+            except Exception as speed_up_error:
+                LOG.debug(f"Failed to replace the transaction: {speed_up_error}")
+        except Exception as e:
+            handle = None
+            if i == retry.retries:
+                LOG.debug(f"giving up on transaction after {i} retries")
+                raise e
+            else:
+                LOG.debug(
+                    f"(x{i + 1}) handle_transaction: {e}. Retrying after {wait_time} sec..."
+                )
+                await asyncio.sleep(wait_time)
+                wait_time *= retry.backoff
+        else:
+            if out_of_estimated_gas(handle, receipt, txn_func, *args, **kwargs):
+                return await handle_transaction_with_retry(
+                    txn_func, retry, *args, **dict(kwargs, estimate_gas=False)
+                )
+            return receipt
+
+    raise Exception("give up on handle_transaction")
+
+
+async def deploy_factory(
+    gas: int = GAS_LIMIT,
+    hmt_server_addr: str = None,
+    hmtoken_addr: str = None,
+    **credentials,
+) -> str:
+    """Deploy an EscrowFactory solidity contract to the ethereum network.
+
+    Args:
+        gas (int): maximum amount of gas the caller is ready to pay.
+
+        hmt_server_addr (str): the address of the ethereum node.
+
+    Returns
+        str: returns the contract address of the newly deployed factory.
+
+    """
+    contract_interface = get_contract_interface(
+        "{}/EscrowFactory.sol:EscrowFactory".format(CONTRACT_FOLDER)
+    )
+    factory = get_sync_w3(hmt_server_addr).eth.contract(
+        abi=contract_interface["abi"], bytecode=contract_interface["bin"]
+    )
+
+    txn_info = {
+        "gas_payer": credentials["gas_payer"],
+        "gas_payer_priv": credentials["gas_payer_priv"],
+        "gas": gas or GAS_LIMIT,
+        "hmt_server_addr": hmt_server_addr,
+    }
+    txn_receipt = await handle_transaction(
+        factory.constructor, hmtoken_addr or HMTOKEN_ADDR, **txn_info
+    )
+    return str(txn_receipt["contractAddress"])
+
+
+def _encode_transaction(txn) -> Dict[str, Any]:
+    if isinstance(txn, ContractConstructor):
+        return {"data": txn._encode_data_in_transaction()}
+    return {"to": txn.address, "data": txn._encode_transaction_data()}
+
+
+async def _estimate_gas(w3: Web3, txn, args, txn_dict: Dict, gas_limit: int) -> int:
+    gas = GAS_ESTIMATOR.cached(txn, args)
+    if gas is None:
+        estimate = await _request_int(w3, "eth_estimateGas", [txn_dict])
+        gas = GAS_ESTIMATOR.record(txn, args, estimate)
+    return GAS_ESTIMATOR.check_limit(txn, gas, gas_limit)
+
+
+async def _legacy_fees(w3: Web3) -> Dict[str, int]:
+    return {"gasPrice": await _request_int(w3, "eth_gasPrice", [])}
+
+
+async def _chain_id(w3: Web3) -> int:
+    chain_id = _CHAIN_IDS.get(w3)
+    if chain_id is None:
+        chain_id = await _request_int(w3, "eth_chainId", [])
+        _CHAIN_IDS[w3] = chain_id
+    return chain_id
+
+
+async def _send_raw_transaction(w3: Web3, raw_transaction: bytes) -> HexBytes:
+    return HexBytes(
+        await w3.manager.coro_request(
+            "eth_sendRawTransaction", [HexBytes(raw_transaction).hex()]
+        )
+    )
+
+
+async def _pending_count(w3: Web3, address: str) -> int:
+    return await _request_int(w3, "eth_getTransactionCount", [address, "pending"])
+
+
+async def _request_int(w3: Web3, method: str, params: List[Any]) -> int:
+    return int(await w3.manager.coro_request(method, params), 16)
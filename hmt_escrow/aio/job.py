@@ -0,0 +1,560 @@
+import asyncio
+import logging
+from decimal import Decimal
+from enum import Enum
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Awaitable, Dict, List, Optional, Tuple
+
+from web3 import Web3
+from web3.contract import Contract
+from web3.exceptions import TimeExhausted
+
+from hmt_escrow import utils
+from hmt_escrow.aio import storage
+from hmt_escrow.aio.eth_bridge import (
+    call,
+    deploy_factory,
+    handle_transaction_with_retry,
+)
+from hmt_escrow.aio.utils import get_hmt_balance
+from hmt_escrow.eth_bridge import (
+    HMTOKEN_ADDR,
+    Retry,
+    get_escrow,
+    get_factory,
+    get_hmtoken,
+)
+from hmt_escrow.eth_bridge import get_w3 as get_sync_w3
+from hmt_escrow.fees import FeeStrategy
+from hmt_escrow.keyring import get_keyring
+from hmt_escrow.job import GAS_LIMIT, RaffleTxn, Status
+from hmt_escrow.lazy import lazy_import
+from hmt_escrow.payouts import BULK_MAX_RECIPIENTS, ChunkedPayout, ProgressStore
+from hmt_escrow.storage import get_key_from_url, get_public_bucket_url
+
+if TYPE_CHECKING:
+    from basemodels import Manifest
+
+# basemodels is only needed to validate the downloaded manifests.
+basemodels = lazy_import("basemodels")
+
+LOG = logging.getLogger("hmt_escrow.aio.job")
+
+
+async def _timed(timings: Dict[str, float], step: str, awaitable: Awaitable) -> Any:
+    """Awaits awaitable and adds the seconds it took to timings[step]."""
+    start = perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[step] = timings.get(step, 0.0) + perf_counter() - start
+
+
+class AsyncJob:
+    """asyncio variant of ``hmt_escrow.job.Job``.
+
+    The methods are coroutines mirroring the ones of ``Job``, so one event
+    loop can drive many jobs at the same time, e.g. with
+    ``hmt_escrow.aio.utils.bounded_gather``. As setting up a job talks to the
+    network, jobs are created with ``await AsyncJob.create(...)``, which takes
+    the same arguments as ``Job``.
+
+    Attributes:
+        serialized_manifest (Dict[str, Any]): a dict representation of the Manifest model.
+        factory_contract (Contract): the factory contract used to create Job's escrow contract.
+        job_contract (Contract): the escrow contract of the Job.
+        gas_payer (str): an ethereum address paying for the gas costs.
+        gas_payer_priv (str): the private key of the gas_payer.
+        amount (Decimal): an amount to be stored in the escrow contract.
+        manifest_url (str): the location of the serialized manifest in IPFS.
+        manifest_hash (str): SHA-1 hashed version of the serialized manifest.
+
+    """
+
+    def __init__(
+        self,
+        credentials: Dict[str, str],
+        multi_credentials: List[Tuple] = [],
+        retry: Retry = None,
+        hmt_server_addr: str = None,
+        hmtoken_addr: str = None,
+        gas_limit: int = GAS_LIMIT,
+        fee_strategy: FeeStrategy = None,
+    ):
+        """Validates the credentials. Use ``create`` to get a usable job.
+
+        Args:
+            credentials (Dict[str, str]): an ethereum address and its private key.
+            multi_credentials (List[Tuple]): a list of tuples with ethereum address, private key pairs.
+            fee_strategy (FeeStrategy): decides the fees of the Job's transactions,
+                e.g. a ``FeeHistoryOracle``. Web3 defaults are used if None.
+
+        Raises:
+            ValueError: if the credentials are not valid.
+
+        """
+        self.retry = Retry() if retry is None else retry
+
+        if not self._eth_addr_valid(
+            credentials["gas_payer"], credentials["gas_payer_priv"]
+        ):
+            raise ValueError("Given private key doesn't match the ethereum address.")
+
+        self.gas_payer = Web3.toChecksumAddress(credentials["gas_payer"])
+        self.gas_payer_priv = credentials["gas_payer_priv"]
+        self.multi_credentials = self._validate_multi_credentials(multi_credentials)
+        self.hmt_server_addr = hmt_server_addr
+        self.hmtoken_addr = HMTOKEN_ADDR if hmtoken_addr is None else hmtoken_addr
+        self.gas = gas_limit or GAS_LIMIT
+        self.fee_strategy = fee_strategy
+
+    @classmethod
+    async def create(
+        cls,
+        credentials: Dict[str, str],
+        escrow_manifest: "Manifest" = None,
+        factory_addr: str = None,
+        escrow_addr: str = None,
+        multi_credentials: List[Tuple] = [],
+        retry: Retry = None,
+        hmt_server_addr: str = None,
+        hmtoken_addr: str = None,
+        gas_limit: int = GAS_LIMIT,
+        fee_strategy: FeeStrategy = None,
+    ) -> "AsyncJob":
+        """Creates a new Job from a manifest or accesses an existing one, see ``Job``.
+
+        Args:
+            credentials (Dict[str, str]): an ethereum address and its private key.
+            escrow_manifest (Manifest): an instance of the Manifest class.
+            factory_addr (str): an ethereum address of the factory.
+            escrow_addr (str): an ethereum address of an existing escrow address.
+            multi_credentials (List[Tuple]): a list of tuples with ethereum address, private key pairs.
+            fee_strategy (FeeStrategy): decides the fees of the Job's transactions,
+                e.g. a ``FeeHistoryOracle``. Web3 defaults are used if None.
+
+        Returns:
+            AsyncJob: the initialized job.
+
+        Raises:
+            ValueError: if the credentials or the arguments are not valid.
+
+        """
+        job = cls(
+            credentials,
+            multi_credentials=multi_credentials,
+            retry=retry,
+            hmt_server_addr=hmt_server_addr,
+            hmtoken_addr=hmtoken_addr,
+            gas_limit=gas_limit,
+            fee_strategy=fee_strategy,
+        )
+
+        # Initialize a new Job.
+        if not escrow_addr and escrow_manifest:
+            job.factory_contract = await job._init_factory(factory_addr, credentials)
+            job._init_job(escrow_manifest)
+
+        # Access an existing Job.
+        elif escrow_addr and factory_addr and not escrow_manifest:
+            if not await job._factory_contains_escrow(escrow_addr, factory_addr):
+                raise ValueError(
+                    "Given factory address doesn't contain the given escrow address."
+                )
+            await job._access_job(factory_addr, escrow_addr, **credentials)
+
+        # Handle incorrect usage
+        else:
+            raise ValueError("Job instantiation wrong, double-check arguments.")
+
+        return job
+
+    async def launch(self, pub_key: bytes) -> bool:
+        """Launches an escrow contract to the network, uploads the manifest
+        to S3 with the public key of the Reputation Oracle and stores
+        the S3 url to the escrow contract.
+
+        The manifest is uploaded while the escrow is created, and the seconds
+        spent in each step are kept in ``launch_timings``, like ``Job.launch``.
+
+        Args:
+            pub_key (bytes): the public key of the Reputation Oracle.
+
+        Returns:
+            bool: returns True if Job initialization and Ethereum and IPFS transactions succeed.
+
+        """
+        if hasattr(self, "job_contract"):
+            raise AttributeError("The escrow has been already deployed.")
+
+        timings: Dict[str, float] = {}
+        self.launch_timings = timings
+        start = perf_counter()
+
+        # The manifest doesn't depend on the escrow, it is uploaded meanwhile.
+        upload_task = asyncio.ensure_future(
+            _timed(timings, "upload", storage.upload(self.serialized_manifest, pub_key))
+        )
+
+        trusted_handlers = [addr for addr, priv_key in self.multi_credentials]
+        try:
+            txn = await _timed(
+                timings,
+                "create_escrow",
+                self._transact(
+                    self.factory_contract.functions.createEscrow,
+                    [trusted_handlers],
+                    "Contract creation",
+                ),
+            )
+        except BaseException as e:
+            upload_task.cancel()
+            raise e
+
+        if not txn["txn_succeeded"]:
+            upload_task.cancel()
+            raise Exception("Unable to create escrow")
+
+        events = self.factory_contract.events.Launched().processReceipt(
+            txn["tx_receipt"]
+        )
+        job_addr = events[0].get("args", {}).get("escrow", "")
+        LOG.info("Job's escrow contract deployed to:{}".format(job_addr))
+        self.job_contract = get_escrow(job_addr, self.hmt_server_addr)
+
+        (hash_, manifest_url) = await _timed(timings, "upload_wait", upload_task)
+        self.manifest_url = manifest_url
+        self.manifest_hash = hash_
+        launched = await _timed(timings, "verify", self._launched())
+        timings["total"] = perf_counter() - start
+        LOG.debug(f"Launched {job_addr} in {timings}")
+        return launched
+
+    async def _launched(self) -> bool:
+        return await self.status() == Status.Launched and await self.balance() == 0
+
+    async def setup(self, sender: str = None) -> bool:
+        """Sets the escrow contract to be ready to receive answers from the Recording Oracle.
+
+        Returns:
+            bool: returns True if Job is in Pending state.
+
+        """
+        if not hasattr(self, "job_contract"):
+            return False
+
+        reputation_oracle_stake = int(
+            Decimal(self.serialized_manifest["oracle_stake"]) * 100
+        )
+        recording_oracle_stake = int(
+            Decimal(self.serialized_manifest["oracle_stake"]) * 100
+        )
+        reputation_oracle = str(self.serialized_manifest["reputation_oracle_addr"])
+        recording_oracle = str(self.serialized_manifest["recording_oracle_addr"])
+        hmt_amount = int(self.amount * 10**18)
+        hmtoken_contract = get_hmtoken(self.hmtoken_addr, self.hmt_server_addr)
+
+        txn_event = "Transferring HMT"
+        if sender:
+            txn_func = hmtoken_contract.functions.transferFrom
+            func_args = [sender, self.job_contract.address, hmt_amount]
+        else:
+            txn_func = hmtoken_contract.functions.transfer
+            func_args = [self.job_contract.address, hmt_amount]
+
+        balance = await get_hmt_balance(
+            self.gas_payer, self.hmtoken_addr, self.hmt_server_addr
+        )
+
+        # make sure there is enough HMT to fund the escrow
+        use_main_credentials = balance > hmt_amount
+        txn = await self._transact(txn_func, func_args, txn_event, use_main_credentials)
+        hmt_transferred, tx_balance = utils.parse_transfer_transaction(
+            hmtoken_contract, txn["tx_receipt"]
+        )
+
+        # give up
+        if not hmt_transferred:
+            LOG.warning(
+                f"{txn_event} failed with all credentials, not continuing to setup."
+            )
+            return False
+
+        func_args = [
+            reputation_oracle,
+            recording_oracle,
+            reputation_oracle_stake,
+            recording_oracle_stake,
+            self.manifest_url,
+            self.manifest_hash,
+        ]
+        await self._transact(self.job_contract.functions.setup, func_args, "Setup")
+
+        return await self.status() == Status.Pending and tx_balance == hmt_amount
+
+    async def bulk_payout(
+        self,
+        payouts: List[Tuple[str, Decimal]],
+        results: Dict,
+        pub_key: bytes,
+        encrypt_final_results: bool = True,
+        store_pub_final_results: bool = False,
+        progress_store: ProgressStore = None,
+    ) -> bool:
+        """Performs a payout to multiple ethereum addresses. When the payout happens,
+        final results are uploaded to IPFS and contract's state is updated to Partial or Paid
+        depending on contract's balance.
+
+        Payouts to more than BULK_MAX_RECIPIENTS addresses are split into
+        chunks by the ``ChunkedPayout`` of ``Job.bulk_payout``, which runs in
+        the default executor of the event loop. Calling ``bulk_payout`` again
+        with the same payouts after a failure resumes it.
+
+        Args:
+            payouts (List[Tuple[str, int]]): a list of tuples with ethereum addresses and amounts.
+            results (Dict): the final answer results stored by the Reputation Oracle.
+            pub_key (bytes): the public key of the Reputation Oracle.
+            encrypt_final_results (bool): Whether final results must be encrypted.
+            store_pub_final_results (bool): Whether final results must be stored with public access.
+            progress_store (ProgressStore): where the progress of a chunked payout is saved.
+
+        Returns:
+            bool: returns True if paying to ethereum addresses and oracles succeeds.
+
+        """
+        txn_event = "Bulk payout"
+        txn_func = self.job_contract.functions.bulkPayOut
+
+        async def upload_results() -> Tuple[str, str]:
+            hash_, url = await storage.upload(
+                msg=results,
+                public_key=pub_key,
+                encrypt_data=encrypt_final_results,
+                use_public_bucket=store_pub_final_results,
+            )
+
+            # Plain data will be publicly accessible
+            url = get_public_bucket_url(url) if store_pub_final_results else url
+            return hash_, url
+
+        eth_addrs = [eth_addr for eth_addr, amount in payouts]
+        hmt_amounts = [int(amount * 10**18) for eth_addr, amount in payouts]
+
+        if len(eth_addrs) > BULK_MAX_RECIPIENTS:
+            loop = asyncio.get_running_loop()
+
+            def run_in_loop(coroutine):
+                return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+            txn_info = {
+                "gas_payer": self.gas_payer,
+                "gas_payer_priv": self.gas_payer_priv,
+                "gas": self.gas,
+                "hmt_server_addr": self.hmt_server_addr,
+                "fee_strategy": self.fee_strategy,
+            }
+            chunked_payout = ChunkedPayout(
+                get_sync_w3(self.hmt_server_addr),
+                self.job_contract,
+                txn_info,
+                retry=self.retry,
+                store=progress_store,
+                fallback=lambda args: run_in_loop(
+                    self._transact(
+                        txn_func, args, txn_event, use_main_credentials=False
+                    )
+                )["tx_receipt"],
+            )
+            bulk_paid = await loop.run_in_executor(
+                None,
+                chunked_payout.run,
+                eth_addrs,
+                hmt_amounts,
+                lambda: run_in_loop(upload_results()),
+            )
+            if not bulk_paid:
+                LOG.warning(f"{txn_event} failed, call it again to resume it.")
+            return bulk_paid
+
+        hash_, url = await upload_results()
+        func_args = [eth_addrs, hmt_amounts, url, hash_, 1]
+
+        txn = await self._transact(txn_func, func_args, txn_event)
+        return txn["txn_succeeded"] and await self._bulk_paid() is True
+
+    async def complete(self) -> bool:
+        """Completes the Job if it has been paid.
+
+        Returns:
+            bool: returns True if the contract has been completed.
+
+        """
+        await self._transact(self.job_contract.functions.complete, [], "Job completion")
+        return await self.status() == Status.Complete
+
+    async def status(self) -> Enum:
+        """Returns the status of the Job.
+
+        Returns:
+            Enum: returns the status as an enumeration.
+
+        """
+        return Status(await self._call(self.job_contract.functions.status()) + 1)
+
+    async def balance(self) -> int:
+        """Retrieve the balance of a Job in HMT.
+
+        Returns:
+            int: returns the balance of the contract in HMT.
+
+        """
+        return await self._call(self.job_contract.functions.getBalance())
+
+    async def manifest(self, priv_key: bytes) -> Dict:
+        """Retrieves the initial manifest used to setup a Job.
+
+        Args:
+            priv_key (bytes): the private key used to download the manifest.
+
+        Returns:
+            Dict: returns the manifest.
+
+        """
+        return await storage.download(self.manifest_url, priv_key)
+
+    async def final_results(self, priv_key: bytes) -> Optional[Dict]:
+        """Retrieves the final results stored by the Reputation Oracle.
+
+        Args:
+            priv_key (bytes): the private key of the the job requester or their agent.
+
+        Returns:
+            Optional[Dict]: returns the final results, None if there are none yet.
+
+        """
+        final_results_url = await self._call(
+            self.job_contract.functions.finalResultsUrl()
+        )
+
+        if not final_results_url:
+            return None
+
+        return await storage.download(get_key_from_url(final_results_url), priv_key)
+
+    async def _call(self, contract_function) -> Any:
+        return await call(
+            contract_function, self.gas_payer, self.gas, self.hmt_server_addr
+        )
+
+    async def _transact(
+        self,
+        txn_func,
+        txn_args: List,
+        txn_event: str,
+        use_main_credentials: bool = True,
+    ) -> RaffleTxn:
+        """Performs a transaction with the main credentials, then with the
+        multi credentials until one succeeds, like ``Job`` does.
+
+        Only a transaction that could not be sent is sent with the next
+        credentials: one still pending after its replacements might be mined
+        later and is not sent again.
+
+        Args:
+            txn_func: the transaction function to be handled.
+            txn_args (List): the arguments the transaction takes.
+            txn_event (str): the transaction event that will be performed.
+            use_main_credentials (bool): whether to try the main credentials first.
+
+        Returns:
+            RaffleTxn: whether the transaction succeeded and its receipt.
+
+        """
+        credentials = list(self.multi_credentials)
+        if use_main_credentials:
+            credentials.insert(0, (self.gas_payer, self.gas_payer_priv))
+
+        for gas_payer, gas_payer_priv in credentials:
+            txn_info = {
+                "gas_payer": gas_payer,
+                "gas_payer_priv": gas_payer_priv,
+                "gas": self.gas,
+                "hmt_server_addr": self.hmt_server_addr,
+                "fee_strategy": self.fee_strategy,
+            }
+            try:
+                tx_receipt = await handle_transaction_with_retry(
+                    txn_func, self.retry, *txn_args, **txn_info
+                )
+            except TimeExhausted as e:
+                LOG.warning(
+                    f"{txn_event} sent with {gas_payer} is still pending due "
+                    f"to {e}, not resending it with other credentials."
+                )
+                return {"txn_succeeded": False, "tx_receipt": None}
+            except Exception as e:
+                LOG.debug(f"{txn_event} failed with {gas_payer} due to {e}.")
+                continue
+
+            self.gas_payer = gas_payer
+            self.gas_payer_priv = gas_payer_priv
+            return {"txn_succeeded": True, "tx_receipt": tx_receipt}
+
+        LOG.warning(f"{txn_event} failed with all credentials.")
+        return {"txn_succeeded": False, "tx_receipt": None}
+
+    async def _access_job(self, factory_addr: str, escrow_addr: str, **credentials):
+        self.factory_contract = get_factory(factory_addr, self.hmt_server_addr)
+        self.job_contract = get_escrow(escrow_addr, self.hmt_server_addr)
+        self.manifest_url = await self._call(self.job_contract.functions.manifestUrl())
+        self.manifest_hash = await self._call(
+            self.job_contract.functions.manifestHash()
+        )
+
+        manifest_dict = await self.manifest(credentials["rep_oracle_priv_key"])
+        self._init_job(basemodels.Manifest(manifest_dict))
+
+    def _init_job(self, manifest: "Manifest"):
+        serialized_manifest = dict(manifest.serialize())
+        per_job_cost = Decimal(serialized_manifest["task_bid_price"])
+        number_of_answers = int(serialized_manifest["job_total_tasks"])
+        self.serialized_manifest = serialized_manifest
+        self.amount = Decimal(per_job_cost * number_of_answers)
+
+    def _eth_addr_valid(self, addr, priv_key):
+        return get_keyring().key(priv_key).matches(addr)
+
+    def _validate_multi_credentials(
+        self, multi_credentials: List[Tuple]
+    ) -> List[Tuple[Any, Any]]:
+        valid_credentials = []
+        for gas_payer, gas_payer_priv in multi_credentials:
+            if not self._eth_addr_valid(gas_payer, gas_payer_priv):
+                LOG.warning(f"Ethereum address {gas_payer} doesn't match private key")
+                continue
+            valid_credentials.append((gas_payer, gas_payer_priv))
+        return valid_credentials
+
+    async def _factory_contains_escrow(
+        self, escrow_addr: str, factory_addr: str
+    ) -> bool:
+        factory_contract = get_factory(factory_addr, self.hmt_server_addr)
+        return await self._call(factory_contract.functions.hasEscrow(escrow_addr))
+
+    async def _init_factory(
+        self, factory_addr: Optional[str], credentials: Dict[str, str]
+    ) -> Contract:
+        if not Web3.isChecksumAddress(factory_addr):
+            factory_addr = await deploy_factory(
+                gas=self.gas,
+                hmt_server_addr=self.hmt_server_addr,
+                hmtoken_addr=self.hmtoken_addr,
+                **credentials,
+            )
+            if not factory_addr:
+                raise Exception("Unable to get address from factory")
+
+        return get_factory(str(factory_addr), self.hmt_server_addr)
+
+    async def _bulk_paid(self) -> bool:
+        return await self._call(self.job_contract.functions.bulkPaid())
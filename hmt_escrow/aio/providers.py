@@ -0,0 +1,133 @@
+"""Shared asyncio web3 connections to the ethereum network.
+
+The ``AsyncHTTPProvider`` of web3 opens a new ``aiohttp`` session for every
+request. The provider below keeps one pooled session per event loop instead,
+and the size of the pool bounds how many requests run at the same time.
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict, MutableMapping
+from urllib.parse import urlparse
+
+import aiohttp
+from web3 import Web3
+from web3.eth import AsyncEth
+from web3.providers.async_rpc import AsyncHTTPProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from hmt_escrow.providers import HTTP_SCHEMES
+
+LOG = logging.getLogger("hmt_escrow.aio.providers")
+
+# Maximum number of concurrent connections per endpoint and event loop.
+AIO_POOL_SIZE = int(os.getenv("AIO_POOL_SIZE", 100))
+
+# Seconds before a request to the node is abandoned.
+AIO_REQUEST_TIMEOUT = float(os.getenv("AIO_REQUEST_TIMEOUT", 30))
+
+# Pooled sessions keyed by event loop, then by name.
+_SESSIONS: MutableMapping[
+    asyncio.AbstractEventLoop, Dict[str, aiohttp.ClientSession]
+] = weakref.WeakKeyDictionary()
+
+
+def get_session(name: str, pool_size: int = AIO_POOL_SIZE) -> aiohttp.ClientSession:
+    """Returns the pooled ``aiohttp`` session of the running event loop.
+
+    Args:
+        name (str): the name of the session, e.g. the endpoint it connects to.
+        pool_size (int): maximum number of concurrent connections of the session.
+
+    Returns:
+        aiohttp.ClientSession: the session shared by the coroutines of the loop.
+
+    """
+    sessions = _SESSIONS.setdefault(asyncio.get_running_loop(), {})
+    session = sessions.get(name)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=pool_size)
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=AIO_REQUEST_TIMEOUT),
+            raise_for_status=True,
+        )
+        sessions[name] = session
+    return session
+
+
+async def close_sessions():
+    """Closes the pooled sessions of the running event loop.
+
+    Call it before the loop is closed, e.g. at the end of ``asyncio.run``.
+    """
+    sessions = _SESSIONS.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+class PooledAsyncHTTPProvider(AsyncHTTPProvider):
+    """An ``AsyncHTTPProvider`` sending its requests over a pooled session."""
+
+    def __init__(self, endpoint_uri: str, pool_size: int = AIO_POOL_SIZE):
+        """Inits
+
+        Args:
+            endpoint_uri: the address of the ethereum node.
+            pool_size: maximum number of concurrent connections to the node.
+        """
+        super().__init__(endpoint_uri)
+        self.pool_size = pool_size
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+        session = get_session(self.endpoint_uri, self.pool_size)
+        async with session.post(
+            self.endpoint_uri, data=request_data, **self.get_request_kwargs()
+        ) as response:
+            raw_response = await response.read()
+        return self.decode_rpc_response(raw_response)
+
+
+_WEB3S: Dict[str, Web3] = {}
+_WEB3S_LOCK = threading.Lock()
+
+
+def get_web3(endpoint: str) -> Web3:
+    """Returns the shared asyncio ``Web3`` of an endpoint.
+
+    >>> w3 = get_web3("http://localhost:8545")
+    >>> w3.eth.is_async
+    True
+    >>> get_web3("http://localhost:8545") is w3
+    True
+
+    Args:
+        endpoint (str): the HTTP(S) address of the ethereum node.
+
+    Returns:
+        Web3: the shared web3 instance, its ``eth`` module is ``AsyncEth``.
+
+    Raises:
+        ValueError: if the endpoint is not an HTTP(S) address.
+
+    """
+    w3 = _WEB3S.get(endpoint)
+    if w3 is not None:
+        return w3
+
+    if urlparse(endpoint).scheme not in HTTP_SCHEMES:
+        raise ValueError(f"Only HTTP(S) endpoints are supported, got {endpoint}")
+
+    with _WEB3S_LOCK:
+        w3 = _WEB3S.get(endpoint)
+        if w3 is None:
+            w3 = Web3(
+                PooledAsyncHTTPProvider(endpoint),
+                modules={"eth": (AsyncEth,)},
+                middlewares=[],
+            )
+            _WEB3S[endpoint] = w3
+        return w3
@@ -0,0 +1,177 @@
+"""asyncio variant of ``hmt_escrow.receipts``.
+
+One ``AsyncReceiptWaiter`` task per endpoint and event loop follows the new
+blocks and resolves every waiting transaction they include.
+"""
+import asyncio
+import logging
+import weakref
+from typing import Dict, MutableMapping, Optional, Set
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+from web3.types import TxReceipt
+
+from hmt_escrow.receipts import WEB3_BLOCK_POLL_INTERVAL
+
+LOG = logging.getLogger("hmt_escrow.aio.receipts")
+
+
+class AsyncReceiptWaiter(object):
+    """Resolves the receipts of the transactions sent to one node.
+
+    Works like ``hmt_escrow.receipts.ReceiptWaiter`` with a task of the event
+    loop in place of a thread.
+    """
+
+    def __init__(self, w3: Web3, poll_interval: float = WEB3_BLOCK_POLL_INTERVAL):
+        """Inits
+
+        Args:
+            w3: the asyncio web3 instance of the node.
+            poll_interval: seconds between two reads of the latest block number.
+        """
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self._waiting: Dict[HexBytes, asyncio.Future] = {}
+        self._unchecked: Set[HexBytes] = set()
+        self._last_block: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, txn_hash) -> asyncio.Future:
+        """Starts waiting for a transaction to be mined.
+
+        Args:
+            txn_hash: the hash of the broadcast transaction.
+
+        Returns:
+            asyncio.Future: resolved with the transaction receipt once it is mined.
+
+        """
+        txn_hash = HexBytes(txn_hash)
+        loop = asyncio.get_running_loop()
+        future = self._waiting.get(txn_hash)
+        if future is None:
+            future = loop.create_future()
+            self._waiting[txn_hash] = future
+            self._unchecked.add(txn_hash)
+
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        return future
+
+    async def wait(self, txn_hash, timeout: float) -> TxReceipt:
+        """Waits for a transaction to be mined.
+
+        Args:
+            txn_hash: the hash of the broadcast transaction.
+            timeout: seconds to wait for the receipt.
+
+        Returns:
+            AttributeDict: returns the transaction receipt.
+
+        Raises:
+            TimeExhausted: if waiting for the transaction receipt times out.
+
+        """
+        future = self.watch(txn_hash)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.forget(txn_hash)
+            raise TimeExhausted(
+                f"Transaction {HexBytes(txn_hash).hex()} is not in the "
+                f"chain after {timeout} seconds"
+            )
+
+    def forget(self, txn_hash):
+        """Stops waiting for a transaction and cancels its future."""
+        txn_hash = HexBytes(txn_hash)
+        future = self._waiting.pop(txn_hash, None)
+        self._unchecked.discard(txn_hash)
+        if future is not None:
+            future.cancel()
+
+    @property
+    def waiting(self) -> int:
+        """Number of transactions waited for."""
+        return len(self._waiting)
+
+    async def _run(self):
+        while self._waiting:
+            unchecked, self._unchecked = self._unchecked, set()
+            try:
+                await self._poll(unchecked)
+            except Exception as e:
+                LOG.warning(f"Failed to follow the blocks of {self.w3.provider}: {e}")
+                self._unchecked |= unchecked & set(self._waiting)
+
+            await asyncio.sleep(self.poll_interval)
+
+        # Nothing to wait for, the next watch starts a new task.
+        self._task = None
+        self._last_block = None
+
+    async def _poll(self, unchecked: Set[HexBytes]):
+        head = int(await self.w3.manager.coro_request("eth_blockNumber", []), 16)
+
+        # Anything mined up to the head is found by looking the new
+        # transactions up, the blocks after it are followed.
+        await asyncio.gather(*[self._check(txn_hash) for txn_hash in unchecked])
+
+        if self._last_block is None:
+            self._last_block = head
+            return
+
+        for number in range(self._last_block + 1, head + 1):
+            block = await self.w3.manager.coro_request(
+                "eth_getBlockByNumber", [hex(number), False]
+            )
+            included = [
+                HexBytes(txn_hash)
+                for txn_hash in block["transactions"]
+                if HexBytes(txn_hash) in self._waiting
+            ]
+            await asyncio.gather(*[self._check(txn_hash) for txn_hash in included])
+            self._last_block = number
+
+    async def _check(self, txn_hash: HexBytes):
+        receipt = await self.w3.manager.coro_request(
+            "eth_getTransactionReceipt", [txn_hash.hex()]
+        )
+
+        # Some nodes return receipts of pending transactions without a block.
+        if receipt is None or receipt["blockHash"] is None:
+            return
+
+        future = self._waiting.pop(txn_hash, None)
+        self._unchecked.discard(txn_hash)
+        if future is not None and not future.done():
+            future.set_result(AttributeDict.recursive(receipt_formatter(receipt)))
+
+
+# Waiters keyed by event loop, then by web3 instance.
+_WAITERS: MutableMapping[
+    asyncio.AbstractEventLoop, Dict[Web3, AsyncReceiptWaiter]
+] = weakref.WeakKeyDictionary()
+
+
+def get_receipt_waiter(w3: Web3) -> AsyncReceiptWaiter:
+    """Returns the receipt waiter of a web3 instance in the running event loop.
+
+    Args:
+        w3 (Web3): the asyncio web3 instance the transactions were sent with.
+
+    Returns:
+        AsyncReceiptWaiter: the receipt waiter shared by the coroutines of the loop.
+
+    """
+    waiters = _WAITERS.setdefault(asyncio.get_running_loop(), {})
+    waiter = waiters.get(w3)
+    if waiter is None:
+        waiter = AsyncReceiptWaiter(w3)
+        waiters[w3] = waiter
+    return waiter
@@ -0,0 +1,129 @@
+"""asyncio variant of ``hmt_escrow.storage``.
+
+The S3 requests are presigned locally with boto3 and sent over a pooled
+``aiohttp`` session, so uploads and downloads don't block the event loop.
+"""
+import json
+import logging
+from typing import Dict, Tuple
+
+import aiohttp
+
+from hmt_escrow.aio.providers import get_session
+from hmt_escrow.storage import (
+    StorageClientError,
+    StorageFileNotFoundError,
+    _connect_s3,
+    _decode,
+    _encode,
+    get_bucket,
+    is_url,
+)
+
+LOG = logging.getLogger("hmt_escrow.aio.storage")
+
+# Seconds the presigned S3 urls stay valid.
+PRESIGNED_URL_EXPIRATION = 60
+
+_CLIENTS: Dict[bool, object] = {}
+
+
+def _presign(method: str, bucket: str, key: str, use_public_bucket=False) -> str:
+    client = _CLIENTS.get(use_public_bucket)
+    if client is None:
+        client = _connect_s3(use_public_bucket)
+        _CLIENTS[use_public_bucket] = client
+    return client.generate_presigned_url(
+        method,
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=PRESIGNED_URL_EXPIRATION,
+    )
+
+
+async def download_from_storage(key: str, public: bool = False) -> bytes:
+    """Downloads data from storage if exists.
+
+    Args:
+         key(str): file key to find it in storage to be downloaded.
+         public(bool): whether file is public
+    """
+    LOG.debug("Downloading s3 key: {}".format(key))
+    url = _presign("get_object", get_bucket(public=public), key)
+    try:
+        async with get_session("storage").get(url) as response:
+            return await response.read()
+    except aiohttp.ClientResponseError as e:
+        if e.status == 404:
+            raise StorageFileNotFoundError("No object found - returning empty")
+
+        raise StorageClientError(str(e))
+
+    except Exception as e:
+        LOG.warning(
+            f"Reading the key {key} with S3 failed (public: {public}"
+            f" because of: {str(e)}"
+        )
+        raise e
+
+
+async def download(key: str, private_key: bytes, public: bool = False) -> Dict:
+    """Download a key, decrypt it, and output it as a binary string.
+
+    Args:
+        key (str): This is the hash code returned when uploading.
+        private_key (str): The private_key to decrypt this string with.
+        public(bool): whether file is public
+
+    Returns:
+        Dict: returns the contents of the filename which was previously uploaded.
+
+    Raises:
+        Exception: if reading from fails.
+
+    """
+    try:
+        if is_url(key):
+            async with get_session("storage").get(key) as response:
+                content = await response.read()
+        else:
+            content = await download_from_storage(key=key, public=public)
+        artifact = _decode(content, private_key)
+    except Exception as e:
+        LOG.warning(
+            "Reading the key {!r} with private key {!r} with S3 failed"
+            " because of: {!r}".format(key, private_key, e)
+        )
+        raise e
+    return json.loads(artifact)
+
+
+async def upload(
+    msg: Dict,
+    public_key: bytes,
+    encrypt_data=True,
+    use_public_bucket=False,
+) -> Tuple[str, str]:
+    """Upload and encrypt a string for later retrieval.
+
+    Args:
+        msg (Dict): The message to upload and encrypt.
+        public_key (bytes): The public_key to encrypt the file for.
+        encrypt_data (bool): Whether data must be encrypted before uploading.
+        use_public_bucket (bool): Whether data must be stored in the public bucket.
+
+    Returns:
+        Tuple[str, str]: returns the hash of the message and its key in storage.
+
+    Raises:
+        Exception: if adding bytes fails.
+
+    """
+    hash_, key, body = _encode(msg, public_key, encrypt_data)
+    url = _presign(
+        "put_object", get_bucket(public=use_public_bucket), key, use_public_bucket
+    )
+    async with get_session("storage").put(url, data=body):
+        pass
+
+    LOG.debug(f"Uploaded to S3, key: {key}")
+    return hash_, key
@@ -0,0 +1,61 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Iterable, List
+
+from hmt_escrow.aio.eth_bridge import call
+from hmt_escrow.eth_bridge import get_hmtoken
+
+# Maximum number of coroutines ``bounded_gather`` runs at the same time.
+AIO_CONCURRENCY = int(os.getenv("AIO_CONCURRENCY", 100))
+
+
+async def bounded_gather(
+    aws: Iterable[Awaitable],
+    limit: int = AIO_CONCURRENCY,
+    return_exceptions: bool = False,
+) -> List[Any]:
+    """Like ``asyncio.gather`` but runs at most ``limit`` awaitables at a time.
+
+    >>> async def double(x):
+    ...     return x * 2
+    >>> asyncio.run(bounded_gather([double(x) for x in range(3)], limit=2))
+    [0, 2, 4]
+
+    Args:
+        aws: the awaitables to run, e.g. one ``AsyncJob`` method call per job.
+        limit: maximum number of awaitables running at the same time.
+        return_exceptions: whether to return the errors in place of the results
+            instead of raising the first one.
+
+    Returns:
+        List: the results in the order of the awaitables.
+
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable) -> Any:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *[run(aw) for aw in aws], return_exceptions=return_exceptions
+    )
+
+
+async def get_hmt_balance(wallet_addr, token_addr, hmt_server_addr=None):
+    """Get hmt balance
+
+    Args:
+        wallet_addr: wallet address
+        token_addr: ERC-20 contract
+        hmt_server_addr: the address of the ethereum node
+
+    Return:
+        Decimal with HMT balance
+    """
+    hmtoken = get_hmtoken(token_addr, hmt_server_addr)
+    return await call(
+        hmtoken.functions.balanceOf(wallet_addr),
+        wallet_addr,
+        hmt_server_addr=hmt_server_addr,
+    )
@@ -0,0 +1,230 @@
+"""Prebuilt ABI/bytecode artifacts of the escrow contracts.
+
+Compiling the Solidity sources with solc takes seconds, so the contracts are
+compiled once at build time and shipped as JSON artifacts inside the package:
+
+    python -m hmt_escrow.artifacts
+
+Every artifact records the hash of the Solidity sources it was built from.
+Artifacts are loaded lazily, one contract at a time, and the contracts are only
+recompiled when an artifact is missing or its source hash no longer matches.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Any, List, Optional
+
+LOG = logging.getLogger("hmt_escrow.artifacts")
+
+ARTIFACTS_VERSION = 1
+
+CONTRACT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "contracts")
+ARTIFACTS_FOLDER = os.getenv(
+    "HMT_ARTIFACTS_FOLDER", os.path.join(os.path.dirname(__file__), "artifacts")
+)
+
+CONTRACT_SOURCES = [
+    "Escrow.sol",
+    "EscrowFactory.sol",
+    "HMToken.sol",
+    "HMTokenInterface.sol",
+    "Multicall.sol",
+    "SafeMath.sol",
+]
+
+_INTERFACES: Dict[str, Dict[str, Any]] = {}
+_LOCK = threading.Lock()
+
+
+def source_hash(contract_folder: str = CONTRACT_FOLDER) -> Optional[str]:
+    """Hashes all the Solidity sources the artifacts are compiled from.
+
+    Args:
+        contract_folder (str): the folder holding the Solidity sources.
+
+    Returns:
+        Optional[str]: the sha256 hex digest of the sources or None if the
+        sources are not available, e.g. in a stripped down installation.
+
+    """
+    try:
+        filenames = sorted(
+            name for name in os.listdir(contract_folder) if name.endswith(".sol")
+        )
+    except OSError:
+        return None
+
+    if not filenames:
+        return None
+
+    digest = hashlib.sha256()
+    for filename in filenames:
+        with open(os.path.join(contract_folder, filename), "rb") as source:
+            digest.update(filename.encode("utf-8"))
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def compile_contracts(contract_folder: str = CONTRACT_FOLDER) -> Dict[str, Dict]:
+    """Compiles the escrow contracts with solc.
+
+    Args:
+        contract_folder (str): the folder holding the Solidity sources.
+
+    Returns:
+        Dict[str, Dict]: the abi and bytecode of every compiled contract keyed
+        by the contract name.
+
+    """
+    from solcx import compile_files, get_solc_version
+
+    compiled = compile_files(
+        [os.path.join(contract_folder, source) for source in CONTRACT_SOURCES],
+        output_values=["abi", "bin"],
+    )
+    compiler = str(get_solc_version())
+
+    interfaces = {}
+    for entrypoint, interface in compiled.items():
+        source_path, contract_name = entrypoint.rsplit(":", 1)
+        interfaces[contract_name] = {
+            "contractName": contract_name,
+            "sourcePath": os.path.basename(source_path),
+            "compiler": compiler,
+            "abi": interface["abi"],
+            "bin": interface["bin"],
+        }
+    return interfaces
+
+
+def _artifact_path(contract_name: str, artifacts_folder: str) -> str:
+    return os.path.join(artifacts_folder, "{}.json".format(contract_name))
+
+
+def build_artifacts(
+    artifacts_folder: str = ARTIFACTS_FOLDER, contract_folder: str = CONTRACT_FOLDER
+) -> Dict[str, Dict]:
+    """Compiles the contracts and writes one JSON artifact per contract.
+
+    Args:
+        artifacts_folder (str): the folder the artifacts are written to.
+        contract_folder (str): the folder holding the Solidity sources.
+
+    Returns:
+        Dict[str, Dict]: the written artifacts keyed by the contract name.
+
+    Raises:
+        OSError: if the artifacts folder is not writable.
+
+    """
+    hash_ = source_hash(contract_folder)
+    artifacts = compile_contracts(contract_folder)
+
+    os.makedirs(artifacts_folder, exist_ok=True)
+    for contract_name, artifact in artifacts.items():
+        artifact["version"] = ARTIFACTS_VERSION
+        artifact["sourceHash"] = hash_
+        with open(_artifact_path(contract_name, artifacts_folder), "w") as f:
+            json.dump(artifact, f, indent=2, sort_keys=True)
+
+    LOG.info(f"Wrote {len(artifacts)} contract artifacts to {artifacts_folder}")
+    return artifacts
+
+
+def _read_artifact(
+    contract_name: str, artifacts_folder: str, expected_hash: Optional[str]
+) -> Optional[Dict]:
+    try:
+        with open(_artifact_path(contract_name, artifacts_folder)) as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if artifact.get("version") != ARTIFACTS_VERSION:
+        return None
+
+    # Without the sources there is nothing to compare against, trust the artifact.
+    if expected_hash is not None and artifact.get("sourceHash") != expected_hash:
+        LOG.info(f"Artifact of {contract_name} is stale, recompiling contracts.")
+        return None
+
+    return artifact
+
+
+def _rebuild(artifacts_folder: str) -> Dict[str, Dict]:
+    try:
+        return build_artifacts(artifacts_folder)
+    except OSError as e:
+        LOG.warning(f"Unable to write contract artifacts due to {e}.")
+        return compile_contracts()
+
+
+def load_contract_interface(
+    contract_name: str, artifacts_folder: str = ARTIFACTS_FOLDER
+) -> Dict[str, Any]:
+    """Retrieves the abi and bytecode of a given contract.
+
+    The artifact is read once and kept in memory. The contracts are compiled
+    only when the artifact is missing or outdated.
+
+    Args:
+        contract_name (str): the name of the contract, e.g. "Escrow".
+        artifacts_folder (str): the folder holding the artifacts.
+
+    Returns:
+        Dict[str, Any]: the contract interface with its "abi" and "bin".
+
+    Raises:
+        KeyError: if no contract with the given name exists.
+
+    """
+    interface = _INTERFACES.get(contract_name)
+    if interface is not None:
+        return interface
+
+    with _LOCK:
+        if contract_name in _INTERFACES:
+            return _INTERFACES[contract_name]
+
+        artifact = _read_artifact(contract_name, artifacts_folder, source_hash())
+        if artifact is None:
+            _INTERFACES.update(_rebuild(artifacts_folder))
+        else:
+            _INTERFACES[contract_name] = artifact
+
+        return _INTERFACES[contract_name]
+
+
+def load_all_interfaces(
+    artifacts_folder: str = ARTIFACTS_FOLDER,
+) -> Dict[str, Dict[str, Any]]:
+    """Retrieves the interfaces of all the compiled contracts.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: the contract interfaces keyed by the
+        contract name.
+
+    """
+    for source in CONTRACT_SOURCES:
+        load_contract_interface(os.path.splitext(source)[0], artifacts_folder)
+    return dict(_INTERFACES)
+
+
+def clear_cache():
+    """Drops the artifacts kept in memory."""
+    with _LOCK:
+        _INTERFACES.clear()
+
+
+def main(argv: List[str] = None):
+    artifacts_folder = argv[0] if argv else ARTIFACTS_FOLDER
+    build_artifacts(artifacts_folder)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv[1:])
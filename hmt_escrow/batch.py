@@ -0,0 +1,146 @@
+"""Launching many Jobs at once.
+
+``Job.launch`` creates the escrow and waits for its receipt, uploads the
+manifest, then ``Job.setup`` funds the escrow and sets it up, one step after
+the other. ``launch_many`` runs these steps for up to ``concurrency`` jobs at
+the same time, so the escrow creations, uploads and fundings of different
+jobs overlap.
+
+The transactions of all the jobs of a gas payer draw their nonces from the
+gas payer's single ``NonceManager``, so they are sent back to back without
+waiting for each other and without nonce conflicts. A job which fails is
+reported in its ``JobResult`` and doesn't stop the others.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from hmt_escrow.job import Job
+
+LOG = logging.getLogger("hmt_escrow.batch")
+
+# Most jobs launched at the same time by a JobBatch.
+JOB_BATCH_CONCURRENCY = int(os.getenv("JOB_BATCH_CONCURRENCY", 16))
+
+
+class JobResult(NamedTuple):
+    """The outcome of the launch of one job of a batch."""
+
+    index: int
+    job: Optional[Job]
+    launched: bool = False
+    setup: bool = False
+    error: Optional[Exception] = None
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether the job was launched and, if asked for, set up."""
+        return self.error is None and self.launched and self.setup
+
+
+class JobBatch(object):
+    """Launches and sets up many jobs with bounded concurrency."""
+
+    def __init__(
+        self,
+        credentials: Dict[str, str],
+        rep_oracle_pub_key: bytes,
+        factory_addr: str = None,
+        concurrency: int = JOB_BATCH_CONCURRENCY,
+        setup: bool = True,
+        sender: str = None,
+        **job_kwargs: Any,
+    ):
+        """Inits
+
+        Args:
+            credentials: the gas payer and its private key.
+            rep_oracle_pub_key: the public key of the Reputation Oracle.
+            factory_addr: the factory of the escrows. A new one is deployed
+                by the first job if None, and used by the others.
+            concurrency: the most jobs launched at the same time.
+            setup: whether to fund and set up the escrows after launching them.
+            sender: the HMT owner funding the escrows with ``transferFrom``,
+                the gas payer if None.
+            job_kwargs: the other arguments of every ``Job``, e.g.
+                multi_credentials, retry or fee_strategy.
+        """
+        self.credentials = credentials
+        self.rep_oracle_pub_key = rep_oracle_pub_key
+        self.factory_addr = factory_addr
+        self.concurrency = max(1, concurrency)
+        self.setup = setup
+        self.sender = sender
+        self.job_kwargs = job_kwargs
+
+    def launch(self, manifests: Sequence[Any]) -> List[JobResult]:
+        """Launches a job per manifest.
+
+        Args:
+            manifests (Sequence[Manifest]): the manifests of the jobs.
+
+        Returns:
+            List[JobResult]: the results in the order of the manifests.
+
+        """
+        results: List[JobResult] = []
+        indexes = list(range(len(manifests)))
+
+        # The first job deploys the factory the others share.
+        while indexes and self.factory_addr is None:
+            index = indexes.pop(0)
+            result = self._launch_one(index, manifests[index])
+            results.append(result)
+            if result.job is not None:
+                self.factory_addr = result.job.factory_contract.address
+
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="job-batch"
+        ) as executor:
+            results.extend(
+                executor.map(lambda i: self._launch_one(i, manifests[i]), indexes)
+            )
+
+        failed = sum(1 for result in results if not result.succeeded)
+        if failed:
+            LOG.warning(f"{failed} of {len(results)} jobs failed to launch")
+        return sorted(results, key=lambda result: result.index)
+
+    def _launch_one(self, index: int, manifest: Any) -> JobResult:
+        job = None
+        launched = False
+        try:
+            job = Job(
+                self.credentials,
+                manifest,
+                factory_addr=self.factory_addr,
+                **self.job_kwargs,
+            )
+            launched = job.launch(self.rep_oracle_pub_key)
+            is_setup = launched and (not self.setup or job.setup(self.sender))
+            return JobResult(index, job, launched, is_setup)
+        except Exception as e:
+            LOG.warning(f"Job {index} of the batch failed: {e}")
+            return JobResult(index, job, launched, False, e)
+
+
+def launch_many(
+    manifests: Sequence[Any],
+    credentials: Dict[str, str],
+    rep_oracle_pub_key: bytes,
+    **kwargs: Any,
+) -> List[JobResult]:
+    """Launches and sets up a job per manifest, several at a time.
+
+    Args:
+        manifests (Sequence[Manifest]): the manifests of the jobs.
+        credentials (Dict[str, str]): the gas payer and its private key.
+        rep_oracle_pub_key (bytes): the public key of the Reputation Oracle.
+        \*\*kwargs: the other arguments of ``JobBatch``.
+
+    Returns:
+        List[JobResult]: the results in the order of the manifests.
+
+    """
+    return JobBatch(credentials, rep_oracle_pub_key, **kwargs).launch(manifests)
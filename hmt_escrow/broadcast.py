@@ -0,0 +1,165 @@
+"""Broadcast of signed transactions to several ethereum nodes at once.
+
+A transaction sent to a single node is included as fast as that node gossips
+it to the rest of the network. With ``BROADCAST_ENDPOINTS`` set, the raw
+transactions sent by ``eth_bridge`` are also pushed to each of these endpoints
+concurrently, and the send returns as soon as one of the nodes accepts it.
+Nodes which already know the transaction, e.g. from the gossip of another one,
+count as accepting it.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from time import monotonic
+from typing import List, Optional
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from hmt_escrow.providers import get_web3
+
+LOG = logging.getLogger("hmt_escrow.broadcast")
+
+# Comma separated endpoints every signed transaction is broadcast to, none
+# disables the broadcast.
+BROADCAST_ENDPOINTS = os.getenv("BROADCAST_ENDPOINTS", "")
+
+# Seconds to wait for a node to accept a broadcast transaction.
+BROADCAST_TIMEOUT = float(os.getenv("BROADCAST_TIMEOUT", 10))
+
+# Errors of the nodes which already have the transaction in their pool.
+KNOWN_TXN_ERRORS = (
+    "already known",
+    "known transaction",
+    "alreadyknown",
+    "already imported",
+    "already exists",
+    "already in pool",
+)
+
+
+def is_known_txn_error(error: Exception) -> bool:
+    """Returns whether a node refused a transaction because it already has it.
+
+    >>> is_known_txn_error(ValueError({"code": -32000, "message": "already known"}))
+    True
+    >>> is_known_txn_error(ValueError({"code": -32000, "message": "nonce too low"}))
+    False
+
+    """
+    message = str(error).lower()
+    return any(known in message for known in KNOWN_TXN_ERRORS)
+
+
+class Broadcaster(object):
+    """Sends raw transactions to several endpoints concurrently."""
+
+    def __init__(self, endpoints: List[str], timeout: float = BROADCAST_TIMEOUT):
+        """Inits
+
+        Args:
+            endpoints: the addresses of the ethereum nodes to broadcast to.
+            timeout: seconds to wait for a node to accept a transaction.
+        """
+        self.endpoints = list(endpoints)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.endpoints) + 1, thread_name_prefix="broadcast"
+        )
+
+    def send_raw_transaction(self, w3: Web3, raw_txn: bytes) -> HexBytes:
+        """Sends a raw transaction to w3 and to the broadcast endpoints.
+
+        Args:
+            w3 (Web3): the web3 instance the transaction is sent with.
+            raw_txn (bytes): the signed transaction.
+
+        Returns:
+            HexBytes: the hash of the transaction once a node accepted it.
+
+        Raises:
+            Exception: the error of w3 if no node accepted the transaction.
+
+        """
+        targets = [w3]
+        for endpoint in self.endpoints:
+            target = get_web3(endpoint)
+            if all(target is not other for other in targets):
+                targets.append(target)
+
+        futures: List[Future] = [
+            self._executor.submit(self._send, target, raw_txn) for target in targets
+        ]
+        deadline = monotonic() + self.timeout
+        pending = set(futures)
+        while pending:
+            done, pending = wait(
+                pending, timeout=deadline - monotonic(), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+
+        # No node accepted it, report the error of the main endpoint.
+        error: Optional[BaseException] = None
+        for future in futures:
+            if future.done() and future.exception() is not None:
+                error = error or future.exception()
+        raise error or TimeoutError(
+            f"No node accepted the transaction in {self.timeout} seconds"
+        )
+
+    def shutdown(self):
+        """Stops the broadcast threads."""
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _send(w3: Web3, raw_txn: bytes) -> HexBytes:
+        try:
+            return HexBytes(w3.eth.sendRawTransaction(raw_txn))
+        except Exception as e:
+            if is_known_txn_error(e):
+                return HexBytes(Web3.keccak(raw_txn))
+            LOG.debug(f"Broadcast to {getattr(w3.provider, 'endpoint_uri', w3)}: {e}")
+            raise e
+
+
+_BROADCASTER: Optional[Broadcaster] = None
+_LOCK = threading.Lock()
+
+
+def get_broadcaster() -> Optional[Broadcaster]:
+    """Returns the broadcaster of ``BROADCAST_ENDPOINTS``, None if unset."""
+    global _BROADCASTER
+    endpoints = [e.strip() for e in BROADCAST_ENDPOINTS.split(",") if e.strip()]
+    if not endpoints:
+        return None
+
+    with _LOCK:
+        if _BROADCASTER is None:
+            _BROADCASTER = Broadcaster(endpoints)
+        return _BROADCASTER
+
+
+def send_raw_transaction(
+    w3: Web3, raw_txn: bytes, broadcaster: Broadcaster = None
+) -> HexBytes:
+    """Sends a raw transaction, broadcasting it if a broadcaster is configured.
+
+    Args:
+        w3 (Web3): the web3 instance the transaction is sent with.
+        raw_txn (bytes): the signed transaction.
+        broadcaster (Broadcaster): broadcasts the transaction, defaults to
+            the one of ``BROADCAST_ENDPOINTS``.
+
+    Returns:
+        HexBytes: the hash of the transaction.
+
+    """
+    broadcaster = broadcaster or get_broadcaster()
+    if broadcaster is None:
+        return HexBytes(w3.eth.sendRawTransaction(raw_txn))
+    return broadcaster.send_raw_transaction(w3, raw_txn)
@@ -0,0 +1,124 @@
+"""Small in-memory caches shared by the hmt_escrow modules."""
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache(object):
+    """A thread-safe mapping that evicts its least recently used entries.
+
+    With a ``ttl``, entries also expire that many seconds after being set.
+
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache.get_or_set("a", lambda: 1)
+    1
+    >>> cache.get_or_set("a", lambda: 2)
+    1
+    >>> cache.set("b", 2)
+    >>> cache.set("c", 3)
+    >>> cache.get("a") is None
+    True
+    >>> cache.info()
+    CacheInfo(hits=1, misses=2, maxsize=2, currsize=2)
+
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl: Optional[float] = None,
+        timer: Callable[[], float] = monotonic,
+    ):
+        """Inits
+
+        Args:
+            maxsize: maximum number of entries kept in the cache.
+            ttl: seconds an entry stays valid, forever if None.
+            timer: the clock the ttl is measured with.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._expires: Dict[Hashable, float] = {}
+        self._timer = timer
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value of a key and marks it as recently used."""
+        with self._lock:
+            self._expire(key)
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Caches a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl is not None:
+                self._expires[key] = self._timer() + self.ttl
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                self._expires.pop(evicted, None)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Returns the cached value of a key or caches the result of ``factory``."""
+        with self._lock:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = factory()
+                self.set(key, value)
+            return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes a key from the cache and returns its value."""
+        with self._lock:
+            self._expires.pop(key, None)
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """Removes all the entries and resets the hit/miss counters."""
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Returns the hit/miss counters and the size of the cache."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            self._expire(key)
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _expire(self, key: Hashable):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= self._timer():
+            del self._data[key]
+            del self._expires[key]
+
+
+_MISSING = object()
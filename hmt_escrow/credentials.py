@@ -0,0 +1,246 @@
+"""Choosing the gas payer of a transaction among several accounts.
+
+``Job`` falls back on its ``multi_credentials`` when a transaction fails with
+its main gas payer. Trying them in order, each with the full retry and
+backoff, lets a single broken or empty account add minutes to every
+operation. A ``CredentialPool`` keeps the health of the accounts of an
+endpoint instead, shared by all the jobs of the process:
+
+* the ETH balance of each account, cached for CREDENTIAL_BALANCE_TTL seconds,
+* its transactions in flight, the nonces reserved from its ``NonceManager``
+  plus the transactions being handled with it,
+* its consecutive failures. After CREDENTIAL_MAX_FAILURES of them the
+  account cools down, for CREDENTIAL_COOLDOWN seconds doubling with every
+  further failure up to CREDENTIAL_MAX_COOLDOWN.
+
+``ranked`` orders the accounts from the best to the worst, so the first one
+tried is likely to succeed and concurrent jobs spread over the least busy
+wallets.
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from time import monotonic
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from web3 import Web3
+
+from hmt_escrow.cache import LRUCache
+from hmt_escrow.eth_bridge import get_w3
+from hmt_escrow.nonce import get_nonce_manager
+
+LOG = logging.getLogger("hmt_escrow.credentials")
+
+# Consecutive failures after which an account cools down.
+CREDENTIAL_MAX_FAILURES = int(os.getenv("CREDENTIAL_MAX_FAILURES", 2))
+
+# Seconds an account cools down after CREDENTIAL_MAX_FAILURES failures.
+CREDENTIAL_COOLDOWN = float(os.getenv("CREDENTIAL_COOLDOWN", 30))
+
+# Longest cooldown of an account which keeps failing, in seconds.
+CREDENTIAL_MAX_COOLDOWN = float(os.getenv("CREDENTIAL_MAX_COOLDOWN", 600))
+
+# Seconds the ETH balance of an account stays cached.
+CREDENTIAL_BALANCE_TTL = float(os.getenv("CREDENTIAL_BALANCE_TTL", 30))
+
+# Accounts with at most this balance in wei are tried after the funded ones.
+CREDENTIAL_MIN_BALANCE = int(os.getenv("CREDENTIAL_MIN_BALANCE", 0))
+
+Credential = Tuple[str, str]
+
+# Credential pools keyed by endpoint.
+_POOLS = LRUCache(maxsize=64)
+
+
+class AccountHealth(object):
+    """The recent history of an account of a ``CredentialPool``."""
+
+    def __init__(self, address: str):
+        """Inits
+
+        Args:
+            address: the checksum address of the account.
+        """
+        self.address = address
+        self.in_use = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[Exception] = None
+
+    def cooling_down(self, now: float) -> bool:
+        """Whether the account failed too often to be tried before the others."""
+        return now < self.cooldown_until
+
+
+class CredentialPool(object):
+    """Ranks the gas payers of an endpoint by health and load.
+
+    >>> pool = CredentialPool(balances=False)
+    >>> a = ("0x1413862C2B7054CDbfdc181B83962CB0FC11fD92", "")
+    >>> b = ("0x61F9F0B31eacB420553da8BCC59DC617279731Ac", "")
+    >>> pool.record_failure(a[0])
+    >>> pool.record_failure(a[0])
+    >>> pool.ranked([a, b]) == [b, a]
+    True
+    >>> pool.record_success(a[0])
+    >>> with pool.use(b[0]):
+    ...     pool.ranked([a, b]) == [a, b]
+    True
+
+    """
+
+    def __init__(
+        self,
+        hmt_server_addr: str = None,
+        max_failures: int = CREDENTIAL_MAX_FAILURES,
+        cooldown: float = CREDENTIAL_COOLDOWN,
+        max_cooldown: float = CREDENTIAL_MAX_COOLDOWN,
+        balance_ttl: float = CREDENTIAL_BALANCE_TTL,
+        min_balance: int = CREDENTIAL_MIN_BALANCE,
+        balances: bool = True,
+        timer: Callable[[], float] = monotonic,
+    ):
+        """Inits
+
+        Args:
+            hmt_server_addr: the endpoint the accounts send their transactions to.
+            max_failures: consecutive failures after which an account cools down.
+            cooldown: seconds of the first cooldown of an account.
+            max_cooldown: longest cooldown of an account.
+            balance_ttl: seconds the balance of an account stays cached.
+            min_balance: accounts with at most this balance in wei are tried last.
+            balances: whether to read the balances of the accounts at all.
+            timer: the clock cooldowns are measured with.
+        """
+        self.hmt_server_addr = hmt_server_addr
+        self.max_failures = max(1, max_failures)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.min_balance = min_balance
+        self.balances = balances
+        self._timer = timer
+        self._health: Dict[str, AccountHealth] = {}
+        self._balances = LRUCache(maxsize=4096, ttl=balance_ttl, timer=timer)
+        self._lock = threading.Lock()
+
+    def health(self, address: str) -> AccountHealth:
+        """Returns the health of an account, tracked from now on if it wasn't."""
+        address = Web3.toChecksumAddress(address)
+        with self._lock:
+            health = self._health.get(address)
+            if health is None:
+                health = AccountHealth(address)
+                self._health[address] = health
+            return health
+
+    def balance(self, address: str) -> Optional[int]:
+        """Returns the cached ETH balance of an account in wei.
+
+        Returns:
+            Optional[int]: the balance, None if it couldn't be read.
+
+        """
+        address = Web3.toChecksumAddress(address)
+        balance = self._balances.get(address)
+        if balance is None:
+            try:
+                balance = get_w3(self.hmt_server_addr).eth.get_balance(address)
+            except Exception as e:
+                LOG.debug(f"Failed to read the balance of {address}: {e}")
+                return None
+            self._balances.set(address, balance)
+        return balance
+
+    def load(self, address: str) -> int:
+        """Returns the number of transactions in flight with an account."""
+        health = self.health(address)
+        nonces = get_nonce_manager(get_w3(self.hmt_server_addr), health.address)
+        return health.in_use + nonces.in_flight
+
+    def ranked(self, credentials: Iterable[Credential]) -> List[Credential]:
+        """Orders credentials from the most to the least likely to succeed.
+
+        Accounts cooling down come last, then come the accounts without
+        enough balance. The others are ordered by load then recent failures,
+        and keep their given order when equal.
+
+        Args:
+            credentials (Iterable[Tuple[str, str]]): addresses and their private keys.
+
+        Returns:
+            List[Tuple[str, str]]: the same credentials, best first.
+
+        """
+        now = self._timer()
+        keys = {}
+        for credential in credentials:
+            health = self.health(credential[0])
+            balance = self.balance(health.address) if self.balances else None
+            keys[credential] = (
+                health.cooling_down(now),
+                balance is not None and balance <= self.min_balance,
+                self.load(health.address),
+                health.failures,
+            )
+        return sorted(keys, key=keys.__getitem__)
+
+    @contextmanager
+    def use(self, address: str) -> Iterator[AccountHealth]:
+        """Counts a transaction handled with an account as in flight."""
+        health = self.health(address)
+        with self._lock:
+            health.in_use += 1
+        try:
+            yield health
+        finally:
+            with self._lock:
+                health.in_use -= 1
+
+    def record_success(self, address: str):
+        """Marks an account as healthy after one of its transactions was mined."""
+        health = self.health(address)
+        with self._lock:
+            health.failures = 0
+            health.cooldown_until = 0.0
+            health.last_error = None
+        # The transaction spent gas.
+        self._balances.pop(health.address)
+
+    def record_failure(self, address: str, error: Exception = None):
+        """Marks a failed transaction of an account, cooling it down if it
+        keeps failing."""
+        health = self.health(address)
+        with self._lock:
+            health.failures += 1
+            health.last_error = error
+            if health.failures >= self.max_failures:
+                cooldown = min(
+                    self.cooldown * 2 ** (health.failures - self.max_failures),
+                    self.max_cooldown,
+                )
+                health.cooldown_until = self._timer() + cooldown
+                LOG.info(
+                    f"{health.address} failed {health.failures} times in a row, "
+                    f"cooling down for {cooldown} seconds"
+                )
+        self._balances.pop(health.address)
+
+
+def get_credential_pool(hmt_server_addr: str = None) -> CredentialPool:
+    """Returns the process-wide credential pool of an endpoint.
+
+    Args:
+        hmt_server_addr (str): the endpoint the transactions are sent to.
+
+    Returns:
+        CredentialPool: the pool shared by all the jobs using the endpoint.
+
+    """
+    endpoint = hmt_server_addr or os.getenv("HMT_ETH_SERVER", "http://localhost:8545")
+    return _POOLS.get_or_set(endpoint, lambda: CredentialPool(hmt_server_addr))
+
+
+def clear_credential_pools():
+    """Drops all the credential pools."""
+    _POOLS.clear()
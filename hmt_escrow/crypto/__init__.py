@@ -1,12 +1,15 @@
 import codecs
 import os
 
-from eth_keys import keys as eth_keys
+from hmt_escrow.keyring import get_keyring
+from hmt_escrow.lazy import lazy_import
 
-from .encryption import Encryption
 from .exceptions import *
 
-encryption = Encryption()
+# cryptography and eth_keys are only imported on the first encryption.
+eth_keys = lazy_import("eth_keys")
+_encryption_module = lazy_import("hmt_escrow.crypto.encryption")
+_ENCRYPTION = None
 
 SHARED_MAC_DATA: bytes = os.getenv(
     "SHARED_MAC", "9da0d3721774843193737244a0f3355191f66ff7321e83eae83f7f746eb34350"
@@ -25,8 +28,8 @@ def decrypt(private_key: bytes, msg: bytes) -> str:
     Returns:
         str: returns the plaintext equivalent to the originally encrypted one.
     """
-    priv_key = eth_keys.PrivateKey(codecs.decode(private_key, "hex"))
-    e = encryption.decrypt(msg, priv_key, shared_mac_data=SHARED_MAC_DATA)
+    priv_key = get_keyring().key(private_key).private_key
+    e = _get_encryption().decrypt(msg, priv_key, shared_mac_data=SHARED_MAC_DATA)
     return e.decode("utf-8")
 
 
@@ -42,11 +45,31 @@ def encrypt(public_key: bytes, msg: str) -> bytes:
         bytes: returns the cryptotext encrypted with the public key.
 
     """
-    pub_key = eth_keys.PublicKey(codecs.decode(public_key, "hex"))
+    pub_key = eth_keys.keys.PublicKey(codecs.decode(public_key, "hex"))
     msg_bytes = msg.encode("utf-8")
-    return encryption.encrypt(msg_bytes, pub_key, shared_mac_data=SHARED_MAC_DATA)
+    return _get_encryption().encrypt(
+        msg_bytes, pub_key, shared_mac_data=SHARED_MAC_DATA
+    )
 
 
 def is_encrypted(msg: bytes) -> bool:
     """Returns whether message is already encrypted."""
-    return encryption.is_encrypted(msg)
+    return _get_encryption().is_encrypted(msg)
+
+
+def _get_encryption():
+    global _ENCRYPTION, encryption
+    if _ENCRYPTION is None:
+        _ENCRYPTION = _encryption_module.Encryption()
+        # Importing the submodule bound its name on the package.
+        encryption = _ENCRYPTION
+    return _ENCRYPTION
+
+
+def __getattr__(name: str):
+    if name == "encryption":
+        return _get_encryption()
+    if name == "Encryption":
+        _get_encryption()
+        return _encryption_module.Encryption
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,33 @@
 import logging
+import math
 import os
-from time import sleep
-from typing import Dict, Any
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from time import monotonic, sleep
+from typing import Dict, Any, List, Optional, Tuple
 
-from eth_typing import ChecksumAddress, HexAddress, HexStr, URI
-from solcx import compile_files
+from eth_typing import ChecksumAddress, HexAddress, HexStr
+from hexbytes import HexBytes
 from web3 import Web3
-from web3._utils.transactions import wait_for_transaction_receipt
 from web3.contract import Contract
-from web3.middleware import geth_poa_middleware
-from web3.providers.auto import load_provider_from_uri
-from web3.providers.eth_tester import EthereumTesterProvider
+from web3.exceptions import TimeExhausted, TransactionNotFound
 from web3.types import TxReceipt
 
+from hmt_escrow.artifacts import (
+    CONTRACT_FOLDER,
+    load_all_interfaces,
+    load_contract_interface,
+)
+from hmt_escrow.broadcast import Broadcaster, send_raw_transaction
+from hmt_escrow.cache import CacheInfo, LRUCache
+from hmt_escrow.gas import GAS_ESTIMATION, GAS_ESTIMATOR, GasLimitExceeded
+from hmt_escrow.keyring import get_keyring
 from hmt_escrow.kvstore_abi import abi as kvstore_abi
+from hmt_escrow.logs import LogWatcher, Subscription, get_log_watcher
+from hmt_escrow.nonce import NonceManager, get_nonce_manager
+from hmt_escrow.providers import get_web3
+from hmt_escrow.receipts import WEB3_BLOCK_POLL_INTERVAL, get_receipt_waiter
+from hmt_escrow.rpc import batch_call
 
 AttributeDict = Dict[str, Any]
 
@@ -24,24 +38,50 @@ HMTOKEN_ADDR = Web3.toChecksumAddress(
     os.getenv("HMTOKEN_ADDR", "0x4C18A2E51edC5043e9c4B6b0757990A4Ac13797f")
 )
 
-CONTRACT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "contracts")
-CONTRACTS = compile_files(
-    [
-        "{}/Escrow.sol".format(CONTRACT_FOLDER),
-        "{}/EscrowFactory.sol".format(CONTRACT_FOLDER),
-        "{}/HMToken.sol".format(CONTRACT_FOLDER),
-        "{}/HMTokenInterface.sol".format(CONTRACT_FOLDER),
-        "{}/SafeMath.sol".format(CONTRACT_FOLDER),
-    ]
-)
-
 # See more details about the eth-kvstore here: https://github.com/hCaptcha/eth-kvstore
 KVSTORE_CONTRACT = Web3.toChecksumAddress(
     os.getenv("KVSTORE_CONTRACT", "0xbcF8274FAb0cbeD0099B2cAFe862035a6217Bf44")
 )
-WEB3_POLL_LATENCY = float(os.getenv("WEB3_POLL_LATENCY", 5))
 WEB3_TIMEOUT = int(os.getenv("WEB3_TIMEOUT", 240))
 
+# Blocks a transaction may stay pending before it is replaced with higher fees.
+STUCK_TXN_BLOCKS = int(os.getenv("STUCK_TXN_BLOCKS", 3))
+
+# Factor the fees of a replacement transaction are bumped by, nodes require
+# at least 10% more to accept a replacement.
+FEE_BUMP = float(os.getenv("FEE_BUMP", 1.125))
+
+# Most replacements of a transaction with bumped fees, the fees compound.
+MAX_FEE_BUMPS = int(os.getenv("MAX_FEE_BUMPS", 5))
+
+# Highest gasPrice or maxFeePerGas of a replacement transaction in wei, no
+# limit if 0.
+MAX_FEE_PER_GAS = int(os.getenv("MAX_FEE_PER_GAS", 0))
+
+# Maximum number of contract handles kept by get_escrow, get_factory and get_hmtoken.
+CONTRACT_CACHE_SIZE = int(os.getenv("CONTRACT_CACHE_SIZE", 4096))
+
+# Seconds a public key read from the KVStore stays cached.
+PUB_KEY_CACHE_TTL = float(os.getenv("PUB_KEY_CACHE_TTL", 3600))
+
+# Maximum number of cached public keys per endpoint.
+PUB_KEY_CACHE_SIZE = int(os.getenv("PUB_KEY_CACHE_SIZE", 4096))
+
+# Topic of the KVStore event emitted when an account saves a value. The ABI
+# in kvstore_abi declares no events, this is the signature of the deployed
+# KVStore contract.
+DATA_SAVED_TOPIC = Web3.keccak(text="DataSaved(address,string,string)")
+
+# Contract handles keyed by (contract type, address, endpoint).
+CONTRACT_CACHE = LRUCache(maxsize=CONTRACT_CACHE_SIZE)
+
+# Contract classes holding the ABI-derived functions and events, keyed by
+# (contract type, endpoint) and shared by all the handles of that type.
+_CONTRACT_CLASSES = LRUCache(maxsize=64)
+
+# Public key resolvers keyed by endpoint.
+_PUB_KEY_RESOLVERS = LRUCache(maxsize=64)
+
 
 class Retry(object):
     """Retry class holding retry parameters"""
@@ -62,6 +102,9 @@ class Retry(object):
 def get_w3(hmt_server_addr: str = None) -> Web3:
     """Set up the web3 provider for serving transactions to the ethereum network.
 
+    The web3 instance is shared by every caller using the same endpoint, see
+    ``hmt_escrow.providers``.
+
     >>> w3 = get_w3()
     >>> type(w3)
     <class 'web3.main.Web3'>
@@ -74,6 +117,8 @@ def get_w3(hmt_server_addr: str = None) -> Web3:
     <class 'web3.main.Web3'>
     >>> type(w3.provider)
     <class 'web3.providers.websocket.WebsocketProvider'>
+    >>> get_w3() is w3
+    True
     >>> del os.environ["HMT_ETH_SERVER"]
 
     Args:
@@ -83,30 +128,280 @@ def get_w3(hmt_server_addr: str = None) -> Web3:
         Web3: returns the web3 provider.
 
     """
-    endpoint = None
+    return get_web3(_endpoint(hmt_server_addr))
 
-    if hmt_server_addr:
-        endpoint = hmt_server_addr
 
-    if not endpoint:
-        endpoint = os.getenv("HMT_ETH_SERVER", "http://localhost:8545")
+def _endpoint(hmt_server_addr: str = None) -> str:
+    return hmt_server_addr or os.getenv("HMT_ETH_SERVER", "http://localhost:8545")
 
-    if not endpoint:
-        LOG.error("Using EthereumTesterProvider as we have no HMT_ETH_SERVER")
 
-    provider = (
-        load_provider_from_uri(URI(endpoint)) if endpoint else EthereumTesterProvider()
-    )
+class TransactionHandle(object):
+    """A broadcast transaction whose receipt may not be available yet.
 
-    w3 = Web3(provider)
-    w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-    return w3
+    Returned by ``submit_transaction``. Call ``result`` to wait for the
+    receipt, or ``gather_receipts`` to wait for several transactions at once.
+    The receipt is resolved by the ``ReceiptWaiter`` of the endpoint, which
+    follows the new blocks instead of polling for every transaction.
 
+    A transaction still pending after ``STUCK_TXN_BLOCKS`` blocks is replaced
+    by the same transaction, same nonce, with fees bumped by ``FEE_BUMP``. The
+    replacements stop after ``MAX_FEE_BUMPS`` of them, or once the fees would
+    exceed ``MAX_FEE_PER_GAS``, see ``bump_fees``.
+    Only one of them can be mined, the handle waits for all of them and
+    returns the receipt of the one that was.
+    """
 
-def handle_transaction(txn_func, *args, **kwargs) -> TxReceipt:
-    """Handles a transaction that updates the contract state by locally
-    signing, building, sending the transaction and returning a transaction
-    receipt.
+    def __init__(
+        self,
+        w3: Web3,
+        txn_hash: bytes,
+        nonce: int,
+        nonces: NonceManager,
+        txn_dict: Dict[str, Any] = None,
+        private_key: str = None,
+        stuck_blocks: int = STUCK_TXN_BLOCKS,
+        broadcaster: Broadcaster = None,
+    ):
+        """Inits
+
+        Args:
+            w3: the web3 instance the transaction was sent with.
+            txn_hash: the hash of the broadcast transaction.
+            nonce: the nonce of the transaction.
+            nonces: the nonce manager the nonce was reserved from.
+            txn_dict: the unsigned transaction, needed to replace it.
+            private_key: the key the transaction was signed with, needed to replace it.
+            stuck_blocks: blocks after which a pending transaction is
+                replaced, never if None.
+            broadcaster: broadcasts the replacements, see ``hmt_escrow.broadcast``.
+        """
+        self.w3 = w3
+        self.txn_hash = HexBytes(txn_hash)
+        self.hashes = [self.txn_hash]
+        self.nonce = nonce
+        self.stuck_blocks = stuck_blocks
+        self._nonces = nonces
+        self._txn_dict = txn_dict
+        self._private_key = private_key
+        self._broadcaster = broadcaster
+        self._sent_block: Optional[int] = None
+        self._bumps = 0
+        self._capped = False
+        self._futures: Dict[HexBytes, Future] = {}
+        self._waiter = get_receipt_waiter(w3)
+        self._watch(self.txn_hash)
+
+    @property
+    def gas(self) -> Optional[int]:
+        """The gas the transaction was sent with, None if it is unknown."""
+        return self._txn_dict.get("gas") if self._txn_dict else None
+
+    def done(self) -> bool:
+        """Returns whether the transaction has been mined, without blocking."""
+        return any(
+            future.done() and not future.cancelled()
+            for future in self._futures.values()
+        )
+
+    def result(self, timeout: float = None) -> TxReceipt:
+        """Waits for the transaction or one of its replacements to be mined.
+
+        Args:
+            timeout: seconds to wait for the receipt, defaults to WEB3_TIMEOUT.
+
+        Returns:
+            AttributeDict: returns the transaction receipt.
+
+        Raises:
+            TimeExhausted: if waiting for the transaction receipt times out.
+
+        """
+        for txn_hash, future in list(self._futures.items()):
+            if future.cancelled():
+                self._watch(txn_hash)
+
+        timeout = WEB3_TIMEOUT if timeout is None else timeout
+        deadline = monotonic() + timeout
+        while True:
+            done, _ = wait(
+                list(self._futures.values()),
+                timeout=min(max(deadline - monotonic(), 0), WEB3_BLOCK_POLL_INTERVAL),
+                return_when=FIRST_COMPLETED,
+            )
+            done = {future for future in done if not future.cancelled()}
+            if done:
+                return self._settle(done.pop())
+
+            if monotonic() >= deadline:
+                self._forget()
+                # The node might have dropped the transaction, it knows the next nonce.
+                self._nonces.resync()
+                raise TimeExhausted(
+                    f"Transaction {self.txn_hash.hex()} is not in the "
+                    f"chain after {timeout} seconds"
+                )
+
+            if self._stuck():
+                try:
+                    self.speed_up()
+                except Exception as e:
+                    LOG.warning(f"Failed to replace {self.txn_hash.hex()}: {e}")
+
+    def speed_up(self) -> HexBytes:
+        """Broadcasts a replacement of the transaction with bumped fees.
+
+        Returns:
+            HexBytes: the hash of the replacement, or of the current
+            transaction if the node refused the replacement, e.g. because
+            the transaction was mined meanwhile, or if its fees reached
+            their cap.
+
+        Raises:
+            ValueError: if the transaction was not signed by ``submit_transaction``.
+
+        """
+        if self._txn_dict is None or self._private_key is None:
+            raise ValueError("Only locally signed transactions can be replaced.")
+
+        txn_dict = bump_fees(self._txn_dict, self._bumps)
+        if txn_dict is None:
+            if not self._capped:
+                LOG.info(f"Not replacing {self.txn_hash.hex()}, its fees are capped")
+            self._capped = True
+            return self.txn_hash
+        signed_txn = (
+            get_keyring().key(self._private_key).account.sign_transaction(txn_dict)
+        )
+        self._sent_block = self._waiter.head
+
+        try:
+            txn_hash = send_raw_transaction(
+                self.w3, signed_txn.rawTransaction, self._broadcaster
+            )
+        except ValueError as e:
+            LOG.info(f"Replacement of {self.txn_hash.hex()} refused: {e}")
+            return self.txn_hash
+
+        LOG.info(f"Replaced {self.txn_hash.hex()} with {txn_hash.hex()}")
+        self._txn_dict = txn_dict
+        self._bumps += 1
+        self.txn_hash = txn_hash
+        self.hashes.append(txn_hash)
+        self._watch(txn_hash)
+        return txn_hash
+
+    def abandon(self):
+        """Gives up on the transaction once its last wait timed out.
+
+        A transaction dropped by the node leaves a gap at its nonce, which
+        every later transaction of the account would wait behind. When the
+        node knows none of the hashes and its pending count doesn't cover the
+        nonce, the nonce is released so the next transaction fills the gap.
+        """
+        self._forget()
+        address = self._nonces.address
+        try:
+            pending = self.w3.eth.get_transaction_count(address, "pending")
+            if pending <= self.nonce and not any(map(self._known, self.hashes)):
+                LOG.info(
+                    f"{self.txn_hash.hex()} was dropped, reusing nonce {self.nonce} of {address}"
+                )
+                self._nonces.release(self.nonce)
+            self._nonces.resync(pending)
+        except Exception as e:
+            LOG.debug(f"Failed to check whether {self.txn_hash.hex()} was dropped: {e}")
+
+    def _known(self, txn_hash: HexBytes) -> bool:
+        try:
+            self.w3.eth.get_transaction(txn_hash)
+        except TransactionNotFound:
+            return False
+        return True
+
+    def _stuck(self) -> bool:
+        if self.stuck_blocks is None or self._txn_dict is None or self._capped:
+            return False
+
+        head = self._waiter.head
+        if head is None:
+            return False
+        if self._sent_block is None:
+            self._sent_block = head
+            return False
+        return head - self._sent_block >= self.stuck_blocks
+
+    def _settle(self, future: Future) -> TxReceipt:
+        # Only one transaction of the nonce is mined, the others never will be.
+        self._forget()
+        try:
+            receipt = future.result()
+        except Exception as e:
+            self._nonces.resync()
+            raise e
+        self.txn_hash = HexBytes(receipt.get("transactionHash", self.txn_hash))
+        return receipt
+
+    def _forget(self):
+        for txn_hash in self.hashes:
+            self._waiter.forget(txn_hash)
+
+    def _watch(self, txn_hash: HexBytes):
+        future = self._waiter.watch(txn_hash)
+        future.add_done_callback(self._mined)
+        self._futures[txn_hash] = future
+
+    def _mined(self, future: Future):
+        if not future.cancelled():
+            self._nonces.confirm(self.nonce)
+
+
+def bump_fees(txn_dict: Dict[str, Any], bumps: int) -> Optional[Dict[str, Any]]:
+    """Returns the fees of a replacement transaction bumped by ``FEE_BUMP``.
+
+    >>> bump_fees({"gasPrice": 100, "nonce": 3}, 0)
+    {'gasPrice': 113, 'nonce': 3}
+    >>> bump_fees({"gasPrice": 100, "nonce": 3}, MAX_FEE_BUMPS) is None
+    True
+
+    Args:
+        txn_dict (Dict[str, Any]): the transaction to replace.
+
+        bumps (int): the number of times its fees were bumped already.
+
+    Returns:
+        Dict[str, Any]: the replacement transaction, None if it would exceed
+        ``MAX_FEE_BUMPS`` bumps or ``MAX_FEE_PER_GAS``.
+
+    """
+    if bumps >= MAX_FEE_BUMPS:
+        return None
+
+    txn_dict = dict(txn_dict)
+    for field in ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas"):
+        if field in txn_dict:
+            txn_dict[field] = int(math.ceil(txn_dict[field] * FEE_BUMP))
+    fee = txn_dict.get("maxFeePerGas", txn_dict.get("gasPrice"))
+    if MAX_FEE_PER_GAS and fee is not None and fee > MAX_FEE_PER_GAS:
+        return None
+    return txn_dict
+
+
+def submit_transaction(txn_func, *args, **kwargs) -> TransactionHandle:
+    """Locally signs, builds and sends a transaction that updates the contract
+    state, without waiting for it to be mined.
+
+    Nonces are reserved from the gas payer's ``NonceManager``, so several
+    transactions of the same gas payer can be in flight at once and the caller
+    can do other work while they are mined.
+
+    With ``estimate_gas`` (or the GAS_ESTIMATION environment variable) the
+    transaction uses its estimated gas, see ``hmt_escrow.gas``, and ``gas``
+    is only an upper bound.
+
+    A ``fee_strategy`` decides the fee fields, see ``hmt_escrow.fees``.
+
+    A ``broadcaster`` (or the BROADCAST_ENDPOINTS environment variable) sends
+    the signed transaction to several nodes at once, see ``hmt_escrow.broadcast``.
 
     Args:
         txn_func: the transaction function to be handled.
@@ -116,10 +411,11 @@ def handle_transaction(txn_func, *args, **kwargs) -> TxReceipt:
         \*\*kwargs: the transaction data used to complete the transaction.
 
     Returns:
-        AttributeDict: returns the transaction receipt.
+        TransactionHandle: returns a handle on the broadcast transaction.
 
     Raises:
-        TimeoutError: if waiting for the transaction receipt times out.
+        GasLimitExceeded: if the estimated gas is more than ``gas``.
+
     """
     gas_payer = kwargs["gas_payer"]
     gas_payer_priv = kwargs["gas_payer_priv"]
@@ -127,22 +423,192 @@ def handle_transaction(txn_func, *args, **kwargs) -> TxReceipt:
     hmt_server_addr = kwargs.get("hmt_server_addr")
 
     w3 = get_w3(hmt_server_addr)
-    nonce = w3.eth.getTransactionCount(gas_payer)
+    txn = txn_func(*args)
+    if kwargs.get("estimate_gas", GAS_ESTIMATION):
+        gas = GAS_ESTIMATOR.estimate(txn, args, gas_payer, gas)
 
-    txn_dict = txn_func(*args).buildTransaction(
-        {"from": gas_payer, "gas": gas, "nonce": nonce}
-    )
+    fee_strategy = kwargs.get("fee_strategy")
+    fees = fee_strategy.fees(w3) if fee_strategy else {}
 
-    signed_txn = w3.eth.account.signTransaction(txn_dict, private_key=gas_payer_priv)
-    txn_hash = w3.eth.sendRawTransaction(signed_txn.rawTransaction)
+    nonces = get_nonce_manager(w3, gas_payer)
+    nonce = nonces.reserve()
 
     try:
-        txn_receipt = wait_for_transaction_receipt(
-            w3, txn_hash, timeout=WEB3_TIMEOUT, poll_latency=WEB3_POLL_LATENCY
+        txn_dict = txn.buildTransaction(
+            {"from": gas_payer, "gas": gas, "nonce": nonce, **fees}
+        )
+        signed_txn = (
+            get_keyring().key(gas_payer_priv).account.sign_transaction(txn_dict)
         )
-    except TimeoutError as e:
+    except Exception as e:
+        nonces.release(nonce)
         raise e
-    return txn_receipt
+
+    broadcaster = kwargs.get("broadcaster")
+    try:
+        txn_hash = send_raw_transaction(w3, signed_txn.rawTransaction, broadcaster)
+    except Exception as e:
+        # The node rejected the transaction, it knows the next nonce.
+        nonces.release(nonce)
+        nonces.resync()
+        raise e
+
+    return TransactionHandle(
+        w3,
+        txn_hash,
+        nonce,
+        nonces,
+        txn_dict=txn_dict,
+        private_key=gas_payer_priv,
+        broadcaster=broadcaster,
+    )
+
+
+def gather_receipts(
+    handles: List[TransactionHandle],
+    timeout: float = None,
+    return_exceptions: bool = False,
+) -> List[Any]:
+    """Waits for several submitted transactions to be mined.
+
+    >>> from test.hmt_escrow.utils import create_job
+    >>> job = create_job()
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> txn_info = {"gas_payer": job.gas_payer, "gas_payer_priv": job.gas_payer_priv, "gas": GAS_LIMIT}
+    >>> hmtoken = get_hmtoken()
+    >>> handles = [
+    ...     submit_transaction(hmtoken.functions.transfer, job.job_contract.address, 1, **txn_info),
+    ...     submit_transaction(hmtoken.functions.transfer, job.job_contract.address, 2, **txn_info),
+    ... ]
+    >>> [receipt["status"] for receipt in gather_receipts(handles)]
+    [1, 1]
+
+    Args:
+        handles (List[TransactionHandle]): the handles of the transactions.
+
+        timeout (float): seconds to wait for all the receipts, defaults to WEB3_TIMEOUT.
+
+        return_exceptions (bool): whether to return the errors of failed waits
+            in place of their receipts instead of raising the first one.
+
+    Returns:
+        List: returns the transaction receipts in the order of the handles.
+
+    Raises:
+        TimeExhausted: if waiting for a transaction receipt times out.
+
+    """
+    deadline = monotonic() + (WEB3_TIMEOUT if timeout is None else timeout)
+    receipts: List[Any] = []
+    for handle in handles:
+        try:
+            receipts.append(handle.result(max(deadline - monotonic(), 0)))
+        except Exception as e:
+            if not return_exceptions:
+                raise e
+            receipts.append(e)
+    return receipts
+
+
+def handle_transaction(txn_func, *args, **kwargs) -> TxReceipt:
+    """Handles a transaction that updates the contract state by locally
+    signing, building, sending the transaction and returning a transaction
+    receipt.
+
+    Args:
+        txn_func: the transaction function to be handled.
+
+        \*args: all the arguments the function takes.
+
+        \*\*kwargs: the transaction data used to complete the transaction.
+
+    Returns:
+        AttributeDict: returns the transaction receipt.
+
+    Raises:
+        TimeExhausted: if waiting for the transaction receipt times out.
+    """
+    handle = submit_transaction(txn_func, *args, **kwargs)
+    try:
+        return handle.result()
+    except TimeExhausted as e:
+        handle.abandon()
+        raise e
+
+
+def wait_for_transaction(handle: TransactionHandle, retries: int = 0) -> TxReceipt:
+    """Waits for a submitted transaction, replacing it with bumped fees every
+    time the wait times out.
+
+    The transaction is never sent again with a new nonce, so it is executed
+    at most once even if the original is mined after all. After the last wait
+    the handle is abandoned, which frees the nonce of a dropped transaction.
+
+    Args:
+        handle (TransactionHandle): the handle returned by ``submit_transaction``.
+
+        retries (int): number of replacements before giving up.
+
+    Returns:
+        AttributeDict: returns the transaction receipt.
+
+    Raises:
+        TimeExhausted: if the transaction or its replacements are still not
+            mined after the last wait. They might still be mined later.
+
+    """
+    for i in range(retries + 1):
+        try:
+            return handle.result()
+        except TimeExhausted as e:
+            if i == retries:
+                LOG.debug(f"giving up on transaction after {i} replacements")
+                handle.abandon()
+                raise e
+            LOG.debug(f"(x{i + 1}) wait_for_transaction: {e}. Replacing it...")
+            try:
+                handle.speed_up()
+            except Exception as speed_up_error:
+                LOG.debug(f"Failed to replace the transaction: {speed_up_error}")
+
+    raise Exception("give up on wait_for_transaction")
+
+
+def out_of_estimated_gas(handle, receipt: TxReceipt, txn_func, *args, **kwargs) -> bool:
+    """Whether a transaction failed for running out of its estimated gas.
+
+    The estimate is dropped from the cache, the transaction should be sent
+    again with ``estimate_gas=False`` to use its gas limit.
+
+    Args:
+        handle: the handle of the transaction.
+
+        receipt (TxReceipt): the receipt of the transaction.
+
+        txn_func: the transaction function.
+
+        \*args: all the arguments the function takes.
+
+        \*\*kwargs: the transaction data the transaction was sent with.
+
+    Returns:
+        bool: returns True if the estimated gas was too low.
+
+    """
+    gas = handle.gas
+    if not kwargs.get("estimate_gas", GAS_ESTIMATION) or gas is None:
+        return False
+    if gas >= kwargs["gas"] or not GAS_ESTIMATOR.ran_out(receipt, gas):
+        return False
+
+    LOG.info(
+        f"{handle.txn_hash.hex()} ran out of its estimated {gas} gas, "
+        f"sending it again with {kwargs['gas']}"
+    )
+    GAS_ESTIMATOR.forget(txn_func(*args), args)
+    return True
 
 
 def handle_transaction_with_retry(
@@ -150,7 +616,13 @@ def handle_transaction_with_retry(
 ) -> TxReceipt:
     """Handle transaction
 
-    Same as ``handle_transaction`` but with retry and backoff
+    Same as ``handle_transaction`` but with retry and backoff.
+
+    A transaction which is still pending when the wait times out is not sent
+    again with a new nonce, which could execute it twice: it is replaced by
+    the same transaction with bumped fees and waited for again. Only failures
+    to send a transaction lead to a new one, after the backoff delay, and
+    transactions which ran out of their estimated gas, with their gas limit.
 
     Args:
         txn_func: the transaction function to be handled.
@@ -167,11 +639,25 @@ def handle_transaction_with_retry(
     """
 
     wait_time = retry.delay
+    handle = None
 
     for i in range(retry.retries + 1):
         try:
-            return handle_transaction(txn_func, *args, **kwargs)
+            if handle is None:
+                handle = submit_transaction(txn_func, *args, **kwargs)
+            receipt = handle.result()
+        except TimeExhausted as e:
+            if i == retry.retries:
+                LOG.debug(f"giving up on transaction after {i} retries")
+                handle.abandon()
+                raise e
+            LOG.debug(f"(x{i + 1}) handle_transaction: {e}. Replacing it...")
+            try:
+                handle.speed_up()
+            except Exception as speed_up_error:
+                LOG.debug(f"Failed to replace the transaction: {speed_up_error}")
         except Exception as e:
+            handle = None
             if i == retry.retries:
                 LOG.debug(f"giving up on transaction after {i} retries")
                 raise e
@@ -181,23 +667,102 @@ def handle_transaction_with_retry(
                 )
                 sleep(wait_time)
                 wait_time *= retry.backoff
+        else:
+            if out_of_estimated_gas(handle, receipt, txn_func, *args, **kwargs):
+                return handle_transaction_with_retry(
+                    txn_func, retry, *args, **dict(kwargs, estimate_gas=False)
+                )
+            return receipt
 
     raise Exception("give up on handle_transaction")
 
 
+def __getattr__(name: str):
+    # CONTRACTS used to be compiled at import time, keep it available on demand.
+    if name == "CONTRACTS":
+        return {
+            "{}/{}:{}".format(
+                CONTRACT_FOLDER, interface["sourcePath"], contract_name
+            ): interface
+            for contract_name, interface in load_all_interfaces().items()
+        }
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_contract_interface(contract_entrypoint):
     """Retrieve the contract interface of a given contract.
 
+    The interface is loaded lazily from the prebuilt contract artifacts, see
+    ``hmt_escrow.artifacts``.
+
     Args:
-        contract_entrypoint: the entrypoint of the compiled source.
+        contract_entrypoint: the entrypoint of the compiled source, e.g.
+            "contracts/Escrow.sol:Escrow".
 
     Returns:
         returns the contract interface containing the contract abi.
 
     """
-    compiled_sol = CONTRACTS
-    contract_interface = compiled_sol[contract_entrypoint]
-    return contract_interface
+    contract_name = contract_entrypoint.rsplit(":", 1)[-1]
+    return load_contract_interface(contract_name)
+
+
+def get_contract(
+    contract_name: str, address: str, abi: List = None, hmt_server_addr: str = None
+) -> Contract:
+    """Retrieve a contract handle from the contract cache.
+
+    Handles are kept in an LRU cache keyed by contract type, address and
+    endpoint. The ABI-derived contract class is built once per contract type
+    and endpoint and shared across addresses.
+
+    Args:
+        contract_name (str): the contract type, e.g. "Escrow".
+
+        address (str): the ethereum address of the contract.
+
+        abi (List): the contract abi, defaults to the compiled contract's abi.
+
+        hmt_server_addr (str): infura API address.
+
+    Returns:
+        Contract: returns the contract at the given address.
+
+    """
+    endpoint = _endpoint(hmt_server_addr)
+    w3 = get_web3(endpoint)
+
+    key = (contract_name, address, endpoint)
+    contract = CONTRACT_CACHE.get(key)
+    if contract is not None and contract.web3 is w3:
+        return contract
+
+    contract_class = _CONTRACT_CLASSES.get((contract_name, endpoint))
+    if contract_class is None or contract_class.web3 is not w3:
+        if abi is None:
+            abi = load_contract_interface(contract_name)["abi"]
+        contract_class = w3.eth.contract(abi=abi)
+        _CONTRACT_CLASSES.set((contract_name, endpoint), contract_class)
+
+    contract = contract_class(address=address)
+    CONTRACT_CACHE.set(key, contract)
+    return contract
+
+
+def contract_cache_info() -> CacheInfo:
+    """Returns the hit/miss counters and the size of the contract cache.
+
+    >>> contract_cache_info()  #doctest: +ELLIPSIS
+    CacheInfo(hits=..., misses=..., maxsize=4096, currsize=...)
+
+    """
+    return CONTRACT_CACHE.info()
+
+
+def clear_contract_cache():
+    """Drops all the cached contract handles and classes."""
+    CONTRACT_CACHE.clear()
+    _CONTRACT_CLASSES.clear()
 
 
 def get_hmtoken(hmtoken_addr=HMTOKEN_ADDR, hmt_server_addr: str = None) -> Contract:
@@ -213,12 +778,9 @@ def get_hmtoken(hmtoken_addr=HMTOKEN_ADDR, hmt_server_addr: str = None) -> Contr
         Contract: returns the HMToken solidity contract.
 
     """
-    w3 = get_w3(hmt_server_addr)
-    contract_interface = get_contract_interface(
-        "{}/HMTokenInterface.sol:HMTokenInterface".format(CONTRACT_FOLDER)
+    return get_contract(
+        "HMTokenInterface", hmtoken_addr, hmt_server_addr=hmt_server_addr
     )
-    contract = w3.eth.contract(address=hmtoken_addr, abi=contract_interface["abi"])
-    return contract
 
 
 def get_escrow(escrow_addr: str, hmt_server_addr: str = None) -> Contract:
@@ -247,16 +809,11 @@ def get_escrow(escrow_addr: str, hmt_server_addr: str = None) -> Contract:
         Contract: returns the Escrow solidity contract.
 
     """
-
-    w3 = get_w3(hmt_server_addr)
-    contract_interface = get_contract_interface(
-        "{}/Escrow.sol:Escrow".format(CONTRACT_FOLDER)
+    return get_contract(
+        "Escrow",
+        ChecksumAddress(HexAddress(HexStr(escrow_addr))),
+        hmt_server_addr=hmt_server_addr,
     )
-    escrow = w3.eth.contract(
-        address=ChecksumAddress(HexAddress(HexStr(escrow_addr))),
-        abi=contract_interface["abi"],
-    )
-    return escrow
 
 
 def get_factory(factory_addr: str, hmt_server_addr: str = None) -> Contract:
@@ -279,15 +836,11 @@ def get_factory(factory_addr: str, hmt_server_addr: str = None) -> Contract:
         Contract: returns the EscrowFactory solidity contract.
 
     """
-    w3 = get_w3(hmt_server_addr)
-    contract_interface = get_contract_interface(
-        "{}/EscrowFactory.sol:EscrowFactory".format(CONTRACT_FOLDER)
+    return get_contract(
+        "EscrowFactory",
+        ChecksumAddress(HexAddress(HexStr(factory_addr))),
+        hmt_server_addr=hmt_server_addr,
     )
-    escrow_factory = w3.eth.contract(
-        address=ChecksumAddress(HexAddress(HexStr(factory_addr))),
-        abi=contract_interface["abi"],
-    )
-    return escrow_factory
 
 
 def deploy_factory(
@@ -334,6 +887,153 @@ def deploy_factory(
     return str(contract_addr)
 
 
+class PubKeyResolver(object):
+    """Resolves the public keys stored in the KVStore, with a TTL/LRU cache.
+
+    Public keys almost never change, so they are cached for ``ttl`` seconds.
+    The resolver also subscribes to the ``DataSaved`` events of the KVStore
+    through the shared ``LogWatcher`` of the node and drops the cached keys of
+    the addresses which saved data, so updated keys are picked up before the
+    TTL. ``kvstore_abi`` declares no events, the event is assumed to have the
+    signature of ``DATA_SAVED_TOPIC``. Uncached keys are read in one JSON-RPC
+    batch.
+    """
+
+    def __init__(
+        self,
+        hmt_server_addr: str = None,
+        ttl: float = PUB_KEY_CACHE_TTL,
+        maxsize: int = PUB_KEY_CACHE_SIZE,
+    ):
+        """Inits
+
+        Args:
+            hmt_server_addr: the address of the ethereum node.
+            ttl: seconds a public key stays cached.
+            maxsize: maximum number of cached public keys.
+        """
+        self.hmt_server_addr = hmt_server_addr
+        self._keys = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._watch: Optional[Tuple[LogWatcher, Subscription]] = None
+        self._lock = threading.Lock()
+
+    def get(self, address: str, gas_payer: str) -> bytes:
+        """Returns the public key of an address."""
+        return self.get_many([address], gas_payer)[0]
+
+    def get_many(self, addresses: List[str], gas_payer: str) -> List[bytes]:
+        """Returns the public keys of several addresses.
+
+        Args:
+            addresses (List[str]): the ethereum addresses.
+            gas_payer (str): the ethereum address calling the KVStore.
+
+        Returns:
+            List[bytes]: the public keys in the order of the addresses.
+
+        """
+        self._follow_events()
+
+        addresses = [Web3.toChecksumAddress(address) for address in addresses]
+        found: Dict[str, bytes] = {}
+        for address in dict.fromkeys(addresses):
+            pub_key = self._keys.get(address)
+            if pub_key is not None:
+                found[address] = pub_key
+
+        missing = [
+            address for address in dict.fromkeys(addresses) if address not in found
+        ]
+        if missing:
+            kvstore = get_contract(
+                "KVStore",
+                KVSTORE_CONTRACT,
+                kvstore_abi,
+                hmt_server_addr=self.hmt_server_addr,
+            )
+            pub_keys = batch_call(
+                get_w3(self.hmt_server_addr),
+                [kvstore.functions.get(address, "hmt_pub_key") for address in missing],
+                gas_payer,
+                GAS_LIMIT,
+            )
+            for address, pub_key in zip(missing, pub_keys):
+                found[address] = bytes(pub_key, encoding="utf-8")
+                self._keys.set(address, found[address])
+
+        return [found[address] for address in addresses]
+
+    def invalidate(self, address: str):
+        """Drops the cached public key of an address."""
+        self._keys.pop(Web3.toChecksumAddress(address))
+
+    def process_logs(self, logs: List[Dict[str, Any]]):
+        """Drops the cached keys of the senders of KVStore ``DataSaved`` logs."""
+        for log in logs:
+            topics = [HexBytes(topic) for topic in log["topics"]]
+            if len(topics) > 1 and topics[0] == DATA_SAVED_TOPIC:
+                self.invalidate(Web3.toChecksumAddress(topics[1][-20:]))
+
+    def clear(self):
+        """Drops all the cached public keys."""
+        self._keys.clear()
+
+    def _follow_events(self):
+        watcher = get_log_watcher(get_w3(self.hmt_server_addr))
+        if self._watch is not None and self._watch[0] is watcher:
+            return
+
+        # Subscribing reads the head of the chain, outside of the lock.
+        watch = (
+            watcher,
+            watcher.subscribe(
+                KVSTORE_CONTRACT,
+                lambda log: self.process_logs([log]),
+                [DATA_SAVED_TOPIC],
+            ),
+        )
+        with self._lock:
+            if self._watch is not None and self._watch[0] is watcher:
+                stale = watch
+            else:
+                stale, self._watch = self._watch, watch
+                # The keys saved while no watcher was followed were missed.
+                self._keys.clear()
+        if stale is not None:
+            stale[0].unsubscribe(stale[1])
+
+
+def get_pub_key_resolver(hmt_server_addr: str = None) -> PubKeyResolver:
+    """Returns the process-wide public key resolver of an endpoint."""
+    return _PUB_KEY_RESOLVERS.get_or_set(
+        _endpoint(hmt_server_addr), lambda: PubKeyResolver(hmt_server_addr)
+    )
+
+
+def get_pub_keys_from_addrs(
+    wallet_addrs: List[str], hmt_server_addr: str = None
+) -> List[bytes]:
+    """Same as ``get_pub_key_from_addr`` for several addresses at once.
+
+    The keys which are not cached are read in one JSON-RPC batch.
+
+    Args:
+        wallet_addrs (List[str]): addresses to get the public keys of.
+
+        hmt_server_addr (str): infura API address.
+
+    Returns:
+        List[bytes]: the public keys in the order of the addresses.
+
+    """
+    GAS_PAYER = os.getenv("GAS_PAYER")
+
+    if not GAS_PAYER:
+        raise ValueError("environment variable GAS_PAYER required")
+
+    return get_pub_key_resolver(hmt_server_addr).get_many(wallet_addrs, GAS_PAYER)
+
+
 def get_pub_key_from_addr(wallet_addr: str, hmt_server_addr: str = None) -> bytes:
     """
     Given a wallet address, uses the kvstore to pull down the public key for a user
@@ -371,20 +1071,7 @@ def get_pub_key_from_addr(wallet_addr: str, hmt_server_addr: str = None) -> byte
     b'2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d'
 
     """
-    # TODO: Should we try to get the checksum address here instead of assuming user will do that?
-    GAS_PAYER = os.getenv("GAS_PAYER")
-
-    if not GAS_PAYER:
-        raise ValueError("environment variable GAS_PAYER required")
-
-    w3 = get_w3(hmt_server_addr)
-
-    kvstore = w3.eth.contract(address=KVSTORE_CONTRACT, abi=kvstore_abi)
-    addr_pub_key = kvstore.functions.get(GAS_PAYER, "hmt_pub_key").call(
-        {"from": GAS_PAYER}
-    )
-
-    return bytes(addr_pub_key, encoding="utf-8")
+    return get_pub_keys_from_addrs([wallet_addr], hmt_server_addr)[0]
 
 
 def set_pub_key_at_addr(
@@ -424,8 +1111,9 @@ def set_pub_key_at_addr(
     if not (GAS_PAYER or GAS_PAYER_PRIV):
         raise ValueError("environment variable GAS_PAYER AND GAS_PAYER_PRIV required")
 
-    w3 = get_w3(hmt_server_addr)
-    kvstore = w3.eth.contract(address=KVSTORE_CONTRACT, abi=kvstore_abi)
+    kvstore = get_contract(
+        "KVStore", KVSTORE_CONTRACT, kvstore_abi, hmt_server_addr=hmt_server_addr
+    )
 
     txn_func = kvstore.functions.set
     func_args = ["hmt_pub_key", pub_key]
@@ -436,4 +1124,6 @@ def set_pub_key_at_addr(
         "hmt_server_addr": hmt_server_addr,
     }
 
-    return handle_transaction(txn_func, *func_args, **txn_info)
+    txn_receipt = handle_transaction(txn_func, *func_args, **txn_info)
+    get_pub_key_resolver(hmt_server_addr).invalidate(GAS_PAYER)
+    return txn_receipt
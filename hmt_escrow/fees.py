@@ -0,0 +1,167 @@
+"""EIP-1559 fee strategies for the transactions sent by ``eth_bridge``.
+
+Without a strategy web3 fills in its default fees, which often lag behind
+during congestion. ``FeeHistoryOracle`` samples ``eth_feeHistory`` instead and
+derives ``maxFeePerGas`` and ``maxPriorityFeePerGas`` from the priority fees
+paid at a target percentile in the recent blocks. The history is cached per
+endpoint for a few seconds, so a burst of transactions costs one request.
+
+A strategy is passed to a ``Job`` with its ``fee_strategy`` argument, or to
+``handle_transaction`` in the transaction data.
+"""
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from web3 import Web3
+
+from hmt_escrow.cache import LRUCache
+
+LOG = logging.getLogger("hmt_escrow.fees")
+
+# Number of recent blocks sampled by the fee oracle.
+FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", 10))
+
+# Seconds a sampled fee history stays valid.
+FEE_HISTORY_TTL = float(os.getenv("FEE_HISTORY_TTL", 3))
+
+# Percentile of the priority fees paid in the sampled blocks to match.
+FEE_PERCENTILE = float(os.getenv("FEE_PERCENTILE", 60))
+
+# How many times the next base fee maxFeePerGas allows for.
+BASE_FEE_MULTIPLIER = float(os.getenv("BASE_FEE_MULTIPLIER", 2))
+
+Fees = Dict[str, int]
+
+
+class FeeStrategy(object):
+    """Decides the fee fields of the transactions.
+
+    The base strategy leaves the fees to web3.
+    """
+
+    def fees(self, w3: Web3) -> Fees:
+        """Returns the fee fields of a transaction sent with w3."""
+        return {}
+
+    async def fees_async(self, w3: Web3) -> Fees:
+        """Returns the fee fields of a transaction sent with an asyncio w3."""
+        return {}
+
+
+class FeeHistoryOracle(FeeStrategy):
+    """Computes EIP-1559 fees from a cached ``eth_feeHistory`` sample.
+
+    >>> oracle = FeeHistoryOracle(base_fee_multiplier=2)
+    >>> oracle.compute({"baseFeePerGas": [90, 100], "reward": [[2], [0], [4], [3]]})
+    {'maxFeePerGas': 203, 'maxPriorityFeePerGas': 3}
+
+    """
+
+    def __init__(
+        self,
+        percentile: float = FEE_PERCENTILE,
+        blocks: int = FEE_HISTORY_BLOCKS,
+        ttl: float = FEE_HISTORY_TTL,
+        base_fee_multiplier: float = BASE_FEE_MULTIPLIER,
+        min_priority_fee: int = 0,
+    ):
+        """Inits
+
+        Args:
+            percentile: percentile of the recent priority fees to pay, higher
+                means faster inclusion.
+            blocks: number of recent blocks sampled.
+            ttl: seconds a sampled fee history stays valid.
+            base_fee_multiplier: how many times the next base fee maxFeePerGas
+                allows for, the headroom for base fee increases while the
+                transaction waits.
+            min_priority_fee: lowest priority fee to pay, in wei.
+        """
+        self.percentile = percentile
+        self.blocks = blocks
+        self.base_fee_multiplier = base_fee_multiplier
+        self.min_priority_fee = min_priority_fee
+        self._fees = LRUCache(maxsize=16, ttl=ttl)
+
+    def fees(self, w3: Web3) -> Fees:
+        """Returns the EIP-1559 fee fields, or none on pre-London chains.
+
+        Args:
+            w3 (Web3): the web3 instance the transaction is sent with.
+
+        Returns:
+            Dict[str, int]: maxFeePerGas and maxPriorityFeePerGas in wei.
+
+        """
+        fees = self._fees.get(w3)
+        if fees is None:
+            try:
+                history = w3.eth.fee_history(self.blocks, "latest", [self.percentile])
+            except Exception as e:
+                LOG.debug(f"No fee history, leaving the fees to web3: {e}")
+                history = None
+            fees = self._update(w3, history)
+        return fees
+
+    async def fees_async(self, w3: Web3) -> Fees:
+        """Same as ``fees`` for an asyncio web3 instance."""
+        fees = self._fees.get(w3)
+        if fees is None:
+            try:
+                raw = await w3.manager.coro_request(
+                    "eth_feeHistory", [hex(self.blocks), "latest", [self.percentile]]
+                )
+                history = {
+                    "baseFeePerGas": [int(fee, 16) for fee in raw["baseFeePerGas"]],
+                    "reward": [
+                        [int(fee, 16) for fee in rewards]
+                        for rewards in raw.get("reward", [])
+                    ],
+                }
+            except Exception as e:
+                LOG.debug(f"No fee history, leaving the fees to the node: {e}")
+                history = None
+            fees = self._update(w3, history)
+        return fees
+
+    def compute(self, history: Dict[str, Any]) -> Fees:
+        """Computes the fees from a fee history.
+
+        The priority fee is the median of the non-zero rewards at the target
+        percentile, empty blocks don't drag it down.
+
+        Args:
+            history (Dict[str, Any]): the ``eth_feeHistory`` result with the
+                base fees in wei, the last one being the next block's.
+
+        Returns:
+            Dict[str, int]: maxFeePerGas and maxPriorityFeePerGas in wei.
+
+        """
+        rewards: List[int] = sorted(
+            rewards[0]
+            for rewards in history.get("reward", [])
+            if rewards and rewards[0]
+        )
+        priority_fee = rewards[len(rewards) // 2] if rewards else 0
+        priority_fee = max(priority_fee, self.min_priority_fee)
+        next_base_fee = history["baseFeePerGas"][-1]
+        return {
+            "maxFeePerGas": int(next_base_fee * self.base_fee_multiplier)
+            + priority_fee,
+            "maxPriorityFeePerGas": priority_fee,
+        }
+
+    def clear(self):
+        """Drops the cached fees."""
+        self._fees.clear()
+
+    def _update(self, w3: Web3, history: Optional[Dict[str, Any]]) -> Fees:
+        # Chains without EIP-1559 have no base fee.
+        if history and history.get("baseFeePerGas") and history["baseFeePerGas"][-1]:
+            fees = self.compute(history)
+        else:
+            fees = {}
+        self._fees.set(w3, fees)
+        return fees
@@ -0,0 +1,219 @@
+"""Gas estimation for the transactions sent by ``eth_bridge``.
+
+By default every transaction reserves the fixed ``gas`` it is given, which is
+``GAS_LIMIT`` for the Job transactions. With estimation enabled, the gas of a
+transaction is its ``estimate_gas`` result times a safety multiplier, and the
+given ``gas`` becomes an upper bound.
+
+Estimates are cached per contract, function and argument size bucket, the
+size being the number of items in the list arguments. A cached estimate is
+scaled linearly for larger sizes of the same bucket. The functions of
+``GAS_ESTIMATE_UNCACHED`` are estimated on every call: the gas of a
+``bulkPayOut`` depends on the balance of the escrow, which returns early
+without paying when it is short, so an earlier estimate can be far too low.
+
+A transaction which ran out of its estimated gas should be sent again with
+its gas limit, after dropping the estimate with ``forget``.
+"""
+import logging
+import math
+import os
+from typing import Any, Iterable, Optional, Sequence, Tuple
+
+from hmt_escrow.cache import CacheInfo, LRUCache
+
+LOG = logging.getLogger("hmt_escrow.gas")
+
+# Whether transactions use estimated gas instead of their gas limit.
+GAS_ESTIMATION = os.getenv("GAS_ESTIMATION", "false").lower() in ("1", "true", "yes")
+
+# Safety multiplier applied to the estimates.
+GAS_ESTIMATE_MULTIPLIER = float(os.getenv("GAS_ESTIMATE_MULTIPLIER", 1.2))
+
+# Maximum number of cached estimates.
+GAS_ESTIMATE_CACHE_SIZE = int(os.getenv("GAS_ESTIMATE_CACHE_SIZE", 1024))
+
+# Comma separated functions whose gas depends on the contract state, never cached.
+GAS_ESTIMATE_UNCACHED = [
+    name.strip()
+    for name in os.getenv("GAS_ESTIMATE_UNCACHED", "bulkPayOut").split(",")
+    if name.strip()
+]
+
+
+class GasLimitExceeded(Exception):
+    """Raised when the estimated gas of a transaction exceeds its gas limit."""
+
+    pass
+
+
+def argument_size(args: Sequence[Any]) -> int:
+    """Returns the number of items in the list arguments of a call.
+
+    >>> argument_size([["0x1", "0x2"], [10, 20], "https://url", "hash", 1])
+    4
+
+    Args:
+        args (Sequence[Any]): the arguments of the contract function.
+
+    Returns:
+        int: the total length of the list and tuple arguments.
+
+    """
+    return sum(len(arg) for arg in args if isinstance(arg, (list, tuple)))
+
+
+def size_bucket(size: int) -> int:
+    """Returns the power of two bucket of an argument size.
+
+    >>> [size_bucket(size) for size in (0, 1, 2, 3, 4, 5, 100)]
+    [0, 1, 2, 2, 3, 3, 7]
+
+    """
+    return size.bit_length()
+
+
+class GasEstimator(object):
+    """Estimates the gas of transactions and caches the estimates."""
+
+    def __init__(
+        self,
+        multiplier: float = GAS_ESTIMATE_MULTIPLIER,
+        maxsize: int = GAS_ESTIMATE_CACHE_SIZE,
+        uncached: Iterable[str] = GAS_ESTIMATE_UNCACHED,
+    ):
+        """Inits
+
+        Args:
+            multiplier: safety multiplier applied to the estimates.
+            maxsize: maximum number of cached estimates.
+            uncached: the functions estimated on every call.
+        """
+        self.multiplier = multiplier
+        self.uncached = set(uncached)
+        self._estimates = LRUCache(maxsize=maxsize)
+
+    def cached(self, txn, args: Sequence[Any]) -> Optional[int]:
+        """Returns the gas of a transaction from the cached estimates.
+
+        Args:
+            txn: the contract function or constructor with its arguments.
+            args (Sequence[Any]): the arguments of the transaction.
+
+        Returns:
+            Optional[int]: the gas with the safety multiplier applied, None
+            if nothing is cached for the function and argument size.
+
+        """
+        if self._name(txn) in self.uncached:
+            return None
+
+        size = argument_size(args)
+        entry: Optional[Tuple[int, int]] = self._estimates.get(self._key(txn, size))
+        if entry is None:
+            return None
+
+        estimate, estimated_size = entry
+        if size > estimated_size:
+            estimate = estimate * size / max(estimated_size, 1)
+        return self._with_margin(estimate)
+
+    def record(self, txn, args: Sequence[Any], estimate: int) -> int:
+        """Caches the estimate of a transaction.
+
+        Args:
+            txn: the contract function or constructor with its arguments.
+            args (Sequence[Any]): the arguments of the transaction.
+            estimate (int): the result of ``estimate_gas``.
+
+        Returns:
+            int: the gas with the safety multiplier applied.
+
+        """
+        if self._name(txn) not in self.uncached:
+            size = argument_size(args)
+            self._estimates.set(self._key(txn, size), (estimate, size))
+        return self._with_margin(estimate)
+
+    def forget(self, txn, args: Sequence[Any]):
+        """Drops the cached estimate of a transaction, e.g. after it ran out of gas.
+
+        Args:
+            txn: the contract function or constructor with its arguments.
+            args (Sequence[Any]): the arguments of the transaction.
+        """
+        self._estimates.pop(self._key(txn, argument_size(args)))
+
+    def ran_out(self, receipt, gas: int) -> bool:
+        """Whether a transaction failed for using all the gas it was given.
+
+        >>> GasEstimator().ran_out({"status": 0, "gasUsed": 21000}, 21000)
+        True
+        >>> GasEstimator().ran_out({"status": 0, "gasUsed": 20000}, 21000)
+        False
+
+        Args:
+            receipt: the receipt of the transaction.
+            gas (int): the gas the transaction was sent with.
+
+        Returns:
+            bool: returns True if the transaction reverted out of gas.
+
+        """
+        return receipt.get("status") == 0 and receipt.get("gasUsed", 0) >= gas
+
+    def estimate(self, txn, args: Sequence[Any], gas_payer: str, gas_limit: int) -> int:
+        """Returns the gas of a transaction, estimating it on a cache miss.
+
+        Args:
+            txn: the contract function or constructor with its arguments.
+            args (Sequence[Any]): the arguments of the transaction.
+            gas_payer (str): the ethereum address sending the transaction.
+            gas_limit (int): the maximum gas the transaction may use.
+
+        Returns:
+            int: the gas of the transaction with the safety multiplier applied.
+
+        Raises:
+            GasLimitExceeded: if the gas exceeds gas_limit.
+
+        """
+        gas = self.cached(txn, args)
+        if gas is None:
+            gas = self.record(txn, args, txn.estimateGas({"from": gas_payer}))
+        return self.check_limit(txn, gas, gas_limit)
+
+    def check_limit(self, txn, gas: int, gas_limit: int) -> int:
+        """Returns the gas of a transaction if it doesn't exceed the limit.
+
+        Raises:
+            GasLimitExceeded: if the gas exceeds gas_limit.
+
+        """
+        if gas_limit is not None and gas > gas_limit:
+            raise GasLimitExceeded(
+                f"{self._name(txn)} needs an estimated {gas} gas, more than "
+                f"the limit of {gas_limit}"
+            )
+        return gas
+
+    def info(self) -> CacheInfo:
+        """Returns the hit/miss counters and the size of the estimate cache."""
+        return self._estimates.info()
+
+    def clear(self):
+        """Drops the cached estimates."""
+        self._estimates.clear()
+
+    def _with_margin(self, estimate: float) -> int:
+        return int(math.ceil(estimate * self.multiplier))
+
+    def _key(self, txn, size: int) -> Tuple[Optional[str], str, int]:
+        return (getattr(txn, "address", None), self._name(txn), size_bucket(size))
+
+    @staticmethod
+    def _name(txn) -> str:
+        return getattr(txn, "fn_name", None) or "constructor"
+
+
+GAS_ESTIMATOR = GasEstimator()
@@ -1,18 +1,31 @@
 #!/usr/bin/env python3
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from enum import Enum
-from typing import Dict, List, Tuple, Optional, Any, TypedDict
+from time import monotonic, perf_counter
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    List,
+    Tuple,
+    Optional,
+    Any,
+    NamedTuple,
+    Set,
+    TypedDict,
+)
 
-from basemodels import Manifest
-from eth_keys import keys
-from eth_utils import decode_hex
 from web3 import Web3
 from web3.contract import Contract
+from web3.exceptions import TimeExhausted
 from web3.types import TxReceipt, Wei
 
 from hmt_escrow import utils
+from hmt_escrow.credentials import get_credential_pool
 from hmt_escrow.eth_bridge import (
     get_hmtoken,
     get_escrow,
@@ -20,25 +33,92 @@ from hmt_escrow.eth_bridge import (
     deploy_factory,
     get_w3,
     handle_transaction_with_retry,
+    out_of_estimated_gas,
+    submit_transaction,
+    wait_for_transaction,
     Retry,
     HMTOKEN_ADDR,
 )
+from hmt_escrow.fees import FeeStrategy
+from hmt_escrow.keyring import get_keyring
+from hmt_escrow.lazy import lazy_import
+from hmt_escrow.logs import address_topic, get_log_watcher
+from hmt_escrow.metrics import tag_operation
+from hmt_escrow.payouts import BULK_MAX_RECIPIENTS, ChunkedPayout, ProgressStore
+from hmt_escrow.rpc import batch_call
 from hmt_escrow.storage import download, upload, get_public_bucket_url, get_key_from_url
 
+if TYPE_CHECKING:
+    from basemodels import Manifest
+
+# basemodels is only needed to validate the downloaded manifests.
+basemodels = lazy_import("basemodels")
+
 GAS_LIMIT = int(os.getenv("GAS_LIMIT", 4712388))
 
 # Explicit env variable that will use s3 for storing results.
 
 LOG = logging.getLogger("hmt_escrow.job")
 
+# Threads uploading the manifests of the jobs being launched.
+MANIFEST_UPLOAD_WORKERS = int(os.getenv("MANIFEST_UPLOAD_WORKERS", 8))
+
+_UPLOAD_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_UPLOAD_EXECUTOR_LOCK = threading.Lock()
+
+
+def _upload_executor() -> ThreadPoolExecutor:
+    """Returns the executor uploading the manifests, started on first use."""
+    global _UPLOAD_EXECUTOR
+    with _UPLOAD_EXECUTOR_LOCK:
+        if _UPLOAD_EXECUTOR is None:
+            _UPLOAD_EXECUTOR = ThreadPoolExecutor(
+                max_workers=MANIFEST_UPLOAD_WORKERS,
+                thread_name_prefix="manifest-upload",
+            )
+        return _UPLOAD_EXECUTOR
+
+
+def _after_fork():
+    global _UPLOAD_EXECUTOR, _UPLOAD_EXECUTOR_LOCK
+    _UPLOAD_EXECUTOR_LOCK = threading.Lock()
+    _UPLOAD_EXECUTOR = None
+
+
+# The upload threads don't survive a fork, the child starts its own.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
 Status = Enum("Status", "Launched Pending Partial Paid Complete Cancelled")
 
+# Seconds between two reads of the status of an escrow waited for, which
+# catches the changes without logs made by other processes, e.g. ``complete``.
+JOB_STATUS_RECHECK_INTERVAL = float(os.getenv("JOB_STATUS_RECHECK_INTERVAL", 30))
+
+# Version of the snapshots written by Job.to_snapshot.
+SNAPSHOT_VERSION = 1
+
+# Topic of the HMT event emitted when the escrow pays out or refunds.
+TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)")
+
 
 class RaffleTxn(TypedDict):
     txn_succeeded: bool
     tx_receipt: Optional[TxReceipt]
 
 
+class JobState(NamedTuple):
+    """The on-chain state of a Job read at once by ``Job.read_state``."""
+
+    status: Enum
+    balance: int
+    bulk_paid: bool
+    manifest_url: str
+    manifest_hash: str
+    launcher: str
+    final_results_url: str
+
+
 def status(escrow_contract: Contract, gas_payer: str, gas: int = GAS_LIMIT) -> Enum:
     """Returns the status of the Job.
 
@@ -136,6 +216,41 @@ def launcher(escrow_contract: Contract, gas_payer: str, gas: int = GAS_LIMIT) ->
     )
 
 
+def _status_reached(current: Enum, target: Enum) -> Optional[bool]:
+    """Whether an escrow in the current status reached the target status,
+    None if it still can."""
+    if current == target:
+        return True
+    if current == Status.Cancelled:
+        return False
+    if target == Status.Cancelled:
+        # Paid and completed escrows can't be cancelled.
+        return False if current in (Status.Paid, Status.Complete) else None
+    return True if current.value > target.value else None
+
+
+# Events of the threads in ``Job.wait_for_status``, keyed by escrow address.
+_STATUS_WAITERS: Dict[str, Set[threading.Event]] = {}
+_STATUS_WAITERS_LOCK = threading.Lock()
+
+
+def _wake_status_waiters(escrow_addr: str):
+    """Wakes the threads waiting for the status of an escrow, used when a
+    transaction changing it without emitting a log is mined."""
+    with _STATUS_WAITERS_LOCK:
+        for woken in _STATUS_WAITERS.get(escrow_addr, ()):
+            woken.set()
+
+
+def _timed(timings: Dict[str, float], step: str, fn: Callable, *args) -> Any:
+    """Calls fn with args and adds the seconds it took to timings[step]."""
+    start = perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[step] = timings.get(step, 0.0) + perf_counter() - start
+
+
 class Job:
     """A class used to represent a given Job launched on the HUMAN network.
     A Job  can be created from a manifest or by accessing an existing escrow contract
@@ -162,7 +277,7 @@ class Job:
     def __init__(
         self,
         credentials: Dict[str, str],
-        escrow_manifest: Manifest = None,
+        escrow_manifest: "Manifest" = None,
         factory_addr: str = None,
         escrow_addr: str = None,
         multi_credentials: List[Tuple] = [],
@@ -170,6 +285,7 @@ class Job:
         hmt_server_addr: str = None,
         hmtoken_addr: str = None,
         gas_limit: int = GAS_LIMIT,
+        fee_strategy: FeeStrategy = None,
     ):
         """Initializes a Job instance with values from a Manifest class and
         checks that the provided credentials are valid. An optional factory
@@ -241,30 +357,22 @@ class Job:
             factory_addr (str): an ethereum address of the factory.
             escrow_addr (str): an ethereum address of an existing escrow address.
             multi_credentials (List[Tuple]): a list of tuples with ethereum address, private key pairs.
+            fee_strategy (FeeStrategy): decides the fees of the Job's transactions,
+                e.g. a ``FeeHistoryOracle``. Web3 defaults are used if None.
 
         Raises:
             ValueError: if the credentials are not valid.
 
         """
-
-        # holds global retry parameters for transactions
-        if retry is None:
-            self.retry = Retry()
-        else:
-            self.retry = retry
-
-        main_credentials_valid = self._validate_credentials(
-            multi_credentials, **credentials
+        self._init_credentials(
+            credentials,
+            multi_credentials,
+            retry,
+            hmt_server_addr,
+            hmtoken_addr,
+            gas_limit,
+            fee_strategy,
         )
-        if not main_credentials_valid:
-            raise ValueError("Given private key doesn't match the ethereum address.")
-
-        self.gas_payer = Web3.toChecksumAddress(credentials["gas_payer"])
-        self.gas_payer_priv = credentials["gas_payer_priv"]
-        self.multi_credentials = self._validate_multi_credentials(multi_credentials)
-        self.hmt_server_addr = hmt_server_addr
-        self.hmtoken_addr = HMTOKEN_ADDR if hmtoken_addr is None else hmtoken_addr
-        self.gas = gas_limit or GAS_LIMIT
 
         # Initialize a new Job.
         if not escrow_addr and escrow_manifest:
@@ -283,6 +391,7 @@ class Job:
         else:
             raise ValueError("Job instantiation wrong, double-check arguments.")
 
+    @tag_operation
     def launch(self, pub_key: bytes) -> bool:
         """Launches an escrow contract to the network, uploads the manifest
         to S3 with the public key of the Reputation Oracle and stores
@@ -322,6 +431,14 @@ class Job:
         >>> job.gas_payer_priv
         'f22d4fc42da79aa5ba839998a0a9f2c2c45f5e55ee7f1504e464d2c71ca199e1'
 
+        The manifest is uploaded while the escrow is created, and the seconds
+        spent in each step are kept in ``launch_timings``: ``create_escrow``,
+        ``upload``, ``upload_wait`` (the part of the upload left once the
+        escrow exists), ``verify`` and ``total``.
+
+        >>> sorted(job.launch_timings)
+        ['create_escrow', 'total', 'upload', 'upload_wait', 'verify']
+
         Args:
             pub_key (bytes): the public key of the Reputation Oracle.
 
@@ -332,12 +449,28 @@ class Job:
         if hasattr(self, "job_contract"):
             raise AttributeError("The escrow has been already deployed.")
 
+        timings: Dict[str, float] = {}
+        self.launch_timings = timings
+        start = perf_counter()
+
+        # The manifest doesn't depend on the escrow, it is uploaded meanwhile.
+        upload_future = _upload_executor().submit(
+            _timed, timings, "upload", upload, self.serialized_manifest, pub_key
+        )
+
         # Use factory to deploy a new escrow contract.
         trusted_handlers = [addr for addr, priv_key in self.multi_credentials]
 
-        txn = self._create_escrow(trusted_handlers)
+        try:
+            txn = _timed(
+                timings, "create_escrow", self._create_escrow, trusted_handlers
+            )
+        except Exception as e:
+            upload_future.cancel()
+            raise e
 
         if not txn["txn_succeeded"]:
+            upload_future.cancel()
             raise Exception("Unable to create escrow")
 
         tx_receipt = txn["tx_receipt"]
@@ -346,11 +479,139 @@ class Job:
         LOG.info("Job's escrow contract deployed to:{}".format(job_addr))
         self.job_contract = get_escrow(job_addr, self.hmt_server_addr)
 
-        (hash_, manifest_url) = upload(self.serialized_manifest, pub_key)
+        (hash_, manifest_url) = _timed(timings, "upload_wait", upload_future.result)
         self.manifest_url = manifest_url
         self.manifest_hash = hash_
-        return self.status() == Status.Launched and self.balance() == 0
+        launched = _timed(
+            timings,
+            "verify",
+            lambda: self.status() == Status.Launched and self.balance() == 0,
+        )
+        timings["total"] = perf_counter() - start
+        LOG.debug(f"Launched {job_addr} in {timings}")
+        return launched
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """Returns what a Job needs to attach to its escrow again, without
+        the credentials.
+
+        The snapshot only holds JSON types, so it can be stored with
+        ``json.dumps`` and passed to ``Job.from_snapshot`` by another process.
+
+        >>> from test.hmt_escrow.utils import manifest
+        >>> credentials = {
+        ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+        ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+        ... }
+        >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+        >>> job = Job(credentials, manifest)
+        >>> job.launch(rep_oracle_pub_key)
+        True
+        >>> snapshot = job.to_snapshot()
+        >>> snapshot["escrow_addr"] == job.job_contract.address
+        True
+        >>> snapshot["amount"]
+        '100.0'
+
+        Returns:
+            Dict[str, Any]: the addresses, manifest location and manifest of the Job.
+
+        Raises:
+            AttributeError: if the escrow hasn't been deployed yet.
+
+        """
+        if not hasattr(self, "job_contract"):
+            raise AttributeError("The escrow hasn't been deployed yet.")
+
+        return {
+            "version": SNAPSHOT_VERSION,
+            "factory_addr": self.factory_contract.address,
+            "escrow_addr": self.job_contract.address,
+            "hmtoken_addr": self.hmtoken_addr,
+            "manifest_url": self.manifest_url,
+            "manifest_hash": self.manifest_hash,
+            "serialized_manifest": self.serialized_manifest,
+            "amount": str(self.amount),
+        }
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: Dict[str, Any],
+        credentials: Dict[str, str],
+        multi_credentials: List[Tuple] = [],
+        retry: Retry = None,
+        hmt_server_addr: str = None,
+        gas_limit: int = GAS_LIMIT,
+        fee_strategy: FeeStrategy = None,
+    ) -> "Job":
+        """Attaches to an escrow from a snapshot of its Job.
+
+        Unlike ``Job(escrow_addr=..., factory_addr=...)``, the escrow isn't
+        checked against its factory and the manifest isn't downloaded and
+        validated again: no request is sent, so the snapshot must come from
+        a trusted store.
+
+        >>> from test.hmt_escrow.utils import manifest
+        >>> credentials = {
+        ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+        ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+        ... }
+        >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+        >>> job = Job(credentials, manifest)
+        >>> job.launch(rep_oracle_pub_key)
+        True
+        >>> new_job = Job.from_snapshot(job.to_snapshot(), credentials)
+        >>> new_job.job_contract.address == job.job_contract.address
+        True
+        >>> new_job.setup()
+        True
+
+        Args:
+            snapshot (Dict[str, Any]): a snapshot returned by ``to_snapshot``.
+            credentials (Dict[str, str]): an ethereum address and its private key.
+            multi_credentials (List[Tuple]): a list of tuples with ethereum address, private key pairs.
+            retry (Retry): the retry parameters of the transactions.
+            hmt_server_addr (str): the ethereum node the Job sends its requests to.
+            gas_limit (int): maximum amount of gas the caller is ready to pay.
+            fee_strategy (FeeStrategy): decides the fees of the Job's transactions.
 
+        Returns:
+            Job: a Job attached to the escrow of the snapshot.
+
+        Raises:
+            ValueError: if the snapshot or the credentials are not valid.
+
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Unsupported Job snapshot version: {snapshot.get('version')}"
+            )
+
+        job = cls.__new__(cls)
+        job._init_credentials(
+            credentials,
+            multi_credentials,
+            retry,
+            hmt_server_addr,
+            snapshot.get("hmtoken_addr"),
+            gas_limit,
+            fee_strategy,
+        )
+        try:
+            job.factory_contract = get_factory(
+                snapshot["factory_addr"], hmt_server_addr
+            )
+            job.job_contract = get_escrow(snapshot["escrow_addr"], hmt_server_addr)
+            job.manifest_url = snapshot["manifest_url"]
+            job.manifest_hash = snapshot["manifest_hash"]
+            job.serialized_manifest = dict(snapshot["serialized_manifest"])
+            job.amount = Decimal(snapshot["amount"])
+        except (KeyError, TypeError, ArithmeticError) as e:
+            raise ValueError(f"Invalid Job snapshot: {e!r}")
+        return job
+
+    @tag_operation
     def setup(self, sender: str = None) -> bool:
         """Sets the escrow contract to be ready to receive answers from the Recording Oracle.
         The contract needs to be deployed and funded first.
@@ -405,12 +666,6 @@ class Job:
         contract_is_setup = False
 
         txn_event = "Transferring HMT"
-        txn_info = {
-            "gas_payer": self.gas_payer,
-            "gas_payer_priv": self.gas_payer_priv,
-            "gas": self.gas,
-            "hmt_server_addr": self.hmt_server_addr,
-        }
         if sender:
             txn_func = hmtoken_contract.functions.transferFrom
             func_args = [sender, self.job_contract.address, hmt_amount]
@@ -424,17 +679,12 @@ class Job:
 
         # make sure there is enough HMT to fund the escrow
         if balance > hmt_amount:
-            try:
-                tx_receipt = handle_transaction_with_retry(
-                    txn_func, self.retry, *func_args, **txn_info
-                )
-
+            main_txn = self._transact_main(txn_func, func_args, txn_event)
+            if main_txn is not None:
+                if not main_txn["txn_succeeded"]:
+                    return False
                 hmt_transferred, tx_balance = utils.parse_transfer_transaction(
-                    hmtoken_contract, tx_receipt
-                )
-            except Exception as e:
-                LOG.debug(
-                    f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
+                    hmtoken_contract, main_txn["tx_receipt"]
                 )
 
         if not hmt_transferred:
@@ -465,13 +715,11 @@ class Job:
             self.manifest_hash,
         ]
 
-        try:
-            handle_transaction_with_retry(txn_func, self.retry, *func_args, **txn_info)
+        main_txn = self._transact_main(txn_func, func_args, txn_event)
+        if main_txn is not None:
+            if not main_txn["txn_succeeded"]:
+                return False
             contract_is_setup = True
-        except Exception as e:
-            LOG.debug(
-                f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
-            )
 
         if not contract_is_setup:
             raffle_txn_res = self._raffle_txn(
@@ -484,6 +732,7 @@ class Job:
 
         return str(self.status()) == str(Status.Pending) and tx_balance == hmt_amount
 
+    @tag_operation
     def add_trusted_handlers(self, handlers: List[str]) -> bool:
         """Add trusted handlers that can freely transact with the contract and
          perform aborts and cancels for example.
@@ -520,21 +769,11 @@ class Job:
         """
         txn_event = "Adding trusted handlers"
         txn_func = self.job_contract.functions.addTrustedHandlers
-        txn_info = {
-            "gas_payer": self.gas_payer,
-            "gas_payer_priv": self.gas_payer_priv,
-            "gas": self.gas,
-            "hmt_server_addr": self.hmt_server_addr,
-        }
         func_args = [handlers]
 
-        try:
-            handle_transaction_with_retry(txn_func, self.retry, *func_args, **txn_info)
-            return True
-        except Exception as e:
-            LOG.info(
-                f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
-            )
+        main_txn = self._transact_main(txn_func, func_args, txn_event)
+        if main_txn is not None:
+            return main_txn["txn_succeeded"]
 
         raffle_txn_res = self._raffle_txn(
             self.multi_credentials, txn_func, func_args, txn_event
@@ -546,6 +785,7 @@ class Job:
 
         return trusted_handlers_added
 
+    @tag_operation
     def bulk_payout(
         self,
         payouts: List[Tuple[str, Decimal]],
@@ -553,11 +793,17 @@ class Job:
         pub_key: bytes,
         encrypt_final_results: bool = True,
         store_pub_final_results: bool = False,
+        progress_store: ProgressStore = None,
     ) -> bool:
         """Performs a payout to multiple ethereum addresses. When the payout happens,
         final results are uploaded to IPFS and contract's state is updated to Partial or Paid
         depending on contract's balance.
 
+        Payouts to more than BULK_MAX_RECIPIENTS addresses are split into
+        pipelined chunks whose progress is saved to ``progress_store``, so
+        calling ``bulk_payout`` again with the same payouts after a failure
+        resumes it, see ``hmt_escrow.payouts``.
+
         >>> from test.hmt_escrow.utils import manifest
         >>> credentials = {
         ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
@@ -612,6 +858,7 @@ class Job:
             pub_key (bytes): the public key of the Reputation Oracle.
             encrypt_final_results (bool): Whether final results must be encrypted.
             store_pub_final_results (bool): Whether final results must be stored with public access.
+            progress_store (ProgressStore): where the progress of a chunked payout is saved.
 
         Returns:
             bool: returns True if paying to ethereum addresses and oracles succeeds.
@@ -624,17 +871,20 @@ class Job:
             "gas_payer_priv": self.gas_payer_priv,
             "gas": self.gas,
             "hmt_server_addr": self.hmt_server_addr,
+            "fee_strategy": self.fee_strategy,
         }
 
-        hash_, url = upload(
-            msg=results,
-            public_key=pub_key,
-            encrypt_data=encrypt_final_results,
-            use_public_bucket=store_pub_final_results,
-        )
+        def upload_results() -> Tuple[str, str]:
+            hash_, url = upload(
+                msg=results,
+                public_key=pub_key,
+                encrypt_data=encrypt_final_results,
+                use_public_bucket=store_pub_final_results,
+            )
 
-        # Plain data will be publicly accessible
-        url = get_public_bucket_url(url) if store_pub_final_results else url
+            # Plain data will be publicly accessible
+            url = get_public_bucket_url(url) if store_pub_final_results else url
+            return hash_, url
 
         eth_addrs = list()
         hmt_amounts = list()
@@ -643,16 +893,28 @@ class Job:
             eth_addrs.append(eth_addr)
             hmt_amounts.append(int(amount * 10**18))
 
-        func_args = [eth_addrs, hmt_amounts, url, hash_, 1]
+        if len(eth_addrs) > BULK_MAX_RECIPIENTS:
+            chunked_payout = ChunkedPayout(
+                get_w3(self.hmt_server_addr),
+                self.job_contract,
+                txn_info,
+                retry=self.retry,
+                store=progress_store,
+                fallback=lambda args: self._raffle_txn(
+                    self.multi_credentials, txn_func, args, txn_event
+                )["tx_receipt"],
+            )
+            bulk_paid = chunked_payout.run(eth_addrs, hmt_amounts, upload_results)
+            if not bulk_paid:
+                LOG.warning(f"{txn_event} failed, call it again to resume it.")
+            return bulk_paid
 
-        try:
-            handle_transaction_with_retry(txn_func, self.retry, *func_args, **txn_info)
-            return self._bulk_paid() is True
+        hash_, url = upload_results()
+        func_args = [eth_addrs, hmt_amounts, url, hash_, 1]
 
-        except Exception as e:
-            LOG.warn(
-                f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
-            )
+        main_txn = self._transact_main(txn_func, func_args, txn_event)
+        if main_txn is not None:
+            return main_txn["txn_succeeded"] and self._bulk_paid() is True
 
         raffle_txn_res = self._raffle_txn(
             self.multi_credentials, txn_func, func_args, txn_event
@@ -664,6 +926,7 @@ class Job:
 
         return bulk_paid is True
 
+    @tag_operation
     def abort(self) -> bool:
         """Kills the contract and returns the HMT back to the gas payer.
         The contract cannot be aborted if the contract is in Partial, Paid or Complete state.
@@ -739,20 +1002,13 @@ class Job:
         w3 = get_w3(self.hmt_server_addr)
         txn_event = "Job abortion"
         txn_func = self.job_contract.functions.abort
-        txn_info = {
-            "gas_payer": self.gas_payer,
-            "gas_payer_priv": self.gas_payer_priv,
-            "gas": self.gas,
-            "hmt_server_addr": self.hmt_server_addr,
-        }
 
-        try:
-            handle_transaction_with_retry(txn_func, self.retry, *[], **txn_info)
+        main_txn = self._transact_main(txn_func, [], txn_event)
+        if main_txn is not None:
             # After abort the contract should be destroyed
-            return w3.eth.getCode(self.job_contract.address) == b""
-        except Exception as e:
-            LOG.info(
-                f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
+            return (
+                main_txn["txn_succeeded"]
+                and w3.eth.getCode(self.job_contract.address) == b""
             )
 
         raffle_txn_res = self._raffle_txn(
@@ -765,6 +1021,7 @@ class Job:
 
         return w3.eth.getCode(self.job_contract.address) == b""
 
+    @tag_operation
     def cancel(self) -> bool:
         """Returns the HMT back to the gas payer. It's the softer version of abort as the contract is not destroyed.
 
@@ -821,20 +1078,10 @@ class Job:
         """
         txn_event = "Job cancellation"
         txn_func = self.job_contract.functions.cancel
-        txn_info = {
-            "gas_payer": self.gas_payer,
-            "gas_payer_priv": self.gas_payer_priv,
-            "gas": self.gas,
-            "hmt_server_addr": self.hmt_server_addr,
-        }
 
-        try:
-            handle_transaction_with_retry(txn_func, self.retry, *[], **txn_info)
-            return self.status() == Status.Cancelled
-        except Exception as e:
-            LOG.info(
-                f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
-            )
+        main_txn = self._transact_main(txn_func, [], txn_event)
+        if main_txn is not None:
+            return main_txn["txn_succeeded"] and self.status() == Status.Cancelled
 
         raffle_txn_res = self._raffle_txn(
             self.multi_credentials, txn_func, [], txn_event
@@ -846,6 +1093,7 @@ class Job:
 
         return self.status() == Status.Cancelled
 
+    @tag_operation
     def store_intermediate_results(self, results: Dict, pub_key: bytes) -> bool:
         """Recording Oracle stores intermediate results with Reputation Oracle's public key to S3
         and updates the contract's state.
@@ -905,22 +1153,12 @@ class Job:
         """
         txn_event = "Storing intermediate results"
         txn_func = self.job_contract.functions.storeResults
-        txn_info = {
-            "gas_payer": self.gas_payer,
-            "gas_payer_priv": self.gas_payer_priv,
-            "gas": self.gas,
-            "hmt_server_addr": self.hmt_server_addr,
-        }
         (hash_, url) = upload(results, pub_key)
         func_args = [url, hash_]
 
-        try:
-            handle_transaction_with_retry(txn_func, self.retry, *func_args, **txn_info)
-            return True
-        except Exception as e:
-            LOG.info(
-                f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
-            )
+        main_txn = self._transact_main(txn_func, func_args, txn_event)
+        if main_txn is not None:
+            return main_txn["txn_succeeded"]
 
         raffle_txn_res = self._raffle_txn(
             self.multi_credentials, txn_func, func_args, txn_event
@@ -935,11 +1173,22 @@ class Job:
 
         return results_stored
 
+    @tag_operation
     def complete(
-        self, blocking: bool = False, retries: int = 3, delay: int = 5, backoff: int = 2
+        self,
+        blocking: bool = False,
+        retries: int = 3,
+        delay: int = 5,
+        backoff: int = 2,
+        timeout: float = None,
     ) -> bool:
         """Completes the Job if it has been paid.
 
+        With ``blocking`` the Job first waits for the escrow to be paid, see
+        ``wait_for_status``, for at most ``timeout`` seconds. The timeout
+        defaults to the total delay of ``retries`` with ``delay`` and
+        ``backoff``.
+
         >>> from test.hmt_escrow.utils import manifest
         >>> credentials = {
         ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
@@ -972,37 +1221,131 @@ class Job:
         >>> job.status()
         <Status.Complete: 5>
 
+        Args:
+            blocking (bool): whether to wait for the escrow to be paid first.
+            retries (int): number of waits giving the default timeout.
+            delay (int): seconds of the first wait giving the default timeout.
+            backoff (int): factor of the next waits giving the default timeout.
+            timeout (float): most seconds to wait for the escrow to be paid.
+
         Returns:
             bool: returns True if the contract has been completed.
 
         """
+        if blocking:
+            if timeout is None:
+                timeout = sum(delay * backoff**i for i in range(retries + 1))
+            if not self.wait_for_status(Status.Paid, timeout):
+                LOG.info(f"Escrow {self.job_contract.address} wasn't paid in time")
+                return False
+            if self.status() == Status.Complete:
+                return True
+
         txn_event = "Job completion"
         txn_func = self.job_contract.functions.complete
-        txn_info = {
-            "gas_payer": self.gas_payer,
-            "gas_payer_priv": self.gas_payer_priv,
-            "gas": self.gas,
-            "hmt_server_addr": self.hmt_server_addr,
-        }
 
-        try:
-            handle_transaction_with_retry(txn_func, self.retry, *[], **txn_info)
+        main_txn = self._transact_main(txn_func, [], txn_event)
+        if main_txn is not None:
+            if not main_txn["txn_succeeded"]:
+                return False
+            # Completing emits no log, wake the waiters of this process now.
+            _wake_status_waiters(self.job_contract.address)
             return self.status() == Status.Complete
-        except Exception as e:
-            LOG.info(
-                f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
-            )
 
         raffle_txn_res = self._raffle_txn(
             self.multi_credentials, txn_func, [], txn_event
         )
         job_completed = raffle_txn_res["txn_succeeded"]
 
-        if not job_completed:
+        if job_completed:
+            _wake_status_waiters(self.job_contract.address)
+        else:
             LOG.exception(f"{txn_event} failed with all credentials.")
 
         return self.status() == Status.Complete
 
+    @tag_operation
+    def wait_for_status(self, target: Enum, timeout: float = None) -> bool:
+        """Waits for the escrow to reach a status.
+
+        The statuses follow each other from Launched to Pending, Partial,
+        Paid and Complete, so a later one also satisfies the wait. The
+        escrow's logs and its HMT transfers are followed by the
+        ``LogWatcher`` of the endpoint, shared by all the waiting jobs, and
+        the status is read again as soon as one of them is mined. Completing
+        emits no log, the waiters are woken by the ``complete`` of this
+        process and otherwise read the status every
+        ``JOB_STATUS_RECHECK_INTERVAL`` seconds.
+
+        >>> from test.hmt_escrow.utils import manifest
+        >>> credentials = {
+        ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+        ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+        ... }
+        >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+        >>> job = Job(credentials, manifest)
+        >>> job.launch(rep_oracle_pub_key)
+        True
+        >>> job.wait_for_status(Status.Pending, timeout=0)
+        False
+        >>> job.setup()
+        True
+        >>> job.wait_for_status(Status.Pending, timeout=0)
+        True
+
+        Args:
+            target (Status): the status to wait for.
+            timeout (float): most seconds to wait, forever if None.
+
+        Returns:
+            bool: returns True if the escrow reached the status, False if it
+            timed out or the escrow was cancelled.
+
+        """
+        woken = threading.Event()
+        escrow_addr = self.job_contract.address
+        watcher = get_log_watcher(get_w3(self.hmt_server_addr))
+        subscriptions = [
+            watcher.subscribe(escrow_addr, lambda log: woken.set()),
+            watcher.subscribe(
+                self.hmtoken_addr,
+                lambda log: woken.set(),
+                [TRANSFER_TOPIC, address_topic(escrow_addr)],
+            ),
+        ]
+
+        with _STATUS_WAITERS_LOCK:
+            _STATUS_WAITERS.setdefault(escrow_addr, set()).add(woken)
+        deadline = None if timeout is None else monotonic() + timeout
+        try:
+            while True:
+                woken.clear()
+                try:
+                    current = self.status()
+                except Exception as e:
+                    LOG.debug(f"Failed to read the status of {escrow_addr}: {e}")
+                else:
+                    reached = _status_reached(current, target)
+                    if reached is not None:
+                        return reached
+
+                wait = JOB_STATUS_RECHECK_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                woken.wait(wait)
+        finally:
+            for subscription in subscriptions:
+                watcher.unsubscribe(subscription)
+            with _STATUS_WAITERS_LOCK:
+                waiters = _STATUS_WAITERS.get(escrow_addr, set())
+                waiters.discard(woken)
+                if not waiters:
+                    _STATUS_WAITERS.pop(escrow_addr, None)
+
+    @tag_operation
     def status(self) -> Enum:
         """Returns the status of the Job.
 
@@ -1027,6 +1370,7 @@ class Job:
         """
         return status(self.job_contract, self.gas_payer, self.gas)
 
+    @tag_operation
     def balance(self) -> int:
         """Retrieve the balance of a Job in HMT.
 
@@ -1057,6 +1401,7 @@ class Job:
             {"from": self.gas_payer, "gas": Wei(self.gas)}
         )
 
+    @tag_operation
     def manifest(self, priv_key: bytes) -> Dict:
         """Retrieves the initial manifest used to setup a Job.
 
@@ -1086,6 +1431,7 @@ class Job:
         """
         return download(self.manifest_url, priv_key)
 
+    @tag_operation
     def intermediate_results(self, priv_key: bytes) -> Dict:
         """Reputation Oracle retrieves the intermediate results stored by the Recording Oracle.
 
@@ -1120,6 +1466,7 @@ class Job:
         """
         return download(self.intermediate_manifest_url, priv_key)
 
+    @tag_operation
     def final_results(self, priv_key: bytes) -> Optional[Dict]:
         """Retrieves the final results stored by the Reputation Oracle.
 
@@ -1162,6 +1509,85 @@ class Job:
 
         return download(url, priv_key)
 
+    @tag_operation
+    def read_state(self) -> JobState:
+        """Reads the state of the escrow contract in one JSON-RPC batch.
+
+        All the view calls are sent in a single request instead of one round
+        trip each, which matters when polling many Jobs.
+
+        >>> from test.hmt_escrow.utils import manifest
+        >>> credentials = {
+        ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+        ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+        ... }
+        >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+        >>> job = Job(credentials, manifest)
+        >>> job.launch(rep_oracle_pub_key)
+        True
+        >>> job.setup()
+        True
+        >>> state = job.read_state()
+        >>> state.status
+        <Status.Pending: 2>
+        >>> state.balance
+        100000000000000000000
+        >>> state.manifest_url == job.manifest_url
+        True
+        >>> state.final_results_url
+        ''
+
+        Returns:
+            JobState: the status, balance, bulk paid flag, manifest url and hash,
+            launcher and final results url of the Job.
+
+        """
+        functions = self.job_contract.functions
+        (
+            status_,
+            balance,
+            bulk_paid,
+            manifest_url_,
+            manifest_hash_,
+            launcher_,
+            final_results_url,
+        ) = batch_call(
+            get_w3(self.hmt_server_addr),
+            [
+                functions.status(),
+                functions.getBalance(),
+                functions.bulkPaid(),
+                functions.manifestUrl(),
+                functions.manifestHash(),
+                functions.launcher(),
+                functions.finalResultsUrl(),
+            ],
+            self.gas_payer,
+            self.gas,
+        )
+        return JobState(
+            status=Status(status_ + 1),
+            balance=balance,
+            bulk_paid=bulk_paid,
+            manifest_url=manifest_url_,
+            manifest_hash=manifest_hash_,
+            launcher=launcher_,
+            final_results_url=final_results_url,
+        )
+
+    @tag_operation
+    def refresh(self) -> JobState:
+        """Reads the state of the Job and updates its manifest attributes.
+
+        Returns:
+            JobState: the state returned by ``read_state``.
+
+        """
+        state = self.read_state()
+        self.manifest_url = state.manifest_url
+        self.manifest_hash = state.manifest_hash
+        return state
+
     def _access_job(self, factory_addr: str, escrow_addr: str, **credentials):
         """Given a factory and escrow address and credentials, access an already
         launched manifest of an already deployed escrow contract.
@@ -1181,10 +1607,46 @@ class Job:
         self.manifest_hash = manifest_hash(self.job_contract, gas_payer, self.gas)
 
         manifest_dict = self.manifest(rep_oracle_priv_key)
-        escrow_manifest = Manifest(manifest_dict)
+        escrow_manifest = basemodels.Manifest(manifest_dict)
         self._init_job(escrow_manifest)
 
-    def _init_job(self, manifest: Manifest):
+    def _init_credentials(
+        self,
+        credentials: Dict[str, str],
+        multi_credentials: List[Tuple],
+        retry: Optional[Retry],
+        hmt_server_addr: Optional[str],
+        hmtoken_addr: Optional[str],
+        gas_limit: int,
+        fee_strategy: Optional[FeeStrategy],
+    ):
+        """Validates the credentials and sets the transaction parameters of the Job.
+
+        Raises:
+            ValueError: if the credentials are not valid.
+
+        """
+        # holds global retry parameters for transactions
+        if retry is None:
+            self.retry = Retry()
+        else:
+            self.retry = retry
+
+        main_credentials_valid = self._validate_credentials(
+            multi_credentials, **credentials
+        )
+        if not main_credentials_valid:
+            raise ValueError("Given private key doesn't match the ethereum address.")
+
+        self.gas_payer = Web3.toChecksumAddress(credentials["gas_payer"])
+        self.gas_payer_priv = credentials["gas_payer_priv"]
+        self.multi_credentials = self._validate_multi_credentials(multi_credentials)
+        self.hmt_server_addr = hmt_server_addr
+        self.hmtoken_addr = HMTOKEN_ADDR if hmtoken_addr is None else hmtoken_addr
+        self.gas = gas_limit or GAS_LIMIT
+        self.fee_strategy = fee_strategy
+
+    def _init_job(self, manifest: "Manifest"):
         """Initialize a Job's class attributes with a given manifest.
 
         Args:
@@ -1198,10 +1660,7 @@ class Job:
         self.amount = Decimal(per_job_cost * number_of_answers)
 
     def _eth_addr_valid(self, addr, priv_key):
-        priv_key_bytes = decode_hex(priv_key)
-        pub_key = keys.PrivateKey(priv_key_bytes).public_key
-        calculated_addr = pub_key.to_checksum_address()
-        return Web3.toChecksumAddress(addr) == calculated_addr
+        return get_keyring().key(priv_key).matches(addr)
 
     def _validate_multi_credentials(
         self, multi_credentials: List[Tuple]
@@ -1443,35 +1902,72 @@ class Job:
         """
         txn_event = "Contract creation"
         txn_func = self.factory_contract.functions.createEscrow
+        func_args = [trusted_handlers]
+
+        main_txn = self._transact_main(txn_func, func_args, txn_event)
+        if main_txn is not None:
+            return main_txn
+
+        raffle_txn_res = self._raffle_txn(
+            self.multi_credentials, txn_func, func_args, txn_event
+        )
+
+        if not raffle_txn_res["txn_succeeded"]:
+            LOG.exception(f"{txn_event} failed with all credentials.")
+
+        return raffle_txn_res
+
+    def _transact_main(self, txn_func, txn_args, txn_event) -> Optional[RaffleTxn]:
+        """Performs the given transaction with the main credentials of the Job.
+
+        A transaction still pending once its retries are exhausted is not
+        failed over to the secondary credentials, which could execute it twice.
+
+        Args:
+            txn_func: the transaction function to be handled.
+            txn_args (List): the arguments the transaction takes.
+            txn_event (str): the transaction event that will be performed.
+
+        Returns:
+            RaffleTxn: the receipt of the transaction, or no receipt and
+            ``txn_succeeded`` False if it is still pending. None if it failed
+            and the secondary credentials should be tried.
+
+        """
         txn_info = {
             "gas_payer": self.gas_payer,
             "gas_payer_priv": self.gas_payer_priv,
             "gas": self.gas,
             "hmt_server_addr": self.hmt_server_addr,
+            "fee_strategy": self.fee_strategy,
         }
-        func_args = [trusted_handlers]
-
         try:
             tx_receipt = handle_transaction_with_retry(
-                txn_func, self.retry, *func_args, **txn_info
+                txn_func, self.retry, *txn_args, **txn_info
+            )
+        except TimeExhausted as e:
+            LOG.warning(
+                f"{txn_event} still pending with main credentials: {self.gas_payer} due to {e}, not resending it with secondary ones."
             )
-            return {"txn_succeeded": True, "tx_receipt": tx_receipt}
+            return {"txn_succeeded": False, "tx_receipt": None}
         except Exception as e:
             LOG.info(
                 f"{txn_event} failed with main credentials: {self.gas_payer}, {self.gas_payer_priv} due to {e}. Using secondary ones..."
             )
-
-        raffle_txn_res = self._raffle_txn(
-            self.multi_credentials, txn_func, func_args, txn_event
-        )
-
-        if not raffle_txn_res["txn_succeeded"]:
-            LOG.exception(f"{txn_event} failed with all credentials.")
-
-        return raffle_txn_res
+            return None
+        return {"txn_succeeded": True, "tx_receipt": tx_receipt}
 
     def _raffle_txn(self, multi_creds, txn_func, txn_args, txn_event) -> RaffleTxn:
-        """Takes in multiple credentials, loops through each and performs the given transaction.
+        """Takes in multiple credentials and performs the given transaction with
+        the healthiest one, falling back on the others.
+
+        The credentials are ranked by the ``CredentialPool`` of the endpoint,
+        shared by all the jobs of the process. An account is only given up
+        for the next one when the transaction can't be sent with it, so a
+        broken account doesn't hold the transaction back for the whole retry
+        and backoff. Once sent, a transaction which isn't mined in time is
+        replaced with bumped fees and never sent again from another account,
+        which could execute it twice.
 
         Args:
             credentials (Dict[str, str]): a dict of multiple ethereum addresses and their private keys.
@@ -1487,24 +1983,45 @@ class Job:
         txn_succeeded = False
         tx_receipt = None
 
-        for gas_payer, gas_payer_priv in multi_creds:
+        pool = get_credential_pool(self.hmt_server_addr)
+        for gas_payer, gas_payer_priv in pool.ranked(multi_creds):
             txn_info = {
                 "gas_payer": gas_payer,
                 "gas_payer_priv": gas_payer_priv,
                 "gas": self.gas,
                 "hmt_server_addr": self.hmt_server_addr,
+                "fee_strategy": self.fee_strategy,
             }
-            try:
-                tx_receipt = handle_transaction_with_retry(
-                    txn_func, self.retry, *txn_args, **txn_info
-                )
-                self.gas_payer = gas_payer
-                self.gas_payer_priv = gas_payer_priv
-                txn_succeeded = True
-                break
-            except Exception as e:
-                LOG.debug(
-                    f"{txn_event} failed with {gas_payer} and {gas_payer_priv} due to {e}."
-                )
+            with pool.use(gas_payer):
+                try:
+                    handle = submit_transaction(txn_func, *txn_args, **txn_info)
+                except Exception as e:
+                    pool.record_failure(gas_payer, e)
+                    LOG.debug(f"{txn_event} failed with {gas_payer} due to {e}.")
+                    continue
+
+                try:
+                    tx_receipt = wait_for_transaction(handle, self.retry.retries)
+                    if out_of_estimated_gas(
+                        handle, tx_receipt, txn_func, *txn_args, **txn_info
+                    ):
+                        handle = submit_transaction(
+                            txn_func, *txn_args, **txn_info, estimate_gas=False
+                        )
+                        tx_receipt = wait_for_transaction(handle, self.retry.retries)
+                except Exception as e:
+                    # The transaction might still be mined, it isn't sent again.
+                    pool.record_failure(gas_payer, e)
+                    LOG.warning(
+                        f"{txn_event} sent with {gas_payer} is still pending due "
+                        f"to {e}, not resending it with other credentials."
+                    )
+                    break
+
+            pool.record_success(gas_payer)
+            self.gas_payer = gas_payer
+            self.gas_payer_priv = gas_payer_priv
+            txn_succeeded = True
+            break
 
         return {"txn_succeeded": txn_succeeded, "tx_receipt": tx_receipt}
@@ -0,0 +1,157 @@
+"""Key material derived once per private key.
+
+Checking that a gas payer's private key matches its address, signing a
+transaction and decrypting a manifest all start by decoding the hex private
+key and deriving its public key, which is an elliptic curve multiplication.
+With many jobs per process sharing a few accounts, the ``KeyRing`` does this
+once per key: it keeps the decoded key with its public key, checksum address
+and ``LocalAccount`` for every private key it has seen.
+"""
+import logging
+import os
+import threading
+from typing import Union
+
+from hmt_escrow.cache import LRUCache
+from hmt_escrow.lazy import lazy_import
+
+# Only imported once a key is derived, crypto is imported without them.
+eth_account = lazy_import("eth_account")
+eth_keys = lazy_import("eth_keys")
+eth_utils = lazy_import("eth_utils")
+
+LOG = logging.getLogger("hmt_escrow.keyring")
+
+# Most private keys whose derived material is kept by the KeyRing.
+KEYRING_SIZE = int(os.getenv("KEYRING_SIZE", 1024))
+
+PrivateKeyLike = Union[str, bytes]
+
+
+class Key(object):
+    """A private key with the material derived from it, each derived once."""
+
+    def __init__(self, private_key_bytes: bytes):
+        """Inits
+
+        Args:
+            private_key_bytes: the 32 bytes of the private key.
+        """
+        self.private_key_bytes = private_key_bytes
+        self._private_key = None
+        self._account = None
+        self._lock = threading.Lock()
+
+    @property
+    def private_key(self):
+        """The ``eth_keys`` private key, with its public key."""
+        if self._private_key is None:
+            with self._lock:
+                if self._private_key is None:
+                    self._private_key = eth_keys.keys.PrivateKey(self.private_key_bytes)
+        return self._private_key
+
+    @property
+    def public_key(self):
+        """The ``eth_keys`` public key."""
+        return self.private_key.public_key
+
+    @property
+    def address(self) -> str:
+        """The checksum address of the key."""
+        return self.account.address
+
+    @property
+    def account(self):
+        """The ``LocalAccount`` signing with the key."""
+        if self._account is None:
+            private_key = self.private_key
+            with self._lock:
+                if self._account is None:
+                    self._account = eth_account.Account.from_key(private_key)
+        return self._account
+
+    def matches(self, address: str) -> bool:
+        """Whether the key is the one of an address, whatever its case."""
+        return checksum_address(address) == self.address
+
+
+class KeyRing(object):
+    """Decodes private keys once and keeps what is derived from them.
+
+    >>> keyring = KeyRing()
+    >>> key = keyring.key("28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5")
+    >>> key.address
+    '0x1413862C2B7054CDbfdc181B83962CB0FC11fD92'
+    >>> keyring.key(b"28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5") is key
+    True
+    >>> key.matches("0x1413862c2b7054cdbfdc181b83962cb0fc11fd92")
+    True
+
+    """
+
+    def __init__(self, maxsize: int = KEYRING_SIZE):
+        """Inits
+
+        Args:
+            maxsize: most private keys whose material is kept.
+        """
+        self._keys = LRUCache(maxsize=maxsize)
+
+    def key(self, private_key: PrivateKeyLike) -> Key:
+        """Returns the key material of a private key.
+
+        Args:
+            private_key (Union[str, bytes]): the private key as a hex string,
+                with or without 0x, as hex encoded bytes or as its 32 bytes.
+
+        Returns:
+            Key: the key, shared by every caller using the same private key.
+
+        Raises:
+            ValueError: if the private key can't be decoded.
+
+        """
+        private_key_bytes = _decode(private_key)
+        return self._keys.get_or_set(private_key_bytes, lambda: Key(private_key_bytes))
+
+    def clear(self):
+        """Drops all the keys."""
+        self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+# Checksum addresses keyed by the addresses as given.
+_CHECKSUM_ADDRESSES = LRUCache(maxsize=KEYRING_SIZE)
+
+_KEYRING = KeyRing()
+
+
+def checksum_address(address: str) -> str:
+    """Returns the checksum form of an address, computed once per address.
+
+    >>> checksum_address("0x1413862c2b7054cdbfdc181b83962cb0fc11fd92")
+    '0x1413862C2B7054CDbfdc181B83962CB0FC11fD92'
+
+    """
+    return _CHECKSUM_ADDRESSES.get_or_set(
+        address, lambda: eth_utils.to_checksum_address(address)
+    )
+
+
+def get_keyring() -> KeyRing:
+    """Returns the process-wide key ring."""
+    return _KEYRING
+
+
+def _decode(private_key: PrivateKeyLike) -> bytes:
+    if isinstance(private_key, (bytes, bytearray)):
+        if len(private_key) == 32:
+            return bytes(private_key)
+        private_key = bytes(private_key).decode("ascii")
+    try:
+        return bytes(eth_utils.decode_hex(private_key))
+    except Exception as e:
+        raise ValueError(f"Invalid private key: {e}")
@@ -0,0 +1,61 @@
+"""Deferred imports of the heavy dependencies.
+
+``web3``, ``boto3``, ``cryptography``, ``solcx`` and ``basemodels`` take
+hundreds of milliseconds to import. The modules which only need them in some
+of their functions import them through ``lazy_import``, so e.g. a tool using
+``hmt_escrow.crypto`` or ``hmt_escrow.storage`` doesn't pay for the others.
+"""
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule(object):
+    """A module imported on first attribute access.
+
+    >>> json = LazyModule("json")
+    >>> json.dumps([1])
+    '[1]'
+
+    """
+
+    def __init__(self, name: str):
+        """Inits
+
+        Args:
+            name: the absolute name of the module.
+        """
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def load(self) -> ModuleType:
+        """Imports the module if needed and returns it."""
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Returns a module which is imported on first use.
+
+    Args:
+        name (str): the absolute name of the module, e.g. "botocore.exceptions".
+
+    Returns:
+        LazyModule: a proxy of the module.
+
+    """
+    return LazyModule(name)
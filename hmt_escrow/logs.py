@@ -0,0 +1,264 @@
+"""Following the logs of many contracts with a single stream of requests.
+
+Waiting for an escrow to change state by reading its status every few seconds
+costs one call per escrow, and the caller either sleeps too long or wastes the
+calls. A ``LogWatcher`` follows the head of the chain instead: one background
+thread per endpoint reads the logs of all the watched contracts of every new
+block range with a single ``eth_getLogs``, and calls back the subscribers whose
+filter matches, so the RPC load stays flat however many escrows are watched.
+"""
+import logging
+import os
+import threading
+from time import sleep
+from typing import Callable, Dict, List, Optional, Sequence
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.types import LogReceipt
+
+from hmt_escrow.providers import REGISTRY
+
+LOG = logging.getLogger("hmt_escrow.logs")
+
+# Seconds between two reads of the latest block number.
+WEB3_LOG_POLL_INTERVAL = float(os.getenv("WEB3_LOG_POLL_INTERVAL", 2))
+
+# Most blocks read by a single eth_getLogs.
+WEB3_LOG_MAX_BLOCKS = int(os.getenv("WEB3_LOG_MAX_BLOCKS", 1000))
+
+
+def address_topic(address: str) -> HexBytes:
+    """Returns the topic of an indexed address argument.
+
+    >>> address_topic("0x1413862C2B7054CDbfdc181B83962CB0FC11fD92").hex()
+    '0x0000000000000000000000001413862c2b7054cdbfdc181b83962cb0fc11fd92'
+
+    """
+    return HexBytes(HexBytes(address).rjust(32, b"\0"))
+
+
+class Subscription(object):
+    """The logs of a contract matching some topics, passed to a callback."""
+
+    def __init__(
+        self,
+        address: str,
+        callback: Callable[[LogReceipt], None],
+        topics: Sequence[Optional[bytes]] = (),
+        from_block: int = None,
+    ):
+        """Inits
+
+        Args:
+            address: the contract emitting the logs.
+            callback: called with every matching log, from the watcher thread.
+            topics: the topics the logs must have at each position, any
+                topic matches at the positions given as None.
+            from_block: the first block whose logs are passed to the callback,
+                the block after the head of the first poll if None.
+        """
+        self.address = Web3.toChecksumAddress(address)
+        self.callback = callback
+        self.topics = [None if topic is None else HexBytes(topic) for topic in topics]
+        self.from_block = from_block
+
+    def matches(self, log: LogReceipt) -> bool:
+        """Whether a log of the subscribed contract has the topics."""
+        if Web3.toChecksumAddress(log["address"]) != self.address:
+            return False
+        topics = [HexBytes(topic) for topic in log["topics"]]
+        if len(topics) < len(self.topics):
+            return False
+        return all(
+            expected is None or expected == topic
+            for expected, topic in zip(self.topics, topics)
+        )
+
+
+class LogWatcher(object):
+    """Calls back the subscribers of the logs emitted on one node.
+
+    The watcher thread only runs while there are subscriptions. It reads
+    ``eth_blockNumber`` every ``poll_interval`` seconds and fetches the logs of
+    all the subscribed contracts in the new blocks at once. Subscribers get the
+    logs of the blocks mined after the head at the time they subscribed, they
+    are expected to read the current state of the contract themselves after
+    subscribing.
+    """
+
+    def __init__(
+        self,
+        w3: Web3,
+        poll_interval: float = WEB3_LOG_POLL_INTERVAL,
+        max_blocks: int = WEB3_LOG_MAX_BLOCKS,
+    ):
+        """Inits
+
+        Args:
+            w3: the web3 instance of the node.
+            poll_interval: seconds between two reads of the latest block number.
+            max_blocks: most blocks read by a single ``eth_getLogs``.
+        """
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.max_blocks = max(1, max_blocks)
+        self._subscriptions: List[Subscription] = []
+        self._last_block: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        address: str,
+        callback: Callable[[LogReceipt], None],
+        topics: Sequence[Optional[bytes]] = (),
+    ) -> Subscription:
+        """Starts passing the new logs of a contract matching topics to callback.
+
+        Args:
+            address (str): the contract emitting the logs.
+            callback (Callable): called with every matching log.
+            topics (Sequence[Optional[bytes]]): the topics the logs must have.
+
+        Returns:
+            Subscription: the subscription, to pass to ``unsubscribe``.
+
+        """
+        try:
+            from_block = self.w3.eth.block_number + 1
+        except Exception as e:
+            LOG.debug(f"Failed to read the head of {self.w3.provider}: {e}")
+            from_block = None
+        subscription = Subscription(address, callback, topics, from_block)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="hmt-log-watcher", daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Stops calling back a subscriber."""
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    @property
+    def head(self) -> Optional[int]:
+        """The latest block number followed, None while the watcher is idle."""
+        return self._last_block
+
+    @property
+    def subscriptions(self) -> int:
+        """Number of subscriptions."""
+        with self._lock:
+            return len(self._subscriptions)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscriptions:
+                    # Nothing to watch, the next subscription starts a new thread.
+                    self._thread = None
+                    self._last_block = None
+                    return
+
+            try:
+                self._poll()
+            except Exception as e:
+                LOG.warning(f"Failed to follow the logs of {self.w3.provider}: {e}")
+
+            sleep(self.poll_interval)
+
+    def _poll(self):
+        head = self.w3.eth.block_number
+        while self._fetch(head):
+            pass
+        self._last_block = head
+
+    def _fetch(self, head: int) -> bool:
+        """Dispatches the logs of the next block range, False once at head."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        if not subscriptions:
+            return False
+
+        for subscription in subscriptions:
+            if subscription.from_block is None:
+                subscription.from_block = head + 1
+        from_block = min(subscription.from_block for subscription in subscriptions)
+        if from_block > head:
+            return False
+        to_block = min(head, from_block + self.max_blocks - 1)
+
+        addresses = sorted(
+            {
+                subscription.address
+                for subscription in subscriptions
+                if subscription.from_block <= to_block
+            }
+        )
+        logs = self.w3.eth.get_logs(
+            {"fromBlock": from_block, "toBlock": to_block, "address": addresses}
+        )
+        for log in logs:
+            for subscription in subscriptions:
+                if subscription.from_block > log["blockNumber"]:
+                    # Mined before the subscriber read the state of the contract.
+                    continue
+                if subscription.matches(log):
+                    self._dispatch(subscription, log)
+        for subscription in subscriptions:
+            subscription.from_block = max(subscription.from_block, to_block + 1)
+        return True
+
+    def _dispatch(self, subscription: Subscription, log: LogReceipt):
+        try:
+            subscription.callback(log)
+        except Exception as e:
+            LOG.warning(f"Log subscriber of {subscription.address} failed: {e}")
+
+
+_WATCHERS: Dict[Web3, LogWatcher] = {}
+_WATCHERS_LOCK = threading.Lock()
+
+
+def get_log_watcher(w3: Web3) -> LogWatcher:
+    """Returns the process-wide log watcher of a web3 instance.
+
+    Args:
+        w3 (Web3): the web3 instance of the node.
+
+    Returns:
+        LogWatcher: the log watcher shared by all the subscribers of the node.
+
+    """
+    with _WATCHERS_LOCK:
+        watcher = _WATCHERS.get(w3)
+        if watcher is None:
+            watcher = LogWatcher(w3)
+            _WATCHERS[w3] = watcher
+        return watcher
+
+
+def clear_log_watchers():
+    """Drops all the log watchers."""
+    with _WATCHERS_LOCK:
+        _WATCHERS.clear()
+
+
+def _after_fork():
+    global _WATCHERS_LOCK
+    _WATCHERS_LOCK = threading.Lock()
+    _WATCHERS.clear()
+
+
+# The watcher threads don't survive a fork.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+# Polling with a dropped web3 instance would keep its connections open.
+REGISTRY.on_clear(clear_log_watchers)
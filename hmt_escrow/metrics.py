@@ -0,0 +1,307 @@
+"""Metrics of the JSON-RPC requests sent to the ethereum nodes.
+
+With ``RPC_METRICS`` enabled, ``get_w3`` installs ``rpc_metrics_middleware``
+which records, per JSON-RPC method, the number of requests, their latency
+histogram, the size of the request and response payloads and the errors.
+The samples go to a pluggable ``MetricsSink``: ``InMemorySink`` keeps the
+counters for tests and ad hoc inspection, ``PrometheusSink`` also renders
+them in the Prometheus text exposition format.
+
+Every sample is tagged with the ``Job`` operation that caused it, e.g. all
+the requests made by ``Job.bulk_payout``, including those of the methods it
+calls, are tagged ``bulk_payout``:
+
+>>> sink = InMemorySink()
+>>> with operation("bulk_payout"):
+...     with operation("status"):
+...         sink.observe(RpcSample("eth_call", current_operation(), 0.01, 90, 70))
+>>> sink.count("eth_call", "bulk_payout")
+1
+"""
+import functools
+import logging
+import os
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+
+LOG = logging.getLogger("hmt_escrow.metrics")
+
+# Whether get_w3 installs the RPC metrics middleware.
+RPC_METRICS = os.getenv("RPC_METRICS", "false").lower() in ("1", "true", "yes")
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_OPERATION: ContextVar[str] = ContextVar("hmt_escrow_operation", default="")
+_SERDE = FriendlyJsonSerde()
+
+
+class RpcSample(NamedTuple):
+    """One JSON-RPC request."""
+
+    method: str
+    operation: str
+    latency: float
+    request_bytes: int
+    response_bytes: int
+    error: Optional[str] = None
+
+
+class MethodStats(object):
+    """Counters of the requests of one method and operation."""
+
+    def __init__(self):
+        """Inits"""
+        self.count = 0
+        self.errors: Counter = Counter()
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def add(self, sample: RpcSample):
+        """Adds a request to the counters."""
+        self.count += 1
+        self.latency_sum += sample.latency
+        self.buckets[bisect_left(LATENCY_BUCKETS, sample.latency)] += 1
+        self.request_bytes += sample.request_bytes
+        self.response_bytes += sample.response_bytes
+        if sample.error:
+            self.errors[sample.error] += 1
+
+
+class MetricsSink(object):
+    """Receives the samples of the RPC metrics middleware.
+
+    The base sink drops them.
+    """
+
+    def observe(self, sample: RpcSample):
+        """Records a JSON-RPC request."""
+        pass
+
+
+class InMemorySink(MetricsSink):
+    """Keeps the counters of the requests per method and operation."""
+
+    def __init__(self):
+        """Inits"""
+        self._stats: Dict[Tuple[str, str], MethodStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, sample: RpcSample):
+        key = (sample.method, sample.operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = MethodStats()
+            stats.add(sample)
+
+    def stats(self) -> Dict[Tuple[str, str], MethodStats]:
+        """Returns the counters keyed by method and operation."""
+        with self._lock:
+            return dict(self._stats)
+
+    def count(self, method: str = None, operation: str = None) -> int:
+        """Returns the number of requests of a method and/or an operation.
+
+        Args:
+            method (str): the JSON-RPC method, all of them if None.
+            operation (str): the Job operation, all of them if None.
+
+        Returns:
+            int: the number of requests.
+
+        """
+        return sum(
+            stats.count
+            for (m, o), stats in self.stats().items()
+            if method in (None, m) and operation in (None, o)
+        )
+
+    def clear(self):
+        """Resets the counters."""
+        with self._lock:
+            self._stats = {}
+
+
+class PrometheusSink(InMemorySink):
+    """Keeps the counters and renders them in the Prometheus text format.
+
+    >>> sink = PrometheusSink()
+    >>> sink.observe(RpcSample("eth_call", "status", 0.02, 90, 70))
+    >>> print(sink.render().splitlines()[2])
+    hmt_rpc_requests_total{method="eth_call",operation="status"} 1
+
+    """
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        requests: List[str] = []
+        errors: List[str] = []
+        latency: List[str] = []
+        payload: List[str] = []
+        for (method, operation), stats in sorted(self.stats().items()):
+            labels = f'method="{_escape(method)}",operation="{_escape(operation)}"'
+            requests.append(f"hmt_rpc_requests_total{{{labels}}} {stats.count}")
+            for kind, count in sorted(stats.errors.items()):
+                errors.append(
+                    f'hmt_rpc_errors_total{{{labels},error="{_escape(kind)}"}} {count}'
+                )
+
+            cumulative = 0
+            bounds = [repr(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+            for bound, count in zip(bounds, stats.buckets):
+                cumulative += count
+                latency.append(
+                    f'hmt_rpc_latency_seconds_bucket{{{labels},le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            latency.append(
+                f"hmt_rpc_latency_seconds_sum{{{labels}}} {stats.latency_sum}"
+            )
+            latency.append(f"hmt_rpc_latency_seconds_count{{{labels}}} {stats.count}")
+
+            payload.append(
+                f'hmt_rpc_payload_bytes_total{{{labels},direction="request"}} '
+                f"{stats.request_bytes}"
+            )
+            payload.append(
+                f'hmt_rpc_payload_bytes_total{{{labels},direction="response"}} '
+                f"{stats.response_bytes}"
+            )
+
+        lines = [
+            "# HELP hmt_rpc_requests_total JSON-RPC requests sent to the nodes.",
+            "# TYPE hmt_rpc_requests_total counter",
+            *requests,
+            "# HELP hmt_rpc_errors_total JSON-RPC requests which failed.",
+            "# TYPE hmt_rpc_errors_total counter",
+            *errors,
+            "# HELP hmt_rpc_latency_seconds Latency of the JSON-RPC requests.",
+            "# TYPE hmt_rpc_latency_seconds histogram",
+            *latency,
+            "# HELP hmt_rpc_payload_bytes_total Size of the JSON-RPC payloads.",
+            "# TYPE hmt_rpc_payload_bytes_total counter",
+            *payload,
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_SINK: MetricsSink = InMemorySink()
+
+
+def get_sink() -> MetricsSink:
+    """Returns the sink the RPC metrics are recorded to."""
+    return _SINK
+
+
+def set_sink(sink: MetricsSink):
+    """Records the RPC metrics to another sink, e.g. a ``PrometheusSink``."""
+    global _SINK
+    _SINK = sink
+
+
+def current_operation() -> str:
+    """Returns the ``Job`` operation running in this context, if any."""
+    return _OPERATION.get()
+
+
+@contextmanager
+def operation(name: str) -> Iterator[None]:
+    """Tags the requests made in the block with an operation.
+
+    An operation running inside another one keeps the outer tag, so the
+    requests are counted towards the operation the caller asked for.
+    """
+    if _OPERATION.get():
+        yield
+        return
+
+    token = _OPERATION.set(name)
+    try:
+        yield
+    finally:
+        _OPERATION.reset(token)
+
+
+def tag_operation(func: Callable) -> Callable:
+    """Decorates a method so the requests it makes are tagged with its name."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with operation(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def payload_size(payload: Any) -> int:
+    """Returns the size of a JSON-RPC payload once encoded.
+
+    >>> payload_size(["0x01", "latest"])
+    18
+
+    """
+    try:
+        return len(_SERDE.json_encode(payload, cls=Web3JsonEncoder))
+    except Exception:
+        return 0
+
+
+def observe(
+    method: str,
+    latency: float,
+    request_bytes: int,
+    response_bytes: int,
+    error: Optional[str] = None,
+):
+    """Records a request to the sink, tagged with the current operation."""
+    try:
+        _SINK.observe(
+            RpcSample(
+                method,
+                current_operation(),
+                latency,
+                request_bytes,
+                response_bytes,
+                error,
+            )
+        )
+    except Exception as e:
+        LOG.debug(f"Failed to record the metrics of {method}: {e}")
+
+
+def rpc_metrics_middleware(make_request: Callable, w3: Any) -> Callable:
+    """web3 middleware recording the metrics of every JSON-RPC request."""
+
+    def middleware(method: str, params: Any) -> Dict[str, Any]:
+        request_bytes = payload_size(params)
+        start = perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception as e:
+            observe(method, perf_counter() - start, request_bytes, 0, type(e).__name__)
+            raise e
+
+        latency = perf_counter() - start
+        error = None
+        if isinstance(response, dict) and response.get("error"):
+            rpc_error = response["error"]
+            code = rpc_error.get("code") if isinstance(rpc_error, dict) else None
+            error = f"rpc_{code if code is not None else 'error'}"
+        observe(method, latency, request_bytes, payload_size(response), error)
+        return response
+
+    return middleware
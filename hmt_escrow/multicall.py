@@ -0,0 +1,249 @@
+"""Bulk reads of many escrows through a Multicall aggregator contract.
+
+Reading the status of tens of thousands of escrows with one ``eth_call`` each
+is dominated by round trips. ``read_escrows`` packs the view calls into
+``Multicall.tryAggregate`` calls instead, each carrying as many escrow calls as
+the calldata and gas limits allow, and returns the decoded values column by
+column.
+
+The aggregator is ``contracts/Multicall.sol``, deploy it with
+``deploy_multicall`` on a local chain.
+"""
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from eth_utils import function_signature_to_4byte_selector
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.types import Wei
+
+from hmt_escrow.eth_bridge import (
+    CONTRACT_FOLDER,
+    GAS_LIMIT,
+    get_contract_interface,
+    get_w3,
+    handle_transaction,
+)
+from hmt_escrow.job import Status
+
+LOG = logging.getLogger("hmt_escrow.multicall")
+
+# Address of the deployed Multicall aggregator contract.
+MULTICALL_ADDR = os.getenv("MULTICALL_ADDR")
+
+# Maximum size in bytes of the calldata of one aggregate call.
+MULTICALL_MAX_CALLDATA = int(os.getenv("MULTICALL_MAX_CALLDATA", 128 * 1024))
+
+# Gas limit of one aggregate call, nodes cap eth_call gas (geth: 50M by default).
+MULTICALL_GAS_LIMIT = int(os.getenv("MULTICALL_GAS_LIMIT", 30000000))
+
+# Gas budgeted for each call inside an aggregate call.
+MULTICALL_CALL_GAS = int(os.getenv("MULTICALL_CALL_GAS", 20000))
+
+TRY_AGGREGATE = function_signature_to_4byte_selector("tryAggregate((address,bytes)[])")
+
+# Field name: (escrow function signature, return type, converter)
+ESCROW_FIELDS: Dict[str, Tuple[str, str, Callable[[Any], Any]]] = {
+    "status": ("status()", "uint8", lambda status: Status(status + 1)),
+    "balance": ("getBalance()", "uint256", int),
+    "bulk_paid": ("bulkPaid()", "bool", bool),
+    "manifest_url": ("manifestUrl()", "string", str),
+    "manifest_hash": ("manifestHash()", "string", str),
+    "final_results_url": ("finalResultsUrl()", "string", str),
+    "final_results_hash": ("finalResultsHash()", "string", str),
+    "launcher": ("launcher()", "address", Web3.toChecksumAddress),
+    "canceler": ("canceler()", "address", Web3.toChecksumAddress),
+    "reputation_oracle": ("reputationOracle()", "address", Web3.toChecksumAddress),
+    "recording_oracle": ("recordingOracle()", "address", Web3.toChecksumAddress),
+    "duration": ("duration()", "uint256", int),
+}
+
+
+def _calldata_size(call_data: bytes) -> int:
+    # Head offset, address, bytes offset, bytes length and the padded bytes.
+    return 4 * 32 + -(-len(call_data) // 32) * 32
+
+
+def chunk_calls(
+    calls: Sequence[Tuple[str, bytes]],
+    max_calldata: int = MULTICALL_MAX_CALLDATA,
+    gas_limit: int = MULTICALL_GAS_LIMIT,
+    call_gas: int = MULTICALL_CALL_GAS,
+) -> List[List[Tuple[str, bytes]]]:
+    """Splits calls into chunks fitting in one aggregate call.
+
+    >>> calls = [("0x4C18A2E51edC5043e9c4B6b0757990A4Ac13797f", b"1234")] * 5
+    >>> [len(chunk) for chunk in chunk_calls(calls, max_calldata=400)]
+    [2, 2, 1]
+    >>> [len(chunk) for chunk in chunk_calls(calls, gas_limit=60000)]
+    [3, 2]
+
+    Args:
+        calls (Sequence[Tuple[str, bytes]]): the target address and calldata of every call.
+        max_calldata (int): maximum calldata size of an aggregate call in bytes.
+        gas_limit (int): gas limit of an aggregate call.
+        call_gas (int): gas budgeted for each call.
+
+    Returns:
+        List[List[Tuple[str, bytes]]]: the calls split in chunks, in order.
+
+    """
+    max_calls = max(1, gas_limit // call_gas)
+    chunks: List[List[Tuple[str, bytes]]] = []
+    chunk: List[Tuple[str, bytes]] = []
+    size = 0
+    for call in calls:
+        call_size = _calldata_size(call[1])
+        if chunk and (size + call_size > max_calldata or len(chunk) >= max_calls):
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(call)
+        size += call_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def aggregate(
+    calls: Sequence[Tuple[str, bytes]],
+    multicall_addr: str = None,
+    gas_limit: int = MULTICALL_GAS_LIMIT,
+    hmt_server_addr: str = None,
+    **chunk_limits,
+) -> List[Optional[bytes]]:
+    """Runs calls through the aggregator contract, one ``eth_call`` per chunk.
+
+    Args:
+        calls (Sequence[Tuple[str, bytes]]): the target address and calldata of every call.
+        multicall_addr (str): the address of the aggregator, defaults to MULTICALL_ADDR.
+        gas_limit (int): gas limit of an aggregate call.
+        hmt_server_addr (str): the address of the ethereum node.
+        chunk_limits: ``max_calldata`` and ``call_gas`` overrides for ``chunk_calls``.
+
+    Returns:
+        List[Optional[bytes]]: the return data of every call, None for the
+        calls that reverted or hit an address without code.
+
+    Raises:
+        ValueError: if no aggregator address is configured.
+
+    """
+    multicall_addr = multicall_addr or MULTICALL_ADDR
+    if not multicall_addr:
+        raise ValueError("No Multicall address given, set MULTICALL_ADDR.")
+
+    w3 = get_w3(hmt_server_addr)
+    multicall_addr = Web3.toChecksumAddress(multicall_addr)
+    results: List[Optional[bytes]] = []
+    for chunk in chunk_calls(calls, gas_limit=gas_limit, **chunk_limits):
+        data = TRY_AGGREGATE + w3.codec.encode_abi(["(address,bytes)[]"], [chunk])
+        raw = w3.eth.call(
+            {"to": multicall_addr, "data": HexBytes(data), "gas": Wei(gas_limit)}
+        )
+        _, returned = w3.codec.decode_abi(["uint256", "(bool,bytes)[]"], raw)
+        results.extend(
+            return_data if success and return_data else None
+            for success, return_data in returned
+        )
+    LOG.debug(f"Aggregated {len(calls)} calls")
+    return results
+
+
+def read_escrows(
+    addresses: Sequence[str],
+    fields: Sequence[str] = ("status", "balance"),
+    multicall_addr: str = None,
+    gas_limit: int = MULTICALL_GAS_LIMIT,
+    hmt_server_addr: str = None,
+    **chunk_limits,
+) -> Dict[str, List[Any]]:
+    """Reads fields of many escrows at once.
+
+    >>> from test.hmt_escrow.utils import create_job
+    >>> credentials = {
+    ... 	"gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    ... 	"gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+    ... }
+    >>> multicall_addr = deploy_multicall(**credentials)
+    >>> job = create_job()
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> read_escrows([job.job_contract.address], multicall_addr=multicall_addr)["status"]
+    [<Status.Launched: 1>]
+
+    Args:
+        addresses (Sequence[str]): the ethereum addresses of the escrows.
+        fields (Sequence[str]): the fields to read, keys of ESCROW_FIELDS.
+        multicall_addr (str): the address of the aggregator, defaults to MULTICALL_ADDR.
+        gas_limit (int): gas limit of an aggregate call.
+        hmt_server_addr (str): the address of the ethereum node.
+        chunk_limits: ``max_calldata`` and ``call_gas`` overrides for ``chunk_calls``.
+
+    Returns:
+        Dict[str, List[Any]]: one list per field, and the checksum addresses
+        under "address", all in the order of the addresses. Values which
+        could not be read are None.
+
+    Raises:
+        ValueError: if a field is unknown.
+
+    """
+    unknown = set(fields) - set(ESCROW_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown escrow fields: {', '.join(sorted(unknown))}")
+
+    addresses = [Web3.toChecksumAddress(address) for address in addresses]
+    selectors = [
+        function_signature_to_4byte_selector(ESCROW_FIELDS[field][0])
+        for field in fields
+    ]
+    calls = [(address, selector) for address in addresses for selector in selectors]
+    results = aggregate(
+        calls, multicall_addr, gas_limit, hmt_server_addr, **chunk_limits
+    )
+
+    codec = get_w3(hmt_server_addr).codec
+    columns: Dict[str, List[Any]] = {"address": addresses}
+    for i, field in enumerate(fields):
+        _, output_type, convert = ESCROW_FIELDS[field]
+        column = []
+        for return_data in results[i :: len(fields)]:
+            try:
+                value = convert(codec.decode_abi([output_type], return_data)[0])
+            except Exception:
+                value = None
+            column.append(value)
+        columns[field] = column
+    return columns
+
+
+def deploy_multicall(
+    gas: int = GAS_LIMIT, hmt_server_addr: str = None, **credentials
+) -> str:
+    """Deploy the Multicall aggregator contract, e.g. to a local test chain.
+
+    Args:
+        gas (int): maximum amount of gas the caller is ready to pay.
+        hmt_server_addr (str): the address of the ethereum node.
+
+    Returns:
+        str: returns the contract address of the aggregator.
+
+    """
+    w3 = get_w3(hmt_server_addr)
+    contract_interface = get_contract_interface(
+        "{}/Multicall.sol:Multicall".format(CONTRACT_FOLDER)
+    )
+    multicall = w3.eth.contract(
+        abi=contract_interface["abi"], bytecode=contract_interface["bin"]
+    )
+    txn_receipt = handle_transaction(
+        multicall.constructor,
+        gas_payer=credentials["gas_payer"],
+        gas_payer_priv=credentials["gas_payer_priv"],
+        gas=gas or GAS_LIMIT,
+        hmt_server_addr=hmt_server_addr,
+    )
+    return str(txn_receipt["contractAddress"])
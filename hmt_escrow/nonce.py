@@ -0,0 +1,173 @@
+"""Local nonce bookkeeping for the accounts paying for transactions.
+
+Reading ``eth_getTransactionCount`` before every transaction means an account
+can only have one transaction in flight. A ``NonceManager`` reserves nonces
+locally instead, so the same gas payer can pipeline transactions, and falls
+back to the node's ``pending`` count whenever something goes wrong.
+"""
+import heapq
+import logging
+import threading
+from typing import Any, Dict, List, Set, Tuple
+
+from web3 import Web3
+from web3.eth import AsyncEth
+
+from hmt_escrow.providers import CompositeProvider, get_web3
+
+LOG = logging.getLogger("hmt_escrow.nonce")
+
+
+class NonceManager(object):
+    """Hands out the nonces of one account.
+
+    Reserved nonces are in flight until they are confirmed or released.
+    Released nonces, e.g. of transactions that failed before being broadcast,
+    are handed out again first so they don't leave gaps. Whenever nothing is in
+    flight the next nonce is read again from the node, which picks up
+    transactions sent by other processes and gaps left by dropped ones. A
+    resync keeps the nonces reserved by other senders that the node hasn't
+    seen yet, so they are never handed out twice.
+    """
+
+    def __init__(self, w3: Web3, address: str):
+        """Inits
+
+        Args:
+            w3: the web3 instance used to read the pending transaction count.
+            address: the ethereum address of the account.
+        """
+        self.w3 = w3
+        self.address = address
+        self._next_nonce = None
+        self._synced = False
+        self._released: List[int] = []
+        self._in_flight: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def reserve(self, pending: int = None) -> int:
+        """Reserves the next nonce of the account.
+
+        Args:
+            pending: the pending transaction count of the account, used instead
+                of asking the node when the manager needs to sync.
+
+        Returns:
+            int: a nonce no other transaction of this manager is using.
+
+        """
+        with self._lock:
+            if self.needs_sync:
+                self._sync(pending)
+
+            if self._released:
+                nonce = heapq.heappop(self._released)
+            else:
+                nonce = self._next_nonce
+                self._next_nonce += 1
+
+            self._in_flight.add(nonce)
+            self._synced = False
+            return nonce
+
+    def confirm(self, nonce: int):
+        """Marks the transaction using the nonce as mined."""
+        with self._lock:
+            self._in_flight.discard(nonce)
+
+    def release(self, nonce: int):
+        """Gives back a nonce whose transaction was never broadcast."""
+        with self._lock:
+            if nonce in self._in_flight:
+                self._in_flight.discard(nonce)
+                heapq.heappush(self._released, nonce)
+
+    def resync(self, pending: int = None):
+        """Reads the next nonce from the node again.
+
+        Used after a transaction failed to be sent or timed out, as the node
+        might have rejected or dropped it. The nonces below the pending count
+        are known to the node and dropped, the ones still reserved above it
+        might not be broadcast yet and are kept.
+
+        Args:
+            pending: the pending transaction count of the account, if already known.
+        """
+        with self._lock:
+            self._sync(pending)
+
+    @property
+    def needs_sync(self) -> bool:
+        """Whether the next ``reserve`` reads the pending count from the node."""
+        return not self._synced and not self._in_flight
+
+    @property
+    def in_flight(self) -> int:
+        """Number of reserved nonces that have not been confirmed yet."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def _sync(self, pending: int = None):
+        if pending is None:
+            pending = self.w3.eth.get_transaction_count(self.address, "pending")
+        self._in_flight = {nonce for nonce in self._in_flight if nonce >= pending}
+        next_nonce = max([pending] + [nonce + 1 for nonce in self._in_flight])
+        self._released = sorted(
+            set(nonce for nonce in self._released if pending <= nonce < next_nonce)
+            - self._in_flight
+        )
+        if self._next_nonce is not None and next_nonce != self._next_nonce:
+            LOG.debug(
+                f"Nonce of {self.address} resynced from {self._next_nonce} to {next_nonce}"
+            )
+        self._next_nonce = next_nonce
+        self._synced = True
+
+
+_MANAGERS: Dict[Tuple[Any, str], NonceManager] = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def get_nonce_manager(w3: Web3, address: str) -> NonceManager:
+    """Returns the process-wide nonce manager of an account.
+
+    Managers are keyed by the endpoint of the node rather than by the web3
+    instance, so the sync and asyncio senders of an account share one sequence
+    of nonces. The manager always reads the pending count with a sync web3.
+
+    Args:
+        w3 (Web3): the web3 instance the transactions are sent with.
+        address (str): the ethereum address of the account.
+
+    Returns:
+        NonceManager: the nonce manager shared by all the senders of the account.
+
+    """
+    endpoint = _endpoint(w3)
+    key = (endpoint, Web3.toChecksumAddress(address))
+    if isinstance(w3.eth, AsyncEth):
+        w3 = get_web3(endpoint)
+    with _MANAGERS_LOCK:
+        manager = _MANAGERS.get(key)
+        if manager is None:
+            manager = NonceManager(w3, key[1])
+            _MANAGERS[key] = manager
+        else:
+            # The registry drops its web3 instances on ``configure``, the
+            # nonces of the account are still the same.
+            manager.w3 = w3
+        return manager
+
+
+def _endpoint(w3: Web3) -> Any:
+    provider = w3.provider
+    if isinstance(provider, CompositeProvider):
+        return ",".join(provider.endpoints)
+    # Providers without an address, e.g. EthereumTesterProvider, are their own node.
+    return getattr(provider, "endpoint_uri", None) or w3
+
+
+def clear_nonce_managers():
+    """Drops all the nonce managers."""
+    with _MANAGERS_LOCK:
+        _MANAGERS.clear()
@@ -0,0 +1,508 @@
+"""Bulk payouts to more recipients than one transaction can take.
+
+``Escrow.bulkPayOut`` rejects 100 recipients or more. ``ChunkedPayout`` splits
+a larger payout into chunks of legal size, each with its own sequential
+``_txId``. The chunk size also adapts to the gas estimate of a chunk, so a
+chunk fits the job's gas limit and the block gas limit.
+
+The chunk transactions are pipelined: up to ``BULK_PAYOUT_PIPELINE`` of them
+are in flight at once, with consecutive nonces of the gas payer.
+
+The progress is saved to a ``ProgressStore`` after every step, keyed by the
+escrow and the payouts. A run interrupted midway resumes from the record:
+chunks whose ``BulkTransfer`` event is on chain are not paid again, and chunks
+sent but not yet mined are waited for instead of resent. The default store
+keeps the records in files under ``PAYOUT_PROGRESS_DIR``, so a payout also
+resumes after a crash or a restart. With ``PAYOUT_PROGRESS_DIR`` set empty the
+records are kept in memory and only a run of the same process resumes.
+"""
+import abc
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.contract import Contract
+from web3.exceptions import TimeExhausted, TransactionNotFound
+from web3.types import TxReceipt
+
+from hmt_escrow.eth_bridge import (
+    WEB3_TIMEOUT,
+    Retry,
+    TransactionHandle,
+    submit_transaction,
+)
+
+LOG = logging.getLogger("hmt_escrow.payouts")
+
+# Most recipients of one bulkPayOut, the contract requires less than 100.
+BULK_MAX_RECIPIENTS = int(os.getenv("BULK_MAX_RECIPIENTS", 99))
+
+# Most chunk transactions of a payout in flight at once.
+BULK_PAYOUT_PIPELINE = int(os.getenv("BULK_PAYOUT_PIPELINE", 4))
+
+# Share of the gas limit a chunk may use according to its estimate.
+BULK_PAYOUT_GAS_MARGIN = float(os.getenv("BULK_PAYOUT_GAS_MARGIN", 0.8))
+
+# Directory of the payout progress records, kept in memory if set empty.
+PAYOUT_PROGRESS_DIR = os.getenv(
+    "PAYOUT_PROGRESS_DIR",
+    os.path.join(os.path.expanduser("~"), ".hmt_escrow", "payouts"),
+)
+
+BULK_TRANSFER_TOPIC = Web3.keccak(text="BulkTransfer(uint256,uint256)")
+
+Chunk = Dict[str, Any]
+Record = Dict[str, Any]
+
+
+class ProgressStore(abc.ABC):
+    """Keeps the progress records of the chunked payouts."""
+
+    @abc.abstractmethod
+    def load(self, key: str) -> Optional[Record]:
+        """Returns the record of a payout, None if there is none."""
+
+    @abc.abstractmethod
+    def save(self, key: str, record: Record):
+        """Saves the record of a payout."""
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        """Drops the record of a completed payout."""
+
+
+class MemoryProgressStore(ProgressStore):
+    """Keeps the records in memory, a payout only resumes within the process."""
+
+    def __init__(self):
+        """Inits"""
+        self._records: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[Record]:
+        with self._lock:
+            record = self._records.get(key)
+        return json.loads(record) if record is not None else None
+
+    def save(self, key: str, record: Record):
+        with self._lock:
+            self._records[key] = json.dumps(record)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._records.pop(key, None)
+
+
+class FileProgressStore(ProgressStore):
+    """Keeps one JSON file per payout, a payout resumes after a crash."""
+
+    def __init__(self, directory: str):
+        """Inits
+
+        Args:
+            directory: the directory of the records, created if needed.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, key: str) -> Optional[Record]:
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, record: Record):
+        # Written aside and renamed, a crash never leaves half a record.
+        path = self._path(key)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+
+_MEMORY_STORE = MemoryProgressStore()
+
+
+def default_progress_store() -> ProgressStore:
+    """Returns the store of ``PAYOUT_PROGRESS_DIR``, or the in-memory one if it is empty."""
+    if PAYOUT_PROGRESS_DIR:
+        return FileProgressStore(PAYOUT_PROGRESS_DIR)
+    return _MEMORY_STORE
+
+
+def _forget_sent(chunk: Chunk):
+    """Drops the transactions of a chunk to send again."""
+    chunk.pop("txn_hashes", None)
+    chunk.pop("nonce", None)
+
+
+def payout_key(escrow_addr: str, recipients: Sequence[str], amounts: Sequence[int]):
+    """Returns the key of the progress record of a payout.
+
+    >>> payout_key("0x01", ["0x02"], [10]) == payout_key("0x01", ["0x02"], [10])
+    True
+    >>> payout_key("0x01", ["0x02"], [10]) == payout_key("0x01", ["0x02"], [11])
+    False
+
+    """
+    payload = json.dumps(
+        [escrow_addr.lower(), [r.lower() for r in recipients], amounts]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chunk_size(
+    per_recipient_gas: Optional[float],
+    gas_limit: int,
+    max_recipients: int = BULK_MAX_RECIPIENTS,
+    margin: float = BULK_PAYOUT_GAS_MARGIN,
+) -> int:
+    """Returns the number of recipients of a chunk fitting the gas limit.
+
+    >>> chunk_size(None, 4712388)
+    99
+    >>> chunk_size(60000, 4712388)
+    62
+
+    Args:
+        per_recipient_gas (float): the estimated gas per recipient, None if unknown.
+        gas_limit (int): the gas a chunk transaction may use.
+        max_recipients (int): the most recipients of a chunk.
+        margin (float): the share of the gas limit the estimate may use.
+
+    Returns:
+        int: the number of recipients, at least 1.
+
+    """
+    if not per_recipient_gas:
+        return max_recipients
+    return max(1, min(max_recipients, int(gas_limit * margin / per_recipient_gas)))
+
+
+def plan_chunks(count: int, size: int, tx_id: int) -> List[Chunk]:
+    """Splits a payout to count recipients into chunks with sequential ids.
+
+    >>> [(c["tx_id"], c["start"], c["end"]) for c in plan_chunks(5, 2, 7)]
+    [(7, 0, 2), (8, 2, 4), (9, 4, 5)]
+
+    """
+    return [
+        {"tx_id": tx_id + i, "start": start, "end": min(start + size, count)}
+        for i, start in enumerate(range(0, count, size))
+    ]
+
+
+def bulk_transfer_ids(receipt: TxReceipt, escrow_addr: str) -> List[int]:
+    """Returns the ``_txId`` of the ``BulkTransfer`` events of a receipt."""
+    ids = []
+    for log in receipt.get("logs", []):
+        topics = log.get("topics", [])
+        if (
+            len(topics) > 1
+            and bytes(topics[0]) == bytes(BULK_TRANSFER_TOPIC)
+            and log.get("address", "").lower() == escrow_addr.lower()
+        ):
+            ids.append(int.from_bytes(bytes(topics[1]), "big"))
+    return ids
+
+
+class ChunkedPayout(object):
+    """Pays the recipients of a bulk payout in pipelined chunks."""
+
+    def __init__(
+        self,
+        w3: Web3,
+        escrow_contract: Contract,
+        txn_info: Dict[str, Any],
+        retry: Retry = None,
+        store: ProgressStore = None,
+        pipeline: int = BULK_PAYOUT_PIPELINE,
+        max_recipients: int = BULK_MAX_RECIPIENTS,
+        fallback: Callable[[List[Any]], Optional[TxReceipt]] = None,
+    ):
+        """Inits
+
+        Args:
+            w3: the web3 instance of the escrow.
+            escrow_contract: the escrow paying out.
+            txn_info: the transaction data of ``submit_transaction``.
+            retry: how many times a chunk stuck in the pool is replaced.
+            store: the store of the progress records.
+            pipeline: the most chunk transactions in flight at once.
+            max_recipients: the most recipients of a chunk.
+            fallback: sends the arguments of a chunk with other credentials
+                when the gas payer fails to, returns the receipt or None.
+        """
+        self.w3 = w3
+        self.escrow_contract = escrow_contract
+        self.txn_info = txn_info
+        self.retry = retry or Retry()
+        self.store = store or default_progress_store()
+        self.pipeline = max(1, pipeline)
+        self.max_recipients = max_recipients
+        self.fallback = fallback
+
+    def run(
+        self,
+        recipients: List[str],
+        amounts: List[int],
+        upload_results: Callable[[], Tuple[str, str]],
+        tx_id: int = 1,
+    ) -> bool:
+        """Pays the recipients, resuming a previous run of the same payout.
+
+        Args:
+            recipients (List[str]): the ethereum addresses to pay.
+            amounts (List[int]): the amounts to pay, in the token's base unit.
+            upload_results (Callable): stores the final results, returns their
+                hash and url. Only called on the first run of a payout.
+            tx_id (int): the ``_txId`` of the first chunk.
+
+        Returns:
+            bool: whether all the chunks were paid.
+
+        """
+        escrow_addr = self.escrow_contract.address
+        key = payout_key(escrow_addr, recipients, amounts)
+        record = self.store.load(key)
+        if record is None:
+            hash_, url = upload_results()
+            size = chunk_size(
+                self._per_recipient_gas(recipients, amounts, url, hash_, tx_id),
+                self._gas_limit(),
+                self.max_recipients,
+            )
+            record = {
+                "escrow": escrow_addr,
+                "url": url,
+                "hash": hash_,
+                "from_block": self.w3.eth.block_number,
+                "chunks": plan_chunks(len(recipients), size, tx_id),
+            }
+            self.store.save(key, record)
+            LOG.info(
+                f"Paying {len(recipients)} recipients of {escrow_addr} in "
+                f"{len(record['chunks'])} chunks of {size}"
+            )
+        else:
+            LOG.info(f"Resuming the payout {key} of {escrow_addr}")
+            if not self._reconcile(key, record):
+                return False
+
+        in_flight: List[Tuple[Chunk, TransactionHandle]] = []
+        failed = False
+        for chunk in record["chunks"]:
+            if chunk.get("paid"):
+                continue
+
+            while len(in_flight) >= self.pipeline:
+                failed = not self._settle(key, record, *in_flight.pop(0)) or failed
+            if failed:
+                break
+
+            args = self._chunk_args(chunk, record, recipients, amounts)
+            try:
+                handle = submit_transaction(
+                    self.escrow_contract.functions.bulkPayOut, *args, **self.txn_info
+                )
+            except Exception as e:
+                LOG.warning(f"Failed to send the payout chunk {chunk['tx_id']}: {e}")
+                failed = not self._send_fallback(key, record, chunk, args)
+                continue
+
+            self._track(key, record, chunk, handle)
+            in_flight.append((chunk, handle))
+
+        for chunk, handle in in_flight:
+            failed = not self._settle(key, record, chunk, handle) or failed
+
+        if all(chunk.get("paid") for chunk in record["chunks"]):
+            self.store.delete(key)
+            return True
+        return False
+
+    def _chunk_args(
+        self, chunk: Chunk, record: Record, recipients: List[str], amounts: List[int]
+    ) -> List[Any]:
+        start, end = chunk["start"], chunk["end"]
+        return [
+            recipients[start:end],
+            amounts[start:end],
+            record["url"],
+            record["hash"],
+            chunk["tx_id"],
+        ]
+
+    def _settle(
+        self, key: str, record: Record, chunk: Chunk, handle: TransactionHandle
+    ) -> bool:
+        receipt = None
+        for i in range(self.retry.retries + 1):
+            try:
+                receipt = handle.result()
+                break
+            except TimeExhausted as e:
+                # The handle might have replaced the transaction while waiting.
+                self._track(key, record, chunk, handle)
+                if i == self.retry.retries:
+                    LOG.warning(f"Payout chunk {chunk['tx_id']} still pending: {e}")
+                    handle.abandon()
+                    return False
+                handle.speed_up()
+                self._track(key, record, chunk, handle)
+            except Exception as e:
+                LOG.warning(f"Payout chunk {chunk['tx_id']} failed: {e}")
+                break
+
+        chunk["txn_hashes"] = [handle.txn_hash.hex()]
+        return self._record_receipt(key, record, chunk, receipt)
+
+    def _track(self, key: str, record: Record, chunk: Chunk, handle: TransactionHandle):
+        """Saves the nonce of a chunk and every hash it was broadcast with."""
+        chunk["txn_hashes"] = [txn_hash.hex() for txn_hash in handle.hashes]
+        chunk["nonce"] = handle.nonce
+        self.store.save(key, record)
+
+    def _send_fallback(self, key: str, record: Record, chunk: Chunk, args) -> bool:
+        receipt = self.fallback(args) if self.fallback else None
+        if receipt is not None:
+            chunk["txn_hashes"] = [HexBytes(receipt["transactionHash"]).hex()]
+        return self._record_receipt(key, record, chunk, receipt)
+
+    def _record_receipt(
+        self, key: str, record: Record, chunk: Chunk, receipt: Optional[TxReceipt]
+    ) -> bool:
+        paid = receipt is not None and chunk["tx_id"] in bulk_transfer_ids(
+            receipt, record["escrow"]
+        )
+        if paid:
+            chunk["paid"] = True
+        else:
+            # Not mined or not paid, e.g. for lack of balance: send it again
+            # on the next run.
+            _forget_sent(chunk)
+        self.store.save(key, record)
+        return paid
+
+    def _reconcile(self, key: str, record: Record) -> bool:
+        """Marks the chunks paid on chain and settles the ones sent.
+
+        Returns False if a chunk sent before is still pending: it keeps its
+        ``txn_hashes`` and the payout is resumed by the next run.
+        """
+        unpaid = [chunk for chunk in record["chunks"] if not chunk.get("paid")]
+        if not unpaid:
+            return True
+
+        settled = True
+        paid_ids = self._paid_ids(record, [chunk["tx_id"] for chunk in unpaid])
+        for chunk in unpaid:
+            if chunk["tx_id"] in paid_ids:
+                chunk["paid"] = True
+            elif chunk.get("txn_hashes"):
+                # Sent before the interruption: paying it again could pay twice
+                # if it is still in the pool.
+                try:
+                    paid = self._sent_paid(record, chunk)
+                except TimeExhausted as e:
+                    LOG.warning(f"Payout chunk {chunk['tx_id']} still pending: {e}")
+                    settled = False
+                    continue
+                if paid:
+                    chunk["paid"] = True
+                else:
+                    _forget_sent(chunk)
+        self.store.save(key, record)
+        return settled
+
+    def _paid_ids(self, record: Record, tx_ids: List[int]) -> set:
+        logs = self.w3.eth.get_logs(
+            {
+                "address": record["escrow"],
+                "fromBlock": record["from_block"],
+                "topics": [
+                    BULK_TRANSFER_TOPIC.hex(),
+                    [Web3.toHex(tx_id.to_bytes(32, "big")) for tx_id in tx_ids],
+                ],
+            }
+        )
+        return set(bulk_transfer_ids({"logs": logs}, record["escrow"]))
+
+    def _sent_paid(self, record: Record, chunk: Chunk) -> bool:
+        """Whether a chunk sent by a previous run was paid.
+
+        The chunk is only taken as dropped when the node knows none of its
+        transactions and its nonce is still unused: a replacement whose hash
+        the record missed might still be pending with that nonce.
+
+        Raises:
+            TimeExhausted: if a transaction of the chunk, or of its nonce, is
+                still pending.
+
+        """
+        escrow_addr = record["escrow"]
+        for txn_hash in chunk["txn_hashes"]:
+            try:
+                receipt = self.w3.eth.get_transaction_receipt(txn_hash)
+            except TransactionNotFound:
+                continue
+            return chunk["tx_id"] in bulk_transfer_ids(receipt, escrow_addr)
+
+        for txn_hash in chunk["txn_hashes"]:
+            try:
+                self.w3.eth.get_transaction(txn_hash)
+            except TransactionNotFound:
+                continue
+            receipt = self.w3.eth.wait_for_transaction_receipt(
+                txn_hash, timeout=WEB3_TIMEOUT
+            )
+            return chunk["tx_id"] in bulk_transfer_ids(receipt, escrow_addr)
+
+        nonce = chunk.get("nonce")
+        gas_payer = self.txn_info["gas_payer"]
+        if (
+            nonce is None
+            or self.w3.eth.get_transaction_count(gas_payer, "pending") <= nonce
+        ):
+            # Dropped from the pool, it will never be mined.
+            return False
+        if self.w3.eth.get_transaction_count(gas_payer) <= nonce:
+            raise TimeExhausted(f"Nonce {nonce} of {gas_payer} is still pending")
+        # A transaction of the nonce was mined, maybe a replacement of the chunk.
+        return chunk["tx_id"] in self._paid_ids(record, [chunk["tx_id"]])
+
+    def _gas_limit(self) -> int:
+        gas = self.txn_info["gas"]
+        try:
+            return min(gas, self.w3.eth.get_block("latest")["gasLimit"])
+        except Exception as e:
+            LOG.debug(f"No block gas limit, using the job's: {e}")
+            return gas
+
+    def _per_recipient_gas(self, recipients, amounts, url, hash_, tx_id):
+        count = min(len(recipients), self.max_recipients)
+        try:
+            estimate = self.escrow_contract.functions.bulkPayOut(
+                recipients[:count], amounts[:count], url, hash_, tx_id
+            ).estimateGas({"from": self.txn_info["gas_payer"]})
+        except Exception as e:
+            LOG.debug(f"Failed to estimate the payout gas: {e}")
+            return None
+        return math.ceil(estimate / count)
@@ -0,0 +1,524 @@
+"""Shared web3 connections to the ethereum network.
+
+Building a provider opens new HTTP/WebSocket connections and injecting the
+middlewares is not free either, so a process-wide registry hands out one
+``Web3`` per endpoint. HTTP endpoints share a pooled ``requests.Session`` that
+keeps its connections alive between calls.
+
+The middlewares of the ``Web3`` instances follow a profile. Workers which
+only send signed transactions and make plain calls can use the "lean" one,
+whose results are plain dicts instead of ``AttributeDict`` and whose blocks
+are not validated, to save the CPU time of the other middlewares per request.
+
+Several endpoints can be given as one comma separated string, e.g.
+``HMT_ETH_SERVER=https://node-a,https://node-b``. They are then served by a
+``CompositeProvider`` which routes the reads to the fastest healthy node and
+fails over when a node errors or lags behind the others.
+"""
+import logging
+import os
+import threading
+import weakref
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from eth_typing import URI
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+from web3.providers import BaseProvider, HTTPProvider, WebsocketProvider
+from web3.providers.auto import load_provider_from_uri
+from web3.providers.eth_tester import EthereumTesterProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from hmt_escrow.metrics import RPC_METRICS, rpc_metrics_middleware
+
+LOG = logging.getLogger("hmt_escrow.providers")
+
+# Maximum number of pooled HTTP connections kept per endpoint.
+WEB3_POOL_SIZE = int(os.getenv("WEB3_POOL_SIZE", 10))
+
+# Seconds between WebSocket keep-alive pings. 0 disables the pings and closes
+# HTTP connections after every request.
+WEB3_KEEP_ALIVE = int(os.getenv("WEB3_KEEP_ALIVE", 20))
+
+# Blocks an endpoint may lag behind the highest known head before it is ejected.
+WEB3_MAX_LAG = int(os.getenv("WEB3_MAX_LAG", 3))
+
+# Seconds between two reads of the head block of every endpoint.
+WEB3_HEAD_CHECK_INTERVAL = float(os.getenv("WEB3_HEAD_CHECK_INTERVAL", 5))
+
+# Seconds an endpoint is skipped after a failed request.
+WEB3_ERROR_COOLDOWN = float(os.getenv("WEB3_ERROR_COOLDOWN", 10))
+
+# Middlewares of the web3 instances: "full" keeps the web3 defaults and adds
+# geth_poa_middleware, "lean" only keeps LEAN_MIDDLEWARES and "custom" keeps
+# the ones named in WEB3_MIDDLEWARES.
+WEB3_MIDDLEWARE_PROFILE = os.getenv("WEB3_MIDDLEWARE_PROFILE", "full")
+
+# Comma separated middlewares kept by the "custom" profile, among the web3
+# defaults and "geth_poa".
+WEB3_MIDDLEWARES = os.getenv("WEB3_MIDDLEWARES", "")
+
+# Middlewares needed to send signed raw transactions and make eth_calls: the
+# request/response formatters. ENS name resolution, attribute dicts, result
+# validation and the gas middlewares of eth_sendTransaction are left out.
+LEAN_MIDDLEWARES = ("request_param_normalizer", "pythonic", "abi")
+
+MIDDLEWARE_PROFILES = ("full", "lean", "custom")
+
+HTTP_SCHEMES = {"http", "https"}
+WS_SCHEMES = {"ws", "wss"}
+
+
+def apply_middleware_profile(
+    w3: Web3, profile: str = WEB3_MIDDLEWARE_PROFILE, middlewares: List[str] = None
+) -> Web3:
+    """Sets the middlewares of a web3 instance according to a profile.
+
+    >>> w3 = apply_middleware_profile(Web3(), "lean")
+    >>> sorted(w3.middleware_onion._queue)
+    ['abi', 'pythonic', 'request_param_normalizer']
+
+    Args:
+        w3 (Web3): a web3 instance with the default middlewares.
+        profile (str): "full", "lean" or "custom".
+        middlewares (List[str]): the middlewares kept by the "custom"
+            profile, defaults to WEB3_MIDDLEWARES.
+
+    Returns:
+        Web3: the web3 instance.
+
+    Raises:
+        ValueError: if the profile or a middleware is unknown.
+
+    """
+    if profile == "full":
+        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        return w3
+
+    if profile == "lean":
+        keep = list(LEAN_MIDDLEWARES)
+    elif profile == "custom":
+        if middlewares is None:
+            middlewares = [m.strip() for m in WEB3_MIDDLEWARES.split(",") if m.strip()]
+        keep = list(middlewares)
+    else:
+        raise ValueError(
+            f"Unknown middleware profile {profile!r}, use one of {MIDDLEWARE_PROFILES}"
+        )
+
+    onion = w3.middleware_onion
+    unknown = set(keep) - set(onion._queue) - {"geth_poa"}
+    if unknown:
+        raise ValueError(f"Unknown middlewares {sorted(unknown)}")
+
+    for name in list(onion._queue):
+        if name not in keep:
+            onion.remove(name)
+    if "geth_poa" in keep:
+        onion.inject(geth_poa_middleware, layer=0)
+    return w3
+
+
+def build_provider(
+    endpoint: str, pool_size: int = WEB3_POOL_SIZE, keep_alive: int = WEB3_KEEP_ALIVE
+) -> BaseProvider:
+    """Builds a provider for the given endpoint.
+
+    >>> type(build_provider("http://localhost:8545"))
+    <class 'web3.providers.rpc.HTTPProvider'>
+    >>> type(build_provider("wss://localhost:8546"))
+    <class 'web3.providers.websocket.WebsocketProvider'>
+
+    Args:
+        endpoint (str): the address of the ethereum node.
+        pool_size (int): maximum number of pooled HTTP connections.
+        keep_alive (int): seconds between WebSocket pings, 0 disables keep-alive.
+
+    Returns:
+        BaseProvider: a provider connected to the endpoint.
+
+    """
+    if "," in endpoint:
+        return CompositeProvider(
+            [address.strip() for address in endpoint.split(",") if address.strip()],
+            pool_size,
+            keep_alive,
+        )
+
+    if not endpoint:
+        LOG.error("Using EthereumTesterProvider as we have no HMT_ETH_SERVER")
+        return EthereumTesterProvider()
+
+    scheme = urlparse(endpoint).scheme
+    if scheme in HTTP_SCHEMES:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+        return HTTPProvider(endpoint, session=session)
+
+    if scheme in WS_SCHEMES:
+        return WebsocketProvider(
+            endpoint, websocket_kwargs={"ping_interval": keep_alive or None}
+        )
+
+    return load_provider_from_uri(URI(endpoint))
+
+
+class EndpointStats(object):
+    """Latency, error rate and head block of one endpoint of a ``CompositeProvider``."""
+
+    # Weight of the latest sample in the moving averages.
+    SMOOTHING = 0.2
+
+    def __init__(self, endpoint: str):
+        """Inits
+
+        Args:
+            endpoint: the address of the ethereum node.
+        """
+        self.endpoint = endpoint
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.head: Optional[int] = None
+        self.lagging = False
+        self.down_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        """Whether the endpoint can serve requests."""
+        return not self.lagging and self.down_until <= now
+
+    def record_success(self, latency: float):
+        """Records the latency of a successful request."""
+        self.latency += self.SMOOTHING * (latency - self.latency)
+        self.error_rate -= self.SMOOTHING * self.error_rate
+
+    def record_error(self, now: float, cooldown: float = 0.0):
+        """Records a failed request, the endpoint is skipped for ``cooldown`` seconds."""
+        self.error_rate += self.SMOOTHING * (1 - self.error_rate)
+        self.down_until = now + cooldown
+
+    def __repr__(self) -> str:
+        return (
+            f"EndpointStats({self.endpoint!r}, latency={self.latency:.3f}, "
+            f"error_rate={self.error_rate:.2f}, head={self.head}, "
+            f"lagging={self.lagging})"
+        )
+
+
+class CompositeProvider(BaseProvider):
+    """A provider spreading the requests over several endpoints.
+
+    Reads go to the healthy endpoint with the lowest latency. Transactions,
+    nonces and filters stick to the first healthy endpoint in the given
+    order, as they depend on the state of one node. An endpoint is skipped
+    for ``error_cooldown`` seconds after a failed request, the request moving
+    on to the next endpoint, and is ejected while its head block lags more
+    than ``max_lag`` blocks behind the highest head seen. The head blocks are
+    read by a background thread every ``head_check_interval`` seconds, never
+    while serving a request.
+
+    JSON-RPC error responses count as errors of the endpoint too. Most of them,
+    e.g. reverts or rejected transactions, are the request's fault and don't
+    skip the endpoint, only ``NODE_ERROR_CODES`` do.
+    """
+
+    # JSON-RPC error codes of a failing node rather than a failing request:
+    # internal error and limit exceeded.
+    NODE_ERROR_CODES = {-32603, -32005}
+
+    STICKY_METHODS = {
+        "eth_sendRawTransaction",
+        "eth_sendTransaction",
+        "eth_getTransactionCount",
+        "eth_newFilter",
+        "eth_newBlockFilter",
+        "eth_newPendingTransactionFilter",
+        "eth_getFilterChanges",
+        "eth_getFilterLogs",
+        "eth_uninstallFilter",
+    }
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        pool_size: int = WEB3_POOL_SIZE,
+        keep_alive: int = WEB3_KEEP_ALIVE,
+        max_lag: int = WEB3_MAX_LAG,
+        head_check_interval: float = WEB3_HEAD_CHECK_INTERVAL,
+        error_cooldown: float = WEB3_ERROR_COOLDOWN,
+        providers: List[BaseProvider] = None,
+    ):
+        """Inits
+
+        Args:
+            endpoints: the addresses of the ethereum nodes, in order of preference.
+            pool_size: maximum number of pooled HTTP connections per endpoint.
+            keep_alive: seconds between WebSocket pings, 0 disables keep-alive.
+            max_lag: blocks an endpoint may lag behind before being ejected.
+            head_check_interval: seconds between two reads of every head block.
+            error_cooldown: seconds an endpoint is skipped after a failure.
+            providers: prebuilt providers of the endpoints, built if None.
+        """
+        if not endpoints:
+            raise ValueError("At least one endpoint is required.")
+
+        super().__init__()
+        self.endpoints = list(endpoints)
+        self.providers = providers or [
+            build_provider(endpoint, pool_size, keep_alive) for endpoint in endpoints
+        ]
+        self.stats = [EndpointStats(endpoint) for endpoint in endpoints]
+        self.max_lag = max_lag
+        self.head_check_interval = head_check_interval
+        self.error_cooldown = error_cooldown
+        self._head_checker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        self._start_head_checks()
+
+        error: Optional[Exception] = None
+        for i in self._route(method):
+            try:
+                return self._request(i, method, params)
+            except Exception as e:
+                LOG.warning(f"{method} failed on {self.endpoints[i]}: {e}")
+                error = e
+        raise error
+
+    def isConnected(self) -> bool:
+        return any(provider.isConnected() for provider in self.providers)
+
+    def _route(self, method: str) -> List[int]:
+        """Returns the endpoint indexes to try, best first."""
+        now = monotonic()
+        with self._lock:
+            healthy = [i for i, stats in enumerate(self.stats) if stats.healthy(now)]
+            others = [i for i in range(len(self.stats)) if i not in healthy]
+            if method not in self.STICKY_METHODS:
+                healthy.sort(key=lambda i: self.stats[i].latency)
+                others.sort(key=lambda i: self.stats[i].error_rate)
+        return healthy + others
+
+    def _request(self, i: int, method: str, params: Any) -> RPCResponse:
+        start = monotonic()
+        try:
+            response = self.providers[i].make_request(method, params)
+        except Exception as e:
+            with self._lock:
+                self.stats[i].record_error(monotonic(), self.error_cooldown)
+            raise e
+
+        error = response.get("error")
+        with self._lock:
+            if error is None:
+                self.stats[i].record_success(monotonic() - start)
+            else:
+                code = error.get("code") if isinstance(error, dict) else None
+                cooldown = self.error_cooldown if code in self.NODE_ERROR_CODES else 0
+                self.stats[i].record_error(monotonic(), cooldown)
+        if method == "eth_blockNumber" and "result" in response:
+            self._update_head(i, int(response["result"], 16))
+        return response
+
+    def _start_head_checks(self):
+        checker = self._head_checker
+        # The thread doesn't survive a fork, it is started again in the child.
+        if checker is not None and checker.is_alive():
+            return
+
+        with self._lock:
+            if self._head_checker is None or not self._head_checker.is_alive():
+                self._head_checker = threading.Thread(
+                    target=_check_heads_periodically,
+                    args=(weakref.ref(self),),
+                    name="hmt-head-check",
+                    daemon=True,
+                )
+                self._head_checker.start()
+
+    def _check_heads(self):
+        for i in range(len(self.providers)):
+            try:
+                self._request(i, "eth_blockNumber", [])
+            except Exception as e:
+                LOG.debug(f"Head check of {self.endpoints[i]} failed: {e}")
+
+    def _update_head(self, i: int, head: int):
+        with self._lock:
+            self.stats[i].head = head
+            highest = max(stats.head for stats in self.stats if stats.head is not None)
+            for stats in self.stats:
+                lagging = stats.head is not None and highest - stats.head > self.max_lag
+                if lagging != stats.lagging:
+                    LOG.info(
+                        f"{stats.endpoint} is {highest - stats.head} blocks behind,"
+                        f" {'ejected' if lagging else 'back'}"
+                    )
+                stats.lagging = lagging
+
+
+def _check_heads_periodically(ref: "weakref.ref[CompositeProvider]"):
+    """Reads the head blocks of a provider until it is garbage collected."""
+    provider = ref()
+    while provider is not None:
+        interval = provider.head_check_interval
+        # Not holding the provider while sleeping lets it be collected.
+        del provider
+        sleep(interval)
+        provider = ref()
+        if provider is not None:
+            provider._check_heads()
+
+
+class ProviderRegistry(object):
+    """Process-wide registry of ``Web3`` instances keyed by endpoint.
+
+    >>> registry = ProviderRegistry()
+    >>> w3 = registry.get("http://localhost:8545")
+    >>> registry.get("http://localhost:8545") is w3
+    True
+    >>> registry.get("http://127.0.0.1:8545") is w3
+    False
+
+    """
+
+    def __init__(
+        self,
+        pool_size: int = WEB3_POOL_SIZE,
+        keep_alive: int = WEB3_KEEP_ALIVE,
+        metrics: bool = RPC_METRICS,
+        profile: str = WEB3_MIDDLEWARE_PROFILE,
+        middlewares: List[str] = None,
+    ):
+        """Inits
+
+        Args:
+            pool_size: maximum number of pooled HTTP connections per endpoint.
+            keep_alive: seconds between WebSocket pings, 0 disables keep-alive.
+            metrics: whether to record the RPC metrics, see ``hmt_escrow.metrics``.
+            profile: the middleware profile, "full", "lean" or "custom".
+            middlewares: the middlewares of the "custom" profile.
+        """
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.metrics = metrics
+        self.profile = profile
+        self.middlewares = middlewares
+        self._web3s: Dict[str, Web3] = {}
+        self._on_clear: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> Web3:
+        """Returns the shared ``Web3`` of an endpoint, creating it on first use.
+
+        Args:
+            endpoint (str): the address of the ethereum node.
+
+        Returns:
+            Web3: the shared web3 instance.
+
+        """
+        w3 = self._web3s.get(endpoint)
+        if w3 is not None:
+            return w3
+
+        with self._lock:
+            w3 = self._web3s.get(endpoint)
+            if w3 is None:
+                w3 = self._build(endpoint)
+                self._web3s[endpoint] = w3
+            return w3
+
+    def configure(
+        self,
+        pool_size: int = None,
+        keep_alive: int = None,
+        metrics: bool = None,
+        profile: str = None,
+        middlewares: List[str] = None,
+    ):
+        """Changes the connection settings. Existing connections are dropped.
+
+        Args:
+            pool_size: maximum number of pooled HTTP connections per endpoint.
+            keep_alive: seconds between WebSocket pings, 0 disables keep-alive.
+            metrics: whether to record the RPC metrics.
+            profile: the middleware profile, "full", "lean" or "custom".
+            middlewares: the middlewares of the "custom" profile.
+        """
+        if profile is not None and profile not in MIDDLEWARE_PROFILES:
+            raise ValueError(f"Unknown middleware profile {profile!r}")
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if keep_alive is not None:
+            self.keep_alive = keep_alive
+        if metrics is not None:
+            self.metrics = metrics
+        if profile is not None:
+            self.profile = profile
+        if middlewares is not None:
+            self.middlewares = middlewares
+        self.clear()
+
+    def clear(self):
+        """Drops all the shared ``Web3`` instances.
+
+        The callbacks registered with ``on_clear`` are called afterwards, so the
+        helpers keyed by a ``Web3`` instance don't keep the dropped ones alive.
+        """
+        with self._lock:
+            self._web3s = {}
+        for callback in self._on_clear:
+            callback()
+
+    def on_clear(self, callback: Callable[[], None]):
+        """Registers a callback called whenever the ``Web3`` instances are dropped.
+
+        Args:
+            callback: called without arguments by ``clear`` and ``configure``.
+        """
+        self._on_clear.append(callback)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._web3s = {}
+
+    def _build(self, endpoint: str) -> Web3:
+        provider = build_provider(endpoint, self.pool_size, self.keep_alive)
+        w3 = apply_middleware_profile(Web3(provider), self.profile, self.middlewares)
+        if self.metrics:
+            # Innermost, next to the provider: every request reaching the node is
+            # counted, each retry on its own, and results served by a cache
+            # middleware are not counted at all.
+            w3.middleware_onion.inject(
+                rpc_metrics_middleware, name="rpc_metrics", layer=0
+            )
+        return w3
+
+
+REGISTRY = ProviderRegistry()
+
+# Pooled connections must not be shared between a parent and a forked child.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=REGISTRY._after_fork)
+
+
+def get_web3(endpoint: str) -> Web3:
+    """Returns the shared ``Web3`` of an endpoint from the process-wide registry.
+
+    Args:
+        endpoint (str): the address of the ethereum node.
+
+    Returns:
+        Web3: the shared web3 instance.
+
+    """
+    return REGISTRY.get(endpoint)
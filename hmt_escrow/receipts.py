@@ -0,0 +1,198 @@
+"""Waits for transaction receipts by following the new blocks of a node.
+
+Polling ``eth_getTransactionReceipt`` for every pending transaction costs one
+call per transaction every few seconds. A ``ReceiptWaiter`` follows the head
+of the chain instead: one background thread per endpoint reads every new block
+once and resolves all the waiting transactions it includes, so the RPC load
+stays flat however many transactions are waited for.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from time import sleep
+from typing import Dict, Optional, Set
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+from web3.types import TxReceipt
+
+from hmt_escrow.providers import REGISTRY
+
+LOG = logging.getLogger("hmt_escrow.receipts")
+
+# Seconds between two reads of the latest block number.
+WEB3_BLOCK_POLL_INTERVAL = float(os.getenv("WEB3_BLOCK_POLL_INTERVAL", 1))
+
+
+class ReceiptWaiter(object):
+    """Resolves the receipts of the transactions sent to one node.
+
+    The waiter thread only runs while transactions are being waited for. It
+    reads ``eth_blockNumber`` every ``poll_interval`` seconds, fetches each new
+    block once and only asks for the receipts of the waiting transactions the
+    block includes. Transactions are also looked up once when they start being
+    watched, in case they were mined before the waiter followed the chain.
+    """
+
+    def __init__(self, w3: Web3, poll_interval: float = WEB3_BLOCK_POLL_INTERVAL):
+        """Inits
+
+        Args:
+            w3: the web3 instance of the node.
+            poll_interval: seconds between two reads of the latest block number.
+        """
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self._waiting: Dict[HexBytes, Future] = {}
+        self._unchecked: Set[HexBytes] = set()
+        self._last_block: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def watch(self, txn_hash) -> Future:
+        """Starts waiting for a transaction to be mined.
+
+        Args:
+            txn_hash: the hash of the broadcast transaction.
+
+        Returns:
+            Future: resolved with the transaction receipt once it is mined.
+
+        """
+        txn_hash = HexBytes(txn_hash)
+        with self._lock:
+            future = self._waiting.get(txn_hash)
+            if future is None:
+                future = Future()
+                self._waiting[txn_hash] = future
+                self._unchecked.add(txn_hash)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="hmt-receipt-waiter", daemon=True
+                )
+                self._thread.start()
+            return future
+
+    def forget(self, txn_hash):
+        """Stops waiting for a transaction and cancels its future."""
+        txn_hash = HexBytes(txn_hash)
+        with self._lock:
+            future = self._waiting.pop(txn_hash, None)
+            self._unchecked.discard(txn_hash)
+        if future is not None:
+            future.cancel()
+
+    @property
+    def head(self) -> Optional[int]:
+        """The latest block number followed, None while the waiter is idle."""
+        return self._last_block
+
+    @property
+    def waiting(self) -> int:
+        """Number of transactions waited for."""
+        with self._lock:
+            return len(self._waiting)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._waiting:
+                    # Nothing to wait for, the next watch starts a new thread.
+                    self._thread = None
+                    self._last_block = None
+                    return
+                unchecked, self._unchecked = self._unchecked, set()
+
+            try:
+                self._poll(unchecked)
+            except Exception as e:
+                LOG.warning(f"Failed to follow the blocks of {self.w3.provider}: {e}")
+                with self._lock:
+                    self._unchecked |= unchecked & set(self._waiting)
+
+            sleep(self.poll_interval)
+
+    def _poll(self, unchecked: Set[HexBytes]):
+        head = self.w3.eth.block_number
+
+        # Anything mined up to the head is found by looking the new
+        # transactions up, the blocks after it are followed.
+        for txn_hash in unchecked:
+            self._check(txn_hash)
+
+        if self._last_block is None:
+            self._last_block = head
+            return
+
+        for number in range(self._last_block + 1, head + 1):
+            block = self.w3.eth.get_block(number)
+            with self._lock:
+                included = [
+                    HexBytes(txn_hash)
+                    for txn_hash in block["transactions"]
+                    if HexBytes(txn_hash) in self._waiting
+                ]
+            for txn_hash in included:
+                self._check(txn_hash)
+            self._last_block = number
+
+    def _check(self, txn_hash: HexBytes):
+        try:
+            receipt = self.w3.eth.get_transaction_receipt(txn_hash)
+        except TransactionNotFound:
+            return
+
+        # Some nodes return receipts of pending transactions without a block.
+        if receipt is None or receipt["blockHash"] is None:
+            return
+
+        with self._lock:
+            future = self._waiting.pop(txn_hash, None)
+            self._unchecked.discard(txn_hash)
+        if future is not None and future.set_running_or_notify_cancel():
+            future.set_result(receipt)
+
+
+_WAITERS: Dict[Web3, ReceiptWaiter] = {}
+_WAITERS_LOCK = threading.Lock()
+
+
+def get_receipt_waiter(w3: Web3) -> ReceiptWaiter:
+    """Returns the process-wide receipt waiter of a web3 instance.
+
+    Args:
+        w3 (Web3): the web3 instance the transactions were sent with.
+
+    Returns:
+        ReceiptWaiter: the receipt waiter shared by all the senders of the node.
+
+    """
+    with _WAITERS_LOCK:
+        waiter = _WAITERS.get(w3)
+        if waiter is None:
+            waiter = ReceiptWaiter(w3)
+            _WAITERS[w3] = waiter
+        return waiter
+
+
+def clear_receipt_waiters():
+    """Drops all the receipt waiters."""
+    with _WAITERS_LOCK:
+        _WAITERS.clear()
+
+
+def _after_fork():
+    global _WAITERS_LOCK
+    _WAITERS_LOCK = threading.Lock()
+    _WAITERS.clear()
+
+
+# The waiter threads don't survive a fork.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+# Waiting with a dropped web3 instance would keep its connections open.
+REGISTRY.on_clear(clear_receipt_waiters)
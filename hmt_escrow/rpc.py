@@ -0,0 +1,173 @@
+"""JSON-RPC batches of contract view calls.
+
+web3 sends one HTTP request per ``eth_call``. Reading several values of a
+contract at once is cheaper as a single JSON-RPC batch: one round trip for all
+the calls. Providers which can't send batches fall back to one call at a time.
+"""
+import json
+import logging
+from time import perf_counter
+from typing import Any, Dict, List, Sequence, Union
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from web3._utils.request import make_post_request
+from web3.contract import ContractFunction
+from web3.exceptions import ContractLogicError
+from web3.providers import HTTPProvider
+
+from hmt_escrow.metrics import observe
+
+LOG = logging.getLogger("hmt_escrow.rpc")
+
+
+class BatchError(Exception):
+    """Raised when the node rejects a whole JSON-RPC batch."""
+
+    pass
+
+
+def encode_call(
+    contract_function: ContractFunction, gas_payer: str, gas: int
+) -> Dict[str, str]:
+    """Returns the ``eth_call`` parameters of a bound contract function.
+
+    Args:
+        contract_function (ContractFunction): the function with its arguments.
+        gas_payer (str): the ethereum address calling the contract.
+        gas (int): maximum amount of gas the caller is ready to pay.
+
+    Returns:
+        Dict[str, str]: the call object of the JSON-RPC request.
+
+    """
+    return {
+        "from": gas_payer,
+        "to": contract_function.address,
+        "gas": hex(gas),
+        "data": contract_function._encode_transaction_data(),
+    }
+
+
+def decode_result(w3: Web3, contract_function: ContractFunction, result) -> Any:
+    """Decodes the return data of an ``eth_call``.
+
+    Args:
+        w3 (Web3): a web3 instance, only its codec is used.
+        contract_function (ContractFunction): the function that was called.
+        result: the hex string or bytes returned by the node.
+
+    Returns:
+        Any: the decoded return value, a tuple when the function returns several values.
+
+    """
+    output_types = get_abi_output_types(contract_function.abi)
+    output_data = w3.codec.decode_abi(output_types, HexBytes(result))
+    normalized = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, output_data)
+    return normalized[0] if len(normalized) == 1 else tuple(normalized)
+
+
+def batch_call(
+    w3: Web3,
+    contract_functions: Sequence[ContractFunction],
+    gas_payer: str,
+    gas: int,
+    return_exceptions: bool = False,
+) -> List[Any]:
+    """Calls several view functions in one JSON-RPC batch.
+
+    >>> from hmt_escrow.eth_bridge import get_w3, get_escrow
+    >>> from test.hmt_escrow.utils import create_job
+    >>> job = create_job()
+    >>> rep_oracle_pub_key = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+    >>> job.launch(rep_oracle_pub_key)
+    True
+    >>> functions = job.job_contract.functions
+    >>> batch_call(get_w3(), [functions.status(), functions.getBalance()], job.gas_payer, job.gas)
+    [0, 0]
+
+    Args:
+        w3 (Web3): the web3 instance of the node.
+        contract_functions (Sequence[ContractFunction]): the functions with their arguments.
+        gas_payer (str): the ethereum address calling the contracts.
+        gas (int): maximum amount of gas the caller is ready to pay per call.
+        return_exceptions (bool): whether to return the errors of failed calls
+            in place of their results instead of raising the first one.
+
+    Returns:
+        List: the decoded results in the order of the functions.
+
+    Raises:
+        ContractLogicError: if a call fails and return_exceptions is False.
+
+    """
+    calls = [encode_call(function, gas_payer, gas) for function in contract_functions]
+
+    if isinstance(w3.provider, HTTPProvider) and len(calls) > 1:
+        try:
+            responses = _send_batch(
+                w3.provider, calls, "rpc_metrics" in w3.middleware_onion
+            )
+        except BatchError as e:
+            LOG.debug(f"Falling back to single calls: {e}")
+            responses = _send_each(w3, calls)
+    else:
+        responses = _send_each(w3, calls)
+
+    results: List[Any] = []
+    for function, response in zip(contract_functions, responses):
+        if "error" in response:
+            error = ContractLogicError(response["error"].get("message", "call failed"))
+            if not return_exceptions:
+                raise error
+            results.append(error)
+        else:
+            results.append(decode_result(w3, function, response["result"]))
+    return results
+
+
+def _send_batch(
+    provider: HTTPProvider, calls: List[Dict[str, str]], metrics: bool = False
+) -> List[Dict[str, Any]]:
+    request = [
+        {"jsonrpc": "2.0", "method": "eth_call", "params": [call, "latest"], "id": i}
+        for i, call in enumerate(calls)
+    ]
+    data = json.dumps(request).encode("utf-8")
+    start = perf_counter()
+    try:
+        raw_response = make_post_request(
+            provider.endpoint_uri, data, **provider.get_request_kwargs()
+        )
+    except Exception as e:
+        if metrics:
+            observe(
+                "batch:eth_call", perf_counter() - start, len(data), 0, type(e).__name__
+            )
+        raise e
+    if metrics:
+        # The batch bypasses the web3 middlewares.
+        observe("batch:eth_call", perf_counter() - start, len(data), len(raw_response))
+    response = json.loads(raw_response)
+
+    # Nodes without batch support answer with a single error.
+    if not isinstance(response, list):
+        raise BatchError(response.get("error", response))
+
+    by_id = {item.get("id"): item for item in response}
+    if len(by_id) != len(calls) or any(i not in by_id for i in range(len(calls))):
+        raise BatchError("Incomplete batch response")
+    return [by_id[i] for i in range(len(calls))]
+
+
+def _send_each(w3: Web3, calls: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    responses: List[Dict[str, Union[str, Dict]]] = []
+    for call in calls:
+        try:
+            tx = dict(call, gas=int(call["gas"], 16))
+            responses.append({"result": w3.eth.call(tx)})
+        except ContractLogicError as e:
+            responses.append({"error": {"message": str(e)}})
+    return responses
@@ -6,10 +6,12 @@ import urllib.request
 import re
 from typing import Dict, Tuple, Optional, Union
 
-import boto3
-from botocore.exceptions import ClientError
-
 from hmt_escrow import crypto
+from hmt_escrow.lazy import lazy_import
+
+# boto3 takes long to import, only load it once S3 is used.
+boto3 = lazy_import("boto3")
+botocore_exceptions = lazy_import("botocore.exceptions")
 
 SHARED_MAC_DATA: bytes = os.getenv(
     "SHARED_MAC", "9da0d3721774843193737244a0f3355191f66ff7321e83eae83f7f746eb34350"
@@ -43,6 +45,8 @@ ESCROW_AWS_REGION = os.getenv("ESCROW_AWS_REGION", "us-west-2")
 ESCROW_ENDPOINT_URL = os.getenv("ESCROW_ENDPOINT_URL", "http://minio:9000")
 ESCROW_PUBLIC_BUCKETNAME = os.getenv("ESCROW_PUBLIC_BUCKETNAME", ESCROW_ENDPOINT_URL)
 
+URL_PATTERN = "^https?:\\/\\/(?:www\\.)?[-a-zA-Z0-9@:%._\\+~#=]{1,256}\\.[a-zA-Z0-9()]{1,6}\\b(?:[-a-zA-Z0-9()@:%_\\+.~#?&\\/=]*)$"
+
 
 class StorageClientError(Exception):
     """Raises when some error happens when interacting with storage."""
@@ -120,6 +124,54 @@ def get_key_from_url(url: str) -> str:
     return url
 
 
+def is_url(key: str) -> bool:
+    """Whether a key is a fully qualified http(s) URL rather than a storage key.
+
+    >>> is_url("https://my-bucket.s3.amazonaws.com/s3aaa")
+    True
+    >>> is_url("s3aaa")
+    False
+
+    Args:
+        key(str): the key or URL of a file.
+
+    Returns:
+        bool: returns True if the key is an URL.
+    """
+    return re.match(URL_PATTERN, key) is not None
+
+
+def _encode(msg: Dict, public_key: bytes, encrypt_data: bool) -> Tuple[str, str, bytes]:
+    """Serializes and optionally encrypts a message for storage.
+
+    Returns:
+        Tuple[str, str, bytes]: the hash of the message, its key and the body to store.
+    """
+    try:
+        artifact = json.dumps(msg, sort_keys=True)
+    except Exception as e:
+        LOG.error("Can't extract the json from the dict")
+        raise e
+
+    content = artifact.encode("utf-8")
+
+    hash_ = hashlib.sha1(content).hexdigest()
+    key = f"s3{hash_}"
+
+    # If encryption is on, use crypto.encrypt function, else use utf-8 encoded artifact
+    body = crypto.encrypt(public_key, artifact) if encrypt_data is True else content
+    return hash_, key, body
+
+
+def _decode(content: bytes, private_key: bytes) -> str:
+    """Decrypts the content of a file if it is encrypted."""
+    return (
+        crypto.decrypt(private_key, content)
+        if crypto.is_encrypted(content) is True
+        else content.decode()
+    )
+
+
 def download_from_storage(key: str, public: bool = False) -> bytes:
     """Downloads data from storage if exists.
 
@@ -133,7 +185,7 @@ def download_from_storage(key: str, public: bool = False) -> bytes:
     BOTO3_CLIENT = _connect_s3()
     try:
         response = BOTO3_CLIENT.get_object(Bucket=bucket_name, Key=key)
-    except ClientError as e:
+    except botocore_exceptions.ClientError as e:
         if e.response["Error"]["Code"] == "NoSuchKey":
             raise StorageFileNotFoundError("No object found - returning empty")
 
@@ -165,18 +217,12 @@ def download(key: str, private_key: bytes, public: bool = False) -> Dict:
 
     """
     try:
-        url_pattern = "^https?:\\/\\/(?:www\\.)?[-a-zA-Z0-9@:%._\\+~#=]{1,256}\\.[a-zA-Z0-9()]{1,6}\\b(?:[-a-zA-Z0-9()@:%_\\+.~#?&\\/=]*)$"
-        is_url = re.match(url_pattern, key)
         content = (
             urllib.request.urlopen(key).read()
-            if is_url
+            if is_url(key)
             else download_from_storage(key=key, public=public)
         )
-        artifact = (
-            crypto.decrypt(private_key, content)
-            if crypto.is_encrypted(content) is True
-            else content.decode()
-        )
+        artifact = _decode(content, private_key)
     except Exception as e:
         LOG.warning(
             "Reading the key {!r} with private key {!r} with S3 failed"
@@ -209,22 +255,11 @@ def upload(
         Exception: if adding bytes fails.
 
     """
-    try:
-        artifact = json.dumps(msg, sort_keys=True)
-    except Exception as e:
-        LOG.error("Can't extract the json from the dict")
-        raise e
-
-    content = artifact.encode("utf-8")
-
-    hash_ = hashlib.sha1(content).hexdigest()
-    key = f"s3{hash_}"
+    hash_, key, body = _encode(msg, public_key, encrypt_data)
 
     # Get private or public bucket name
     bucket_name = get_bucket(public=use_public_bucket)
 
-    # If encryption is on, use crypto.encrypt function, else use utf-8 encoded artifact
-    body = crypto.encrypt(public_key, artifact) if encrypt_data is True else content
     bucket_kwargs: Dict[str, Union[str, bytes]] = {
         "Body": body,
         "Bucket": bucket_name,
@@ -14,6 +14,7 @@ setuptools.setup(
         "Programming Language :: Python",
     ],
     packages=setuptools.find_packages() + ["contracts", "migrations"],
+    package_data={"hmt_escrow": ["artifacts/*.json"]},
     install_requires=[
         "boto3",
         "cryptography",
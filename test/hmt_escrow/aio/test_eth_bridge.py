@@ -0,0 +1,222 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import rlp
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+
+from hmt_escrow.aio.eth_bridge import (
+    call,
+    handle_transaction,
+    handle_transaction_with_retry,
+    submit_transaction,
+    wait_for_transaction,
+)
+from hmt_escrow.aio.receipts import AsyncReceiptWaiter
+from hmt_escrow.eth_bridge import Retry, get_contract
+from hmt_escrow.kvstore_abi import abi as kvstore_abi
+from hmt_escrow.nonce import clear_nonce_managers
+
+GAS_PAYER = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+GAS_PAYER_PRIV = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+KVSTORE = "0xbcF8274FAb0cbeD0099B2cAFe862035a6217Bf44"
+BLOCK_HASH = "0x" + "11" * 32
+
+
+class FakeNode(object):
+    """Answers the JSON-RPC requests of the asyncio web3 instances."""
+
+    def __init__(self):
+        self.requests = []
+        self.sent = []
+        self.raw = []
+        self.dropped = set()
+        self.head = 10
+        self.blocks = {}
+        self.results = {}
+
+    async def request(self, method, params):
+        self.requests.append(method)
+        if method == "eth_chainId":
+            return "0x1"
+        if method == "eth_gasPrice":
+            return "0x3b9aca00"
+        if method == "eth_getTransactionCount":
+            return "0x7"
+        if method == "eth_sendRawTransaction":
+            txn_hash = Web3.keccak(hexstr=params[0]).hex()
+            self.sent.append(txn_hash)
+            self.raw.append(params[0])
+            return txn_hash
+        if method == "eth_getTransactionByHash":
+            if params[0] in self.dropped:
+                return None
+            return {"hash": params[0]} if params[0] in self.sent else None
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        if method == "eth_getBlockByNumber":
+            return {"transactions": self.blocks.get(int(params[0], 16), [])}
+        if method == "eth_getTransactionReceipt":
+            if params[0] not in self.sent or params[0] not in self.mined:
+                return None
+            return {
+                "blockHash": BLOCK_HASH,
+                "status": "0x1",
+                "transactionHash": params[0],
+                "logs": [],
+            }
+        return self.results[method]
+
+    @property
+    def mined(self):
+        return {txn_hash for block in self.blocks.values() for txn_hash in block}
+
+    def mine(self, hashes=None):
+        self.head += 1
+        self.blocks[self.head] = list(self.sent if hashes is None else hashes)
+
+    def nonces_and_prices(self):
+        """The nonce and gas price of every legacy transaction sent."""
+        return [
+            tuple(
+                int.from_bytes(field, "big") for field in rlp.decode(HexBytes(raw))[:2]
+            )
+            for raw in self.raw
+        ]
+
+
+class AsyncEthBridgeTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        clear_nonce_managers()
+        self.node = FakeNode()
+        self.w3 = MagicMock()
+        self.w3.codec = Web3().codec
+        self.w3.manager.coro_request = AsyncMock(side_effect=self.node.request)
+        patcher = patch("hmt_escrow.aio.eth_bridge.get_w3", return_value=self.w3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.waiter = AsyncReceiptWaiter(self.w3, poll_interval=0.01)
+        patcher = patch(
+            "hmt_escrow.aio.eth_bridge.get_receipt_waiter", return_value=self.waiter
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.kvstore = get_contract("KVStore", KVSTORE, kvstore_abi)
+        self.txn_info = {
+            "gas_payer": GAS_PAYER,
+            "gas_payer_priv": GAS_PAYER_PRIV,
+            "gas": 4712388,
+        }
+
+    def tearDown(self):
+        clear_nonce_managers()
+
+    async def test_call_decodes_result(self):
+        self.node.results["eth_call"] = "0x" + self.w3.codec.encode_abi(
+            ["string"], ["value"]
+        ).hex().replace("0x", "")
+        value = await call(self.kvstore.functions.get(GAS_PAYER, "key"), GAS_PAYER)
+        self.assertEqual(value, "value")
+
+    async def test_transactions_share_the_waiter(self):
+        txn_func = self.kvstore.functions.set
+        handles = await asyncio.gather(
+            *[
+                submit_transaction(txn_func, "key", str(i), **self.txn_info)
+                for i in range(3)
+            ]
+        )
+        self.assertEqual(len({handle.txn_hash for handle in handles}), 3)
+        self.assertEqual(self.node.requests.count("eth_getTransactionCount"), 1)
+
+        receipt_task = asyncio.ensure_future(
+            handle_transaction(txn_func, "key", "3", **self.txn_info)
+        )
+        await asyncio.sleep(0.02)
+        self.node.mine()
+        receipt = await asyncio.wait_for(receipt_task, 1)
+        self.assertEqual(receipt["status"], 1)
+        self.assertEqual(receipt["transactionHash"], HexBytes(self.node.sent[-1]))
+        self.assertEqual(self.node.requests.count("eth_getBlockByNumber"), 1)
+
+    async def test_speed_up_replaces_with_same_nonce(self):
+        handle = await submit_transaction(
+            self.kvstore.functions.set, "key", "value", **self.txn_info
+        )
+        with self.assertRaises(TimeExhausted):
+            await handle.result(timeout=0.02)
+
+        replacement = await handle.speed_up()
+        self.assertEqual(
+            handle.hashes, [HexBytes(txn_hash) for txn_hash in self.node.sent]
+        )
+        (nonce, price), (replaced_nonce, replaced_price) = self.node.nonces_and_prices()
+        self.assertEqual((nonce, replaced_nonce), (7, 7))
+        self.assertGreater(replaced_price, price)
+
+        self.node.mine([replacement.hex()])
+        receipt = await handle.result(timeout=1)
+        self.assertEqual(receipt["transactionHash"], replacement)
+        self.assertEqual(handle.txn_hash, replacement)
+        self.assertEqual(self.waiter.waiting, 0)
+
+    async def test_fee_bumps_are_capped(self):
+        handle = await submit_transaction(
+            self.kvstore.functions.set, "key", "value", **self.txn_info
+        )
+        with patch("hmt_escrow.eth_bridge.MAX_FEE_BUMPS", 1):
+            replacement = await handle.speed_up()
+            self.assertEqual(await handle.speed_up(), replacement)
+        self.assertEqual(len(self.node.sent), 2)
+
+    async def test_retry_replaces_pending_transaction(self):
+        async def mine_second():
+            while len(self.node.sent) < 2:
+                await asyncio.sleep(0.005)
+            self.node.mine(self.node.sent[1:])
+
+        miner = asyncio.ensure_future(mine_second())
+        with patch("hmt_escrow.aio.eth_bridge.WEB3_TIMEOUT", 0.05):
+            receipt = await handle_transaction_with_retry(
+                self.kvstore.functions.set,
+                Retry(retries=2, delay=0),
+                "key",
+                "value",
+                **self.txn_info,
+            )
+        await miner
+        self.assertEqual(receipt["transactionHash"], HexBytes(self.node.sent[1]))
+        self.assertEqual([nonce for nonce, _ in self.node.nonces_and_prices()], [7, 7])
+
+    async def test_dropped_transaction_nonce_is_reused(self):
+        txn_func = self.kvstore.functions.set
+        dropped = await submit_transaction(txn_func, "key", "1", **self.txn_info)
+        await submit_transaction(txn_func, "key", "2", **self.txn_info)
+        self.node.dropped.add(dropped.txn_hash.hex())
+        with patch("hmt_escrow.aio.eth_bridge.WEB3_TIMEOUT", 0.02):
+            with self.assertRaises(TimeExhausted):
+                await wait_for_transaction(dropped)
+
+        await submit_transaction(txn_func, "key", "3", **self.txn_info)
+        nonces = [nonce for nonce, _ in self.node.nonces_and_prices()]
+        self.assertEqual(nonces, [7, 8, 7])
+
+    async def test_retry_gives_up_without_new_nonce(self):
+        with patch("hmt_escrow.aio.eth_bridge.WEB3_TIMEOUT", 0.02):
+            with self.assertRaises(TimeExhausted):
+                await handle_transaction_with_retry(
+                    self.kvstore.functions.set,
+                    Retry(retries=1, delay=0),
+                    "key",
+                    "value",
+                    **self.txn_info,
+                )
+        self.assertEqual([nonce for nonce, _ in self.node.nonces_and_prices()], [7, 7])
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,293 @@
+import asyncio
+import threading
+import unittest
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from web3.exceptions import TimeExhausted
+
+from hmt_escrow.aio.job import AsyncJob
+from hmt_escrow.eth_bridge import Retry
+from hmt_escrow.job import Status
+from test.hmt_escrow.utils import test_manifest
+
+GAS_PAYER = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+GAS_PAYER_PRIV = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+REP_ORACLE_PUB_KEY = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+RECIPIENT = "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809"
+SECONDARY = (
+    "0x61F9F0B31eacB420553da8BCC59DC617279731Ac",
+    "486a0621e595dd7fcbe5608cbbeec8f5a8b5cabe7637f11eccfc7acd408c3a0e",
+)
+FACTORY = "0x8e4C131B37383E431B9cd0635D3cF9f3F628EDae"
+ESCROW = "0x067cbbC2BAE2fF3Bd6bF91A9b1ab0C78F7E4C1f2"
+
+SUCCEEDED = {"txn_succeeded": True, "tx_receipt": {"status": 1}}
+
+
+class AsyncJobTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.credentials = {"gas_payer": GAS_PAYER, "gas_payer_priv": GAS_PAYER_PRIV}
+        self.job = AsyncJob(
+            self.credentials,
+            multi_credentials=[SECONDARY],
+            retry=Retry(retries=0, delay=0),
+        )
+        self.job.factory_contract = MagicMock()
+        self.job._init_job(test_manifest())
+
+    def patch(self, *args, **kwargs):
+        patcher = patch(*args, **kwargs)
+        mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        return mock
+
+    def patch_object(self, *args, **kwargs):
+        patcher = patch.object(*args, **kwargs)
+        mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        return mock
+
+    async def test_create_new_job(self):
+        factory = MagicMock()
+        with patch.object(
+            AsyncJob, "_init_factory", AsyncMock(return_value=factory)
+        ) as init_factory:
+            job = await AsyncJob.create(
+                self.credentials, test_manifest(), factory_addr=FACTORY
+            )
+        self.assertIs(job.factory_contract, factory)
+        self.assertEqual(init_factory.call_args[0][0], FACTORY)
+        self.assertEqual(job.amount, Decimal("100.0"))
+
+    async def test_create_validates_arguments(self):
+        with self.assertRaises(ValueError):
+            await AsyncJob.create(self.credentials)
+        with patch.object(
+            AsyncJob, "_factory_contains_escrow", AsyncMock(return_value=False)
+        ):
+            with self.assertRaises(ValueError):
+                await AsyncJob.create(
+                    self.credentials, escrow_addr=ESCROW, factory_addr=FACTORY
+                )
+        with self.assertRaises(ValueError):
+            AsyncJob({"gas_payer": RECIPIENT, "gas_payer_priv": GAS_PAYER_PRIV})
+
+    async def test_invalid_multi_credentials_are_dropped(self):
+        job = AsyncJob(
+            self.credentials, multi_credentials=[SECONDARY, (RECIPIENT, GAS_PAYER_PRIV)]
+        )
+        self.assertEqual(job.multi_credentials, [SECONDARY])
+
+    async def test_launch_uploads_manifest_during_escrow_creation(self):
+        upload_started = asyncio.Event()
+
+        async def upload(msg, public_key):
+            upload_started.set()
+            await asyncio.sleep(0.01)
+            return "hash", "url"
+
+        async def create_escrow(txn_func, txn_args, txn_event):
+            await asyncio.wait_for(upload_started.wait(), 1)
+            self.assertEqual(txn_args, [[SECONDARY[0]]])
+            return SUCCEEDED
+
+        self.patch("hmt_escrow.aio.job.storage.upload", side_effect=upload)
+        get_escrow = self.patch("hmt_escrow.aio.job.get_escrow")
+        self.patch_object(self.job, "_transact", side_effect=create_escrow)
+        self.patch_object(self.job, "status", AsyncMock(return_value=Status.Launched))
+        self.patch_object(self.job, "balance", AsyncMock(return_value=0))
+        launched = self.job.factory_contract.events.Launched.return_value
+        launched.processReceipt.return_value = [{"args": {"escrow": ESCROW}}]
+
+        self.assertTrue(await self.job.launch(REP_ORACLE_PUB_KEY))
+        self.assertEqual(
+            (self.job.manifest_hash, self.job.manifest_url), ("hash", "url")
+        )
+        self.assertIs(self.job.job_contract, get_escrow.return_value)
+        self.assertEqual(get_escrow.call_args[0][0], ESCROW)
+        self.assertLessEqual(
+            {"create_escrow", "upload", "upload_wait", "verify", "total"},
+            set(self.job.launch_timings),
+        )
+
+        with self.assertRaises(AttributeError):
+            await self.job.launch(REP_ORACLE_PUB_KEY)
+
+    async def test_failed_launch_cancels_upload(self):
+        cancelled = asyncio.Event()
+
+        async def upload(msg, public_key):
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def fail_escrow_creation(txn_func, txn_args, txn_event):
+            await asyncio.sleep(0.01)
+            return {"txn_succeeded": False, "tx_receipt": None}
+
+        self.patch("hmt_escrow.aio.job.storage.upload", side_effect=upload)
+        self.patch_object(self.job, "_transact", side_effect=fail_escrow_creation)
+        with self.assertRaises(Exception):
+            await self.job.launch(REP_ORACLE_PUB_KEY)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        self.assertFalse(hasattr(self.job, "job_contract"))
+
+    async def test_setup(self):
+        self.job.job_contract = MagicMock(address=ESCROW)
+        self.job.manifest_url, self.job.manifest_hash = "url", "hash"
+        hmt_amount = int(self.job.amount * 10**18)
+        self.patch(
+            "hmt_escrow.aio.job.get_hmt_balance", AsyncMock(return_value=hmt_amount * 2)
+        )
+        hmtoken = self.patch("hmt_escrow.aio.job.get_hmtoken").return_value
+        self.patch(
+            "hmt_escrow.aio.job.utils.parse_transfer_transaction",
+            return_value=(True, hmt_amount),
+        )
+        transact = self.patch_object(
+            self.job, "_transact", AsyncMock(return_value=SUCCEEDED)
+        )
+        self.patch_object(self.job, "status", AsyncMock(return_value=Status.Pending))
+
+        self.assertTrue(await self.job.setup())
+        (transfer, setup) = transact.call_args_list
+        self.assertIs(transfer[0][0], hmtoken.functions.transfer)
+        self.assertEqual(transfer[0][1], [ESCROW, hmt_amount])
+        self.assertTrue(transfer[0][3])
+        self.assertIs(setup[0][0], self.job.job_contract.functions.setup)
+        self.assertEqual(setup[0][1][-2:], ["url", "hash"])
+
+    async def test_setup_stops_without_transfer(self):
+        self.job.job_contract = MagicMock(address=ESCROW)
+        self.patch("hmt_escrow.aio.job.get_hmt_balance", AsyncMock(return_value=0))
+        self.patch("hmt_escrow.aio.job.get_hmtoken")
+        transact = self.patch_object(
+            self.job,
+            "_transact",
+            AsyncMock(return_value={"txn_succeeded": False, "tx_receipt": None}),
+        )
+        self.assertFalse(await self.job.setup())
+        transact.assert_awaited_once()
+        # The main credentials lack the HMT, only the secondary ones are tried.
+        self.assertFalse(transact.call_args[0][3])
+
+    async def test_setup_without_escrow(self):
+        self.assertFalse(await self.job.setup())
+
+    async def test_complete(self):
+        self.job.job_contract = MagicMock()
+        transact = self.patch_object(
+            self.job, "_transact", AsyncMock(return_value=SUCCEEDED)
+        )
+        self.patch_object(self.job, "status", AsyncMock(return_value=Status.Complete))
+        self.assertTrue(await self.job.complete())
+        self.assertIs(
+            transact.call_args[0][0], self.job.job_contract.functions.complete
+        )
+
+    async def test_status_and_balance(self):
+        self.job.job_contract = MagicMock()
+        call = self.patch("hmt_escrow.aio.job.call", AsyncMock(side_effect=[1, 42]))
+        self.assertEqual(await self.job.status(), Status.Pending)
+        self.assertEqual(await self.job.balance(), 42)
+        self.assertEqual(call.call_args[0][1], GAS_PAYER)
+
+    async def test_transact_falls_back_on_send_failures(self):
+        handle = self.patch(
+            "hmt_escrow.aio.job.handle_transaction_with_retry",
+            AsyncMock(side_effect=[ValueError("insufficient funds"), {"status": 1}]),
+        )
+        txn = await self.job._transact(MagicMock(), [1], "Test")
+        self.assertEqual(txn, {"txn_succeeded": True, "tx_receipt": {"status": 1}})
+        self.assertEqual(
+            [call[1]["gas_payer"] for call in handle.call_args_list],
+            [GAS_PAYER, SECONDARY[0]],
+        )
+        self.assertEqual(self.job.gas_payer, SECONDARY[0])
+
+    async def test_transact_does_not_resend_pending_transactions(self):
+        handle = self.patch(
+            "hmt_escrow.aio.job.handle_transaction_with_retry",
+            AsyncMock(side_effect=TimeExhausted("still pending")),
+        )
+        txn = await self.job._transact(MagicMock(), [1], "Test")
+        self.assertFalse(txn["txn_succeeded"])
+        handle.assert_awaited_once()
+        self.assertEqual(self.job.gas_payer, GAS_PAYER)
+
+    async def test_transact_fails_with_all_credentials(self):
+        self.patch(
+            "hmt_escrow.aio.job.handle_transaction_with_retry",
+            AsyncMock(side_effect=ValueError("insufficient funds")),
+        )
+        txn = await self.job._transact(MagicMock(), [1], "Test")
+        self.assertEqual(txn, {"txn_succeeded": False, "tx_receipt": None})
+
+
+class AsyncJobBulkPayoutTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.job = AsyncJob(
+            {"gas_payer": GAS_PAYER, "gas_payer_priv": GAS_PAYER_PRIV},
+            retry=Retry(retries=0, delay=0),
+        )
+        self.job.job_contract = MagicMock()
+        self.upload = AsyncMock(return_value=("hash", "url"))
+        patcher = patch("hmt_escrow.aio.job.storage.upload", self.upload)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_single_transaction(self):
+        payouts = [(RECIPIENT, Decimal("20.0"))]
+        with patch.object(
+            self.job, "_transact", AsyncMock(return_value=SUCCEEDED)
+        ) as transact, patch.object(
+            self.job, "_bulk_paid", AsyncMock(return_value=True)
+        ):
+            self.assertTrue(await self.job.bulk_payout(payouts, {}, REP_ORACLE_PUB_KEY))
+
+        func_args = transact.call_args[0][1]
+        self.assertEqual(func_args, [[RECIPIENT], [20 * 10**18], "url", "hash", 1])
+        self.upload.assert_awaited_once()
+
+    async def test_chunks_large_payouts(self):
+        payouts = [(RECIPIENT, Decimal("1.0"))] * 150
+        loop_thread = threading.current_thread()
+        ran = {}
+
+        def run(recipients, amounts, upload_results):
+            # The sync payout runs in the executor, the coroutines in the loop.
+            ran["thread"] = threading.current_thread()
+            ran["recipients"] = recipients
+            ran["results"] = upload_results()
+            ran["fallback"] = fallback(["args"])
+            return True
+
+        with patch("hmt_escrow.aio.job.ChunkedPayout") as chunked_payout, patch(
+            "hmt_escrow.aio.job.get_sync_w3"
+        ), patch.object(
+            self.job, "_transact", AsyncMock(return_value=SUCCEEDED)
+        ) as transact:
+            chunked_payout.return_value.run.side_effect = run
+            fallback = None
+
+            def init(*args, **kwargs):
+                nonlocal fallback
+                fallback = kwargs["fallback"]
+                return chunked_payout.return_value
+
+            chunked_payout.side_effect = init
+            self.assertTrue(await self.job.bulk_payout(payouts, {}, REP_ORACLE_PUB_KEY))
+
+        self.assertIsNot(ran["thread"], loop_thread)
+        self.assertEqual(len(ran["recipients"]), 150)
+        self.assertEqual(ran["results"], ("hash", "url"))
+        self.assertEqual(ran["fallback"], SUCCEEDED["tx_receipt"])
+        transact.assert_awaited_once()
+        self.assertFalse(transact.call_args[1]["use_main_credentials"])
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
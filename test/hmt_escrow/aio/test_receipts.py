@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+
+from hmt_escrow.aio.receipts import AsyncReceiptWaiter, get_receipt_waiter
+
+TXN_A = "0x" + "0a" * 32
+TXN_B = "0x" + "0b" * 32
+TXN_C = "0x" + "0c" * 32
+BLOCK_HASH = "0x" + "11" * 32
+
+
+class AsyncReceiptWaiterTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.head = 10
+        self.blocks = {}
+        self.mined = set()
+        self.requests = []
+        self.w3 = MagicMock()
+        self.w3.manager.coro_request = AsyncMock(side_effect=self.request)
+        self.waiter = AsyncReceiptWaiter(self.w3, poll_interval=0.01)
+
+    async def request(self, method, params):
+        self.requests.append(method)
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        if method == "eth_getBlockByNumber":
+            return {"transactions": self.blocks.get(int(params[0], 16), [])}
+        if method == "eth_getTransactionReceipt":
+            if params[0] not in self.mined:
+                return None
+            return {
+                "blockHash": BLOCK_HASH,
+                "status": "0x1",
+                "transactionHash": params[0],
+                "logs": [],
+            }
+        raise ValueError(method)
+
+    def mine(self, *hashes):
+        self.head += 1
+        self.blocks[self.head] = list(hashes)
+        self.mined.update(hashes)
+
+    async def test_one_block_request_for_all_transactions(self):
+        futures = [self.waiter.watch(txn_hash) for txn_hash in (TXN_A, TXN_B, TXN_C)]
+        await asyncio.sleep(0.02)
+        self.mine(TXN_A, TXN_B)
+
+        receipts = await asyncio.wait_for(asyncio.gather(*futures[:2]), 1)
+        self.assertEqual(
+            [receipt["transactionHash"] for receipt in receipts],
+            [HexBytes(TXN_A), HexBytes(TXN_B)],
+        )
+        self.assertEqual(receipts[0]["status"], 1)
+        self.assertFalse(futures[2].done())
+        self.assertEqual(self.requests.count("eth_getBlockByNumber"), 1)
+        self.assertEqual(self.waiter.waiting, 1)
+        self.waiter.forget(TXN_C)
+
+    async def test_already_mined_transaction(self):
+        self.mined.add(TXN_A)
+        receipt = await self.waiter.wait(TXN_A, 1)
+        self.assertEqual(receipt["transactionHash"], HexBytes(TXN_A))
+        self.assertNotIn("eth_getBlockByNumber", self.requests)
+
+    async def test_pending_receipt_is_ignored(self):
+        self.mined.add(TXN_A)
+        pending = {"blockHash": None, "transactionHash": TXN_A}
+        self.w3.manager.coro_request.side_effect = None
+        self.w3.manager.coro_request.return_value = pending
+        future = self.waiter.watch(TXN_A)
+        await asyncio.sleep(0.03)
+        self.assertFalse(future.done())
+        self.waiter.forget(TXN_A)
+
+    async def test_wait_times_out(self):
+        with self.assertRaises(TimeExhausted):
+            await self.waiter.wait(TXN_A, 0.02)
+        self.assertEqual(self.waiter.waiting, 0)
+
+        # The task stops once nothing is waited for.
+        await asyncio.sleep(0.03)
+        self.assertIsNone(self.waiter._task)
+
+    async def test_failed_poll_checks_again(self):
+        calls = []
+
+        async def flaky(method, params):
+            calls.append(method)
+            if len(calls) == 1:
+                raise ConnectionError("node down")
+            return await self.request(method, params)
+
+        self.w3.manager.coro_request.side_effect = flaky
+        self.mined.add(TXN_A)
+        receipt = await self.waiter.wait(TXN_A, 1)
+        self.assertEqual(receipt["transactionHash"], HexBytes(TXN_A))
+
+    async def test_get_receipt_waiter_is_shared_in_loop(self):
+        waiter = get_receipt_waiter(self.w3)
+        self.assertIs(get_receipt_waiter(self.w3), waiter)
+        self.assertIsNot(get_receipt_waiter(MagicMock()), waiter)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,94 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from hmt_escrow import crypto
+from hmt_escrow.aio.providers import close_sessions
+from hmt_escrow.aio.storage import download, upload
+from hmt_escrow.storage import StorageClientError, StorageFileNotFoundError
+
+PUB_KEY = b"2dbc2c2c86052702e7c219339514b2e8bd4687ba1236c478ad41b43330b08488c12c8c1797aa181f3a4596a1bd8a0c18344ea44d6655f61fa73e56e743f79e0d"
+PRIV_KEY = b"28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+
+
+class AsyncStorageTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs the storage coroutines against a local server standing in for S3."""
+
+    async def asyncSetUp(self):
+        self.objects = {}
+        self.requests = []
+
+        async def handle(request):
+            self.requests.append((request.method, request.path))
+            if request.path == "/forbidden":
+                raise web.HTTPForbidden()
+            if request.method == "PUT":
+                self.objects[request.path] = await request.read()
+                return web.Response()
+            if request.path not in self.objects:
+                raise web.HTTPNotFound()
+            return web.Response(body=self.objects[request.path])
+
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        def presign(method, bucket, key, use_public_bucket=False):
+            return str(self.server.make_url(f"/{bucket}/{key}"))
+
+        patcher = patch("hmt_escrow.aio.storage._presign", side_effect=presign)
+        self.presign = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await close_sessions()
+        await self.server.close()
+
+    async def test_upload_encrypted(self):
+        msg = {"answer": 1}
+        hash_, key = await upload(msg, PUB_KEY)
+        self.assertEqual(key, f"s3{hash_}")
+        self.assertEqual(self.presign.call_args[0][0], "put_object")
+
+        (body,) = self.objects.values()
+        self.assertTrue(crypto.is_encrypted(body))
+        self.assertEqual(json.loads(crypto.decrypt(PRIV_KEY, body)), msg)
+
+        self.assertEqual(await download(key, PRIV_KEY), msg)
+        self.assertEqual([method for method, _ in self.requests], ["PUT", "GET"])
+
+    async def test_upload_plain_to_public_bucket(self):
+        msg = {"answer": 2}
+        hash_, key = await upload(
+            msg, PUB_KEY, encrypt_data=False, use_public_bucket=True
+        )
+        self.assertEqual(self.presign.call_args[0][3], True)
+        (body,) = self.objects.values()
+        self.assertEqual(json.loads(body), msg)
+        self.assertEqual(await download(key, PRIV_KEY, public=True), msg)
+
+    async def test_download_url(self):
+        self.objects["/public/results"] = json.dumps({"answer": 3}).encode()
+        url = str(self.server.make_url("/public/results"))
+        self.assertEqual(await download(url, PRIV_KEY), {"answer": 3})
+        self.presign.assert_not_called()
+
+    async def test_download_missing_key(self):
+        with self.assertRaises(StorageFileNotFoundError):
+            await download("s3missing", PRIV_KEY)
+
+    async def test_download_client_error(self):
+        with patch(
+            "hmt_escrow.aio.storage._presign",
+            return_value=str(self.server.make_url("/forbidden")),
+        ):
+            with self.assertRaises(StorageClientError):
+                await download("s3forbidden", PRIV_KEY)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
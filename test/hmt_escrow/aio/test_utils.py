@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from hmt_escrow.aio.utils import bounded_gather, get_hmt_balance
+
+GAS_PAYER = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+HMTOKEN = "0x56B532F1B30aA3e51e4C6f45E0Ca4A8C9F6A1D4C"
+
+
+class BoundedGatherTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_limits_concurrency(self):
+        running = []
+        most = []
+
+        async def work(i):
+            running.append(i)
+            most.append(len(running))
+            await asyncio.sleep(0.001 * (5 - i))
+            running.remove(i)
+            return i
+
+        self.assertEqual(
+            await bounded_gather([work(i) for i in range(5)], limit=2), list(range(5))
+        )
+        self.assertEqual(max(most), 2)
+
+    async def test_raises_first_error(self):
+        async def fail():
+            raise ValueError("boom")
+
+        async def value():
+            return 1
+
+        with self.assertRaises(ValueError):
+            await bounded_gather([value(), fail()])
+
+    async def test_return_exceptions(self):
+        async def fail():
+            raise ValueError("boom")
+
+        async def value():
+            return 1
+
+        results = await bounded_gather([value(), fail()], return_exceptions=True)
+        self.assertEqual(results[0], 1)
+        self.assertIsInstance(results[1], ValueError)
+
+    async def test_accepts_generators(self):
+        async def double(x):
+            return x * 2
+
+        self.assertEqual(
+            await bounded_gather((double(x) for x in range(3)), limit=1), [0, 2, 4]
+        )
+
+
+class GetHmtBalanceTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_calls_balance_of(self):
+        with patch(
+            "hmt_escrow.aio.utils.call", AsyncMock(return_value=10**18)
+        ) as call, patch("hmt_escrow.aio.utils.get_hmtoken") as get_hmtoken:
+            balance = await get_hmt_balance(GAS_PAYER, HMTOKEN, "http://node")
+
+        self.assertEqual(balance, 10**18)
+        get_hmtoken.assert_called_once_with(HMTOKEN, "http://node")
+        get_hmtoken.return_value.functions.balanceOf.assert_called_once_with(GAS_PAYER)
+        self.assertEqual(call.call_args[1]["hmt_server_addr"], "http://node")
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
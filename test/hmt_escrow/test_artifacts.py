@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from hmt_escrow import artifacts
+
+COMPILED = {
+    "Escrow": {
+        "contractName": "Escrow",
+        "sourcePath": "Escrow.sol",
+        "compiler": "0.6.2",
+        "abi": [{"name": "status", "type": "function"}],
+        "bin": "6080",
+    },
+    "EscrowFactory": {
+        "contractName": "EscrowFactory",
+        "sourcePath": "EscrowFactory.sol",
+        "compiler": "0.6.2",
+        "abi": [],
+        "bin": "6081",
+    },
+}
+
+
+class ArtifactsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.artifacts_folder = self.tmp_dir.name
+        artifacts.clear_cache()
+
+    def tearDown(self):
+        artifacts.clear_cache()
+        self.tmp_dir.cleanup()
+
+    def compiled(self, *args, **kwargs):
+        return {name: dict(interface) for name, interface in COMPILED.items()}
+
+    def test_source_hash(self):
+        hash_ = artifacts.source_hash()
+        self.assertEqual(len(hash_), 64)
+        self.assertEqual(hash_, artifacts.source_hash())
+        self.assertIsNone(artifacts.source_hash(self.artifacts_folder))
+
+    def test_build_artifacts(self):
+        with patch("hmt_escrow.artifacts.compile_contracts") as compile_mock:
+            compile_mock.side_effect = self.compiled
+            artifacts.build_artifacts(self.artifacts_folder)
+
+        with open(os.path.join(self.artifacts_folder, "Escrow.json")) as f:
+            artifact = json.load(f)
+
+        self.assertEqual(artifact["abi"], COMPILED["Escrow"]["abi"])
+        self.assertEqual(artifact["bin"], "6080")
+        self.assertEqual(artifact["version"], artifacts.ARTIFACTS_VERSION)
+        self.assertEqual(artifact["sourceHash"], artifacts.source_hash())
+
+    def test_load_compiles_missing_artifacts_once(self):
+        with patch("hmt_escrow.artifacts.compile_contracts") as compile_mock:
+            compile_mock.side_effect = self.compiled
+            interface = artifacts.load_contract_interface(
+                "Escrow", self.artifacts_folder
+            )
+            self.assertEqual(interface["bin"], "6080")
+            artifacts.load_contract_interface("EscrowFactory", self.artifacts_folder)
+            self.assertEqual(compile_mock.call_count, 1)
+
+            # A fresh process reads the written artifacts without compiling.
+            artifacts.clear_cache()
+            interface = artifacts.load_contract_interface(
+                "Escrow", self.artifacts_folder
+            )
+            self.assertEqual(interface["bin"], "6080")
+            self.assertEqual(compile_mock.call_count, 1)
+
+    def test_load_recompiles_stale_artifacts(self):
+        with patch("hmt_escrow.artifacts.compile_contracts") as compile_mock:
+            compile_mock.side_effect = self.compiled
+            artifacts.build_artifacts(self.artifacts_folder)
+            artifacts.clear_cache()
+
+            with patch("hmt_escrow.artifacts.source_hash", return_value="changed"):
+                artifacts.load_contract_interface("Escrow", self.artifacts_folder)
+
+            self.assertEqual(compile_mock.call_count, 2)
+
+    def test_load_unknown_contract(self):
+        with patch("hmt_escrow.artifacts.compile_contracts") as compile_mock:
+            compile_mock.side_effect = self.compiled
+            with self.assertRaises(KeyError):
+                artifacts.load_contract_interface("Unknown", self.artifacts_folder)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
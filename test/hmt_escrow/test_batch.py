@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from hmt_escrow.batch import JobBatch, launch_many
+
+CREDENTIALS = {
+    "gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+    "gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5",
+}
+PUB_KEY = b"pub"
+FACTORY = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+
+class FakeJob(object):
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+    factory_addrs = []
+
+    def __init__(self, credentials, manifest, factory_addr=None, **kwargs):
+        if manifest == "invalid":
+            raise ValueError("invalid manifest")
+        self.manifest = manifest
+        self.factory_contract = MagicMock(address=factory_addr or FACTORY)
+        FakeJob.factory_addrs.append(factory_addr)
+
+    def launch(self, pub_key):
+        with FakeJob.lock:
+            FakeJob.running += 1
+            FakeJob.max_running = max(FakeJob.max_running, FakeJob.running)
+        time.sleep(0.01)
+        with FakeJob.lock:
+            FakeJob.running -= 1
+        return self.manifest != "unlaunchable"
+
+    def setup(self, sender=None):
+        return self.manifest != "unfunded"
+
+
+class JobBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        FakeJob.running = FakeJob.max_running = 0
+        FakeJob.factory_addrs = []
+        patcher = patch("hmt_escrow.batch.Job", FakeJob)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_in_order(self):
+        manifests = ["a", "invalid", "unlaunchable", "unfunded", "b"]
+        results = launch_many(manifests, CREDENTIALS, PUB_KEY, concurrency=2)
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual(
+            [result.succeeded for result in results], [True, False, False, False, True]
+        )
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertIsNone(results[1].job)
+        self.assertEqual((results[2].launched, results[2].setup), (False, False))
+        self.assertEqual((results[3].launched, results[3].setup), (True, False))
+        self.assertEqual(results[4].job.manifest, "b")
+
+    def test_first_job_deploys_shared_factory(self):
+        launch_many(["invalid", "a", "b", "c"], CREDENTIALS, PUB_KEY)
+        self.assertEqual(FakeJob.factory_addrs, [None, FACTORY, FACTORY])
+
+    def test_bounded_concurrency(self):
+        batch = JobBatch(CREDENTIALS, PUB_KEY, factory_addr=FACTORY, concurrency=3)
+        results = batch.launch([str(i) for i in range(12)])
+        self.assertTrue(all(result.succeeded for result in results))
+        self.assertGreater(FakeJob.max_running, 1)
+        self.assertLessEqual(FakeJob.max_running, 3)
+
+    def test_without_setup(self):
+        results = launch_many(["unfunded"], CREDENTIALS, PUB_KEY, setup=False)
+        self.assertTrue(results[0].succeeded)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
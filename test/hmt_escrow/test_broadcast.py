@@ -0,0 +1,71 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from hmt_escrow.broadcast import Broadcaster, send_raw_transaction
+
+RAW_TXN = b"\xf8\x6b\x01"
+TXN_HASH = HexBytes(Web3.keccak(RAW_TXN))
+
+
+class BroadcasterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.w3 = MagicMock()
+        self.nodes = {"http://a": MagicMock(), "http://b": MagicMock()}
+        patcher = patch("hmt_escrow.broadcast.get_web3", side_effect=self.nodes.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.broadcaster = Broadcaster(list(self.nodes), timeout=1)
+        self.addCleanup(self.broadcaster.shutdown)
+
+    def test_sends_to_every_endpoint(self):
+        for w3 in [self.w3, *self.nodes.values()]:
+            w3.eth.sendRawTransaction.return_value = TXN_HASH
+        self.assertEqual(
+            self.broadcaster.send_raw_transaction(self.w3, RAW_TXN), TXN_HASH
+        )
+        self.broadcaster._executor.shutdown(wait=True)
+        for w3 in [self.w3, *self.nodes.values()]:
+            w3.eth.sendRawTransaction.assert_called_once_with(RAW_TXN)
+
+    def test_first_accept_wins(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.w3.eth.sendRawTransaction.side_effect = lambda raw: release.wait(5)
+        self.nodes["http://a"].eth.sendRawTransaction.side_effect = ValueError(
+            "connection refused"
+        )
+        self.nodes["http://b"].eth.sendRawTransaction.return_value = TXN_HASH
+        self.assertEqual(
+            self.broadcaster.send_raw_transaction(self.w3, RAW_TXN), TXN_HASH
+        )
+        self.assertFalse(release.is_set())
+
+    def test_already_known_is_accepted(self):
+        error = ValueError({"code": -32000, "message": "already known"})
+        for w3 in [self.w3, *self.nodes.values()]:
+            w3.eth.sendRawTransaction.side_effect = error
+        self.assertEqual(
+            self.broadcaster.send_raw_transaction(self.w3, RAW_TXN), TXN_HASH
+        )
+
+    def test_raises_main_endpoint_error(self):
+        self.w3.eth.sendRawTransaction.side_effect = ValueError("nonce too low")
+        for w3 in self.nodes.values():
+            w3.eth.sendRawTransaction.side_effect = ConnectionError()
+        with self.assertRaisesRegex(ValueError, "nonce too low"):
+            self.broadcaster.send_raw_transaction(self.w3, RAW_TXN)
+
+    def test_send_without_broadcaster(self):
+        self.w3.eth.sendRawTransaction.return_value = TXN_HASH
+        with patch("hmt_escrow.broadcast.BROADCAST_ENDPOINTS", ""):
+            self.assertEqual(send_raw_transaction(self.w3, RAW_TXN), TXN_HASH)
+        for w3 in self.nodes.values():
+            w3.eth.sendRawTransaction.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,55 @@
+import unittest
+
+from hmt_escrow.cache import CacheInfo, LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def test_get_set(self):
+        cache = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.info(), CacheInfo(1, 1, 2, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_get_or_set(self):
+        cache = LRUCache()
+        calls = []
+        factory = lambda: calls.append(1) or len(calls)
+        self.assertEqual(cache.get_or_set("a", factory), 1)
+        self.assertEqual(cache.get_or_set("a", factory), 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_pop_and_clear(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.pop("a"))
+        cache.set("b", 2)
+        cache.get("b")
+        cache.clear()
+        self.assertEqual(cache.info(), CacheInfo(0, 0, 128, 0))
+
+    def test_ttl(self):
+        now = [0.0]
+        cache = LRUCache(ttl=10, timer=lambda: now[0])
+        cache.set("a", 1)
+        now[0] = 9.9
+        self.assertEqual(cache.get("a"), 1)
+        now[0] = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertNotIn("a", cache)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from hmt_escrow.credentials import (
+    CredentialPool,
+    clear_credential_pools,
+    get_credential_pool,
+)
+from hmt_escrow.nonce import clear_nonce_managers, get_nonce_manager
+
+A = ("0x1413862C2B7054CDbfdc181B83962CB0FC11fD92", "a")
+B = ("0x61F9F0B31eacB420553da8BCC59DC617279731Ac", "b")
+C = ("0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809", "c")
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CredentialPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.w3 = MagicMock()
+        self.balances = {A[0]: 10**18, B[0]: 10**18, C[0]: 10**18}
+        self.w3.eth.get_balance.side_effect = lambda address: self.balances[address]
+        patcher = patch("hmt_escrow.credentials.get_w3", return_value=self.w3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(clear_nonce_managers)
+        self.clock = Clock()
+        self.pool = CredentialPool(
+            max_failures=2, cooldown=10, max_cooldown=25, timer=self.clock
+        )
+
+    def test_keeps_order_of_healthy_accounts(self):
+        self.assertEqual(self.pool.ranked([A, B, C]), [A, B, C])
+
+    def test_failing_account_cools_down(self):
+        self.pool.record_failure(A[0])
+        self.assertEqual(self.pool.ranked([A, B, C]), [B, C, A])
+        self.pool.record_failure(A[0])
+        self.assertTrue(self.pool.health(A[0]).cooling_down(self.clock.now))
+
+        self.clock.now = 9
+        self.pool.record_success(B[0])
+        self.assertEqual(self.pool.ranked([A, B]), [B, A])
+        self.clock.now = 11
+        self.assertFalse(self.pool.health(A[0]).cooling_down(self.clock.now))
+
+    def test_cooldown_doubles_up_to_max(self):
+        for _ in range(2):
+            self.pool.record_failure(A[0])
+        self.assertEqual(self.pool.health(A[0]).cooldown_until, 10)
+        self.pool.record_failure(A[0])
+        self.assertEqual(self.pool.health(A[0]).cooldown_until, 20)
+        self.pool.record_failure(A[0])
+        self.assertEqual(self.pool.health(A[0]).cooldown_until, 25)
+
+        self.pool.record_success(A[0])
+        health = self.pool.health(A[0])
+        self.assertEqual((health.failures, health.cooldown_until), (0, 0))
+
+    def test_empty_accounts_come_last(self):
+        self.balances[A[0]] = 0
+        self.assertEqual(self.pool.ranked([A, B]), [B, A])
+
+    def test_balances_are_cached(self):
+        self.pool.ranked([A, B])
+        self.pool.ranked([A, B])
+        self.assertEqual(self.w3.eth.get_balance.call_count, 2)
+
+        self.pool.record_success(A[0])
+        self.pool.ranked([A, B])
+        self.assertEqual(self.w3.eth.get_balance.call_count, 3)
+
+    def test_unreadable_balance_is_not_penalised(self):
+        self.w3.eth.get_balance.side_effect = Exception("down")
+        self.assertEqual(self.pool.ranked([A, B]), [A, B])
+
+    def test_spreads_load(self):
+        nonces = get_nonce_manager(self.w3, B[0])
+        nonces.reserve(pending=0)
+        with self.pool.use(A[0]):
+            with self.pool.use(A[0]):
+                self.assertEqual(self.pool.ranked([A, B, C]), [C, B, A])
+        self.assertEqual(self.pool.load(A[0]), 0)
+        self.assertEqual(self.pool.load(B[0]), 1)
+
+    def test_shared_per_endpoint(self):
+        self.addCleanup(clear_credential_pools)
+        pool = get_credential_pool("http://localhost:8545")
+        self.assertIs(get_credential_pool("http://localhost:8545"), pool)
+        self.assertIsNot(get_credential_pool("http://localhost:8546"), pool)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
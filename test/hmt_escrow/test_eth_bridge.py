@@ -1,14 +1,30 @@
 import os
 import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import sleep
+from unittest.mock import MagicMock, patch
+from web3.exceptions import TimeExhausted, TransactionNotFound
 
 from hmt_escrow.eth_bridge import (
+    DATA_SAVED_TOPIC,
+    PubKeyResolver,
+    Retry,
+    clear_contract_cache,
+    contract_cache_info,
     get_hmtoken,
     get_factory,
     get_escrow,
+    gather_receipts,
     get_pub_key_from_addr,
     handle_transaction,
+    handle_transaction_with_retry,
     set_pub_key_at_addr,
+    submit_transaction,
+    wait_for_transaction,
 )
+from hmt_escrow.gas import GasEstimator
+from hmt_escrow.kvstore_abi import abi as kvstore_abi
+from hmt_escrow.nonce import clear_nonce_managers
 from test.hmt_escrow.utils import create_job
 
 
@@ -53,5 +69,365 @@ class EthBridgeTestCase(unittest.TestCase):
         )
 
 
+class ContractCacheTestCase(unittest.TestCase):
+    escrow_addr = "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809"
+    other_escrow_addr = "0x852023fbb19050B8291a335E5A83Ac9701E7B4E6"
+
+    def setUp(self):
+        clear_contract_cache()
+        patcher = patch(
+            "hmt_escrow.eth_bridge.load_contract_interface",
+            return_value={"abi": kvstore_abi},
+        )
+        self.load_interface = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_contract_handles_are_cached(self):
+        escrow = get_escrow(self.escrow_addr)
+        self.assertIs(get_escrow(self.escrow_addr), escrow)
+        self.assertEqual(escrow.address, self.escrow_addr)
+
+        info = contract_cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.currsize, 1)
+
+    def test_contract_classes_are_shared_across_addresses(self):
+        escrow = get_escrow(self.escrow_addr)
+        other_escrow = get_escrow(self.other_escrow_addr)
+        self.assertIsNot(escrow, other_escrow)
+        self.assertIs(type(escrow), type(other_escrow))
+        self.assertEqual(self.load_interface.call_count, 1)
+
+    def test_contract_handles_are_keyed_by_type_and_endpoint(self):
+        escrow = get_escrow(self.escrow_addr)
+        self.assertIsNot(get_factory(self.escrow_addr), escrow)
+        self.assertIsNot(
+            get_escrow(self.escrow_addr, hmt_server_addr="http://127.0.0.1:8545"),
+            escrow,
+        )
+        self.assertEqual(contract_cache_info().currsize, 3)
+
+    def test_contract_cache_is_bounded(self):
+        with patch("hmt_escrow.eth_bridge.CONTRACT_CACHE.maxsize", 1):
+            get_escrow(self.escrow_addr)
+            get_escrow(self.other_escrow_addr)
+            self.assertEqual(contract_cache_info().currsize, 1)
+
+
+def mined(receipt):
+    future = Future()
+    future.set_result(receipt)
+    return future
+
+
+def failed(error):
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+class HandleTransactionTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_nonce_managers()
+        self.w3 = MagicMock()
+        self.w3.eth.get_transaction_count.return_value = 3
+        self.w3.eth.sendRawTransaction.return_value = b"\x01" * 32
+        self.txn_func = MagicMock()
+        self.txn_info = {
+            "gas_payer": "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+            "gas_payer_priv": "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5",
+            "gas": 4712388,
+        }
+        patcher = patch("hmt_escrow.eth_bridge.get_w3", return_value=self.w3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("hmt_escrow.eth_bridge.get_receipt_waiter")
+        self.waiter = patcher.start().return_value
+        self.waiter.watch.side_effect = lambda txn_hash: mined({})
+        self.waiter.head = None
+        self.addCleanup(patcher.stop)
+        patcher = patch("hmt_escrow.eth_bridge.WEB3_BLOCK_POLL_INTERVAL", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("hmt_escrow.eth_bridge.get_keyring")
+        self.sign = (
+            patcher.start().return_value.key.return_value.account.sign_transaction
+        )
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        clear_nonce_managers()
+
+    def built_nonces(self):
+        return [
+            call.args[0]["nonce"]
+            for call in self.txn_func.return_value.buildTransaction.call_args_list
+        ]
+
+    def test_nonces_are_reserved_locally(self):
+        handle_transaction(self.txn_func, **self.txn_info)
+        handle_transaction(self.txn_func, **self.txn_info)
+        self.assertEqual(self.built_nonces(), [3, 3])
+
+        self.waiter.watch.side_effect = lambda txn_hash: failed(TimeExhausted())
+        with self.assertRaises(TimeExhausted):
+            handle_transaction(self.txn_func, **self.txn_info)
+        # Read again to resync after the timeout, and when giving up on it.
+        self.assertEqual(self.w3.eth.get_transaction_count.call_count, 5)
+
+    def test_dropped_transaction_nonce_is_reused(self):
+        self.waiter.watch.side_effect = lambda txn_hash: Future()
+        self.w3.eth.get_transaction.side_effect = TransactionNotFound("dropped")
+        dropped = submit_transaction(self.txn_func, **self.txn_info)
+        submit_transaction(self.txn_func, **self.txn_info)
+        with patch("hmt_escrow.eth_bridge.WEB3_TIMEOUT", 0.02):
+            with self.assertRaises(TimeExhausted):
+                wait_for_transaction(dropped)
+
+        submit_transaction(self.txn_func, **self.txn_info)
+        self.assertEqual(self.built_nonces(), [3, 4, 3])
+
+    def test_pending_transaction_nonce_is_kept(self):
+        self.waiter.watch.side_effect = lambda txn_hash: Future()
+        pending = submit_transaction(self.txn_func, **self.txn_info)
+        with patch("hmt_escrow.eth_bridge.WEB3_TIMEOUT", 0.02):
+            with self.assertRaises(TimeExhausted):
+                wait_for_transaction(pending)
+
+        submit_transaction(self.txn_func, **self.txn_info)
+        self.assertEqual(self.built_nonces(), [3, 4])
+
+    def test_nonce_released_when_signing_fails(self):
+        self.sign.side_effect = ValueError("bad key")
+        with self.assertRaises(ValueError):
+            handle_transaction(self.txn_func, **self.txn_info)
+
+        self.sign.side_effect = None
+        handle_transaction(self.txn_func, **self.txn_info)
+        self.assertEqual(self.built_nonces(), [3, 3])
+
+    def test_estimated_gas(self):
+        self.txn_func.return_value.estimateGas.return_value = 100000
+        with patch("hmt_escrow.eth_bridge.GAS_ESTIMATOR", GasEstimator(1.2)):
+            handle_transaction(self.txn_func, estimate_gas=True, **self.txn_info)
+        build = self.txn_func.return_value.buildTransaction
+        self.assertEqual(build.call_args[0][0]["gas"], 120000)
+
+    def test_out_of_estimated_gas_is_sent_with_gas_limit(self):
+        txn = self.txn_func.return_value
+        txn.fn_name = "setup"
+        txn.address = "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809"
+        txn.estimateGas.return_value = 100000
+        txn.buildTransaction.side_effect = lambda params: dict(params)
+        self.w3.eth.sendRawTransaction.side_effect = [b"\x01" * 32, b"\x02" * 32]
+        self.waiter.watch.side_effect = [
+            mined({"status": 0, "gasUsed": 120000}),
+            mined({"status": 1, "gasUsed": 150000}),
+        ]
+        estimator = GasEstimator(1.2)
+        with patch("hmt_escrow.eth_bridge.GAS_ESTIMATOR", estimator):
+            receipt = handle_transaction_with_retry(
+                self.txn_func, Retry(retries=0), estimate_gas=True, **self.txn_info
+            )
+
+        self.assertEqual(receipt["status"], 1)
+        gas = [call.args[0]["gas"] for call in txn.buildTransaction.call_args_list]
+        self.assertEqual(gas, [120000, self.txn_info["gas"]])
+        self.assertIsNone(estimator.cached(txn, ()))
+
+    def test_fee_strategy(self):
+        fee_strategy = MagicMock()
+        fee_strategy.fees.return_value = {"maxFeePerGas": 2, "maxPriorityFeePerGas": 1}
+        handle_transaction(self.txn_func, fee_strategy=fee_strategy, **self.txn_info)
+        build = self.txn_func.return_value.buildTransaction
+        self.assertEqual(build.call_args[0][0]["maxFeePerGas"], 2)
+        self.assertEqual(build.call_args[0][0]["maxPriorityFeePerGas"], 1)
+
+    def test_submit_transaction_pipelines_nonces(self):
+        futures = [Future() for _ in range(3)]
+        self.waiter.watch.side_effect = futures
+        handles = [submit_transaction(self.txn_func, **self.txn_info) for _ in range(3)]
+        self.assertEqual(self.built_nonces(), [3, 4, 5])
+        self.assertFalse(handles[0].done())
+
+        for future in futures:
+            future.set_result({"status": 1})
+        self.assertTrue(handles[0].done())
+        self.assertEqual(gather_receipts(handles), [{"status": 1}] * 3)
+        self.assertEqual(self.w3.eth.get_transaction_count.call_count, 1)
+
+    def test_gather_receipts_returns_exceptions(self):
+        self.w3.eth.sendRawTransaction.side_effect = [b"\x01" * 32, b"\x02" * 32]
+        self.waiter.watch.side_effect = [Future(), mined({"status": 1})]
+        handles = [submit_transaction(self.txn_func, **self.txn_info) for _ in range(2)]
+        receipts = gather_receipts(handles, timeout=0.01, return_exceptions=True)
+        self.assertIsInstance(receipts[0], TimeExhausted)
+        self.assertEqual(receipts[1], {"status": 1})
+        self.waiter.forget.assert_any_call(handles[0].txn_hash)
+
+    def test_stuck_transaction_is_replaced(self):
+        self.txn_func.return_value.buildTransaction.return_value = {
+            "gasPrice": 100,
+            "nonce": 3,
+        }
+        self.w3.eth.sendRawTransaction.side_effect = [b"\x01" * 32, b"\x02" * 32]
+        original, replacement = Future(), Future()
+        self.waiter.watch.side_effect = [original, replacement]
+        self.waiter.head = 10
+
+        handle = submit_transaction(self.txn_func, **self.txn_info)
+        with ThreadPoolExecutor(1) as executor:
+            result = executor.submit(handle.result, 5)
+            sleep(0.05)
+            self.assertEqual(self.w3.eth.sendRawTransaction.call_count, 1)
+
+            self.waiter.head = 13
+            while len(handle.hashes) < 2:
+                sleep(0.01)
+            replacement.set_result({"transactionHash": b"\x02" * 32, "status": 1})
+            self.assertEqual(result.result(5)["status"], 1)
+
+        signed = self.sign.call_args_list
+        self.assertEqual(signed[1].args[0], {"gasPrice": 113, "nonce": 3})
+        self.assertEqual(handle.txn_hash, b"\x02" * 32)
+        forgotten = [call.args[0] for call in self.waiter.forget.call_args_list]
+        self.assertIn(b"\x01" * 32, forgotten)
+
+    def test_retry_replaces_instead_of_resending(self):
+        self.txn_func.return_value.buildTransaction.return_value = {
+            "maxFeePerGas": 200,
+            "maxPriorityFeePerGas": 10,
+            "nonce": 3,
+        }
+        self.w3.eth.sendRawTransaction.side_effect = [b"\x01" * 32, b"\x02" * 32]
+        self.waiter.watch.side_effect = [Future(), mined({"status": 1})]
+
+        with patch("hmt_escrow.eth_bridge.WEB3_TIMEOUT", 0.05):
+            receipt = handle_transaction_with_retry(
+                self.txn_func, Retry(retries=1, delay=0), **self.txn_info
+            )
+        self.assertEqual(receipt, {"status": 1})
+        self.txn_func.return_value.buildTransaction.assert_called_once()
+        signed = self.sign.call_args_list
+        self.assertEqual(signed[1].args[0]["maxFeePerGas"], 225)
+        self.assertEqual(signed[1].args[0]["maxPriorityFeePerGas"], 12)
+
+    def test_fee_bumps_are_capped(self):
+        self.txn_func.return_value.buildTransaction.return_value = {
+            "gasPrice": 100,
+            "nonce": 3,
+        }
+        self.w3.eth.sendRawTransaction.side_effect = [b"\x01" * 32, b"\x02" * 32]
+        self.waiter.watch.side_effect = lambda txn_hash: Future()
+
+        handle = submit_transaction(self.txn_func, **self.txn_info)
+        with patch("hmt_escrow.eth_bridge.MAX_FEE_BUMPS", 1):
+            self.assertEqual(handle.speed_up(), b"\x02" * 32)
+            self.assertEqual(handle.speed_up(), b"\x02" * 32)
+        self.assertEqual(self.w3.eth.sendRawTransaction.call_count, 2)
+        self.assertFalse(handle._stuck())
+
+    def test_fees_above_max_fee_per_gas_are_not_sent(self):
+        self.txn_func.return_value.buildTransaction.return_value = {
+            "maxFeePerGas": 200,
+            "maxPriorityFeePerGas": 10,
+            "nonce": 3,
+        }
+        self.waiter.watch.side_effect = lambda txn_hash: Future()
+
+        handle = submit_transaction(self.txn_func, **self.txn_info)
+        with patch("hmt_escrow.eth_bridge.MAX_FEE_PER_GAS", 220):
+            self.assertEqual(handle.speed_up(), handle.txn_hash)
+        self.assertEqual(handle.hashes, [handle.txn_hash])
+        self.sign.assert_called_once()
+
+
+class PubKeyResolverTestCase(unittest.TestCase):
+    gas_payer = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+    addresses = [
+        "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809",
+        "0x852023fbb19050B8291a335E5A83Ac9701E7B4E6",
+    ]
+
+    def setUp(self):
+        clear_contract_cache()
+        self.addCleanup(clear_contract_cache)
+        self.w3 = MagicMock()
+        patcher = patch("hmt_escrow.eth_bridge.get_w3", return_value=self.w3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("hmt_escrow.eth_bridge.get_log_watcher")
+        self.get_log_watcher = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pub_keys = {address: f"key-{address[-4:]}" for address in self.addresses}
+        patcher = patch("hmt_escrow.eth_bridge.batch_call")
+        self.batch_call = patcher.start()
+        self.batch_call.side_effect = lambda w3, functions, gas_payer, gas: [
+            self.pub_keys[function.args[0]] for function in functions
+        ]
+        self.addCleanup(patcher.stop)
+
+        self.kvstore = MagicMock()
+        self.kvstore.functions.get.side_effect = lambda address, key: MagicMock(
+            args=(address, key)
+        )
+        patcher = patch("hmt_escrow.eth_bridge.get_contract", return_value=self.kvstore)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.resolver = PubKeyResolver(ttl=60)
+
+    def test_lookups_are_batched_and_cached(self):
+        addresses = [self.addresses[0], self.addresses[1].lower(), self.addresses[0]]
+        self.assertEqual(
+            self.resolver.get_many(addresses, self.gas_payer),
+            [b"key-5809", b"key-B4E6", b"key-5809"],
+        )
+        self.batch_call.assert_called_once()
+        self.assertEqual(len(self.batch_call.call_args[0][1]), 2)
+
+        self.assertEqual(
+            self.resolver.get(self.addresses[1], self.gas_payer), b"key-B4E6"
+        )
+        self.batch_call.assert_called_once()
+
+    def test_data_saved_events_invalidate_keys(self):
+        self.resolver.get_many(self.addresses, self.gas_payer)
+        watcher = self.get_log_watcher.return_value
+        address, callback, topics = watcher.subscribe.call_args[0]
+        self.assertEqual(topics, [DATA_SAVED_TOPIC])
+        self.pub_keys[self.addresses[1]] = "new-key"
+
+        callback(
+            {
+                "topics": [
+                    DATA_SAVED_TOPIC,
+                    bytes(12) + bytes.fromhex(self.addresses[1][2:]),
+                ]
+            }
+        )
+        self.assertEqual(
+            self.resolver.get_many(self.addresses, self.gas_payer),
+            [b"key-5809", b"new-key"],
+        )
+        self.assertEqual(len(self.batch_call.call_args[0][1]), 1)
+        watcher.subscribe.assert_called_once()
+
+    def test_new_watcher_is_followed(self):
+        """Tests the keys are read again after the log watcher was dropped"""
+        self.resolver.get_many(self.addresses, self.gas_payer)
+        old_watcher = self.get_log_watcher.return_value
+        self.get_log_watcher.return_value = MagicMock()
+
+        self.resolver.get_many(self.addresses, self.gas_payer)
+        self.assertEqual(self.batch_call.call_count, 2)
+        old_watcher.unsubscribe.assert_called_once_with(
+            old_watcher.subscribe.return_value
+        )
+        self.get_log_watcher.return_value.subscribe.assert_called_once()
+
+
 if __name__ == "__main__":
     unittest.main(exit=True)
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from hmt_escrow.fees import FeeHistoryOracle
+
+GWEI = 10**9
+
+
+class FeeHistoryOracleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.oracle = FeeHistoryOracle(percentile=60, blocks=4, ttl=60)
+        self.w3 = MagicMock()
+        self.w3.eth.fee_history.return_value = {
+            "baseFeePerGas": [30 * GWEI, 32 * GWEI, 35 * GWEI, 36 * GWEI, 40 * GWEI],
+            "reward": [[1 * GWEI], [0], [3 * GWEI], [2 * GWEI]],
+        }
+
+    def test_fees_from_history(self):
+        self.assertEqual(
+            self.oracle.fees(self.w3),
+            {"maxFeePerGas": 82 * GWEI, "maxPriorityFeePerGas": 2 * GWEI},
+        )
+        self.w3.eth.fee_history.assert_called_once_with(4, "latest", [60])
+
+    def test_fee_history_is_cached(self):
+        self.oracle.fees(self.w3)
+        self.oracle.fees(self.w3)
+        self.assertEqual(self.w3.eth.fee_history.call_count, 1)
+
+        self.oracle.clear()
+        self.oracle.fees(self.w3)
+        self.assertEqual(self.w3.eth.fee_history.call_count, 2)
+
+    def test_min_priority_fee(self):
+        self.w3.eth.fee_history.return_value["reward"] = [[0], [0], [0], [0]]
+        oracle = FeeHistoryOracle(min_priority_fee=GWEI)
+        self.assertEqual(oracle.fees(self.w3)["maxPriorityFeePerGas"], GWEI)
+
+    def test_no_fees_without_eip1559(self):
+        self.w3.eth.fee_history.side_effect = ValueError("method not found")
+        self.assertEqual(self.oracle.fees(self.w3), {})
+
+        w3 = MagicMock()
+        w3.eth.fee_history.return_value = {"baseFeePerGas": [0, 0], "reward": [[0]]}
+        self.assertEqual(self.oracle.fees(w3), {})
+
+    def test_fees_async(self):
+        self.w3.manager.coro_request = AsyncMock(
+            return_value={
+                "baseFeePerGas": [hex(40 * GWEI), hex(50 * GWEI)],
+                "reward": [[hex(GWEI)]],
+            }
+        )
+        fees = asyncio.run(self.oracle.fees_async(self.w3))
+        self.assertEqual(
+            fees, {"maxFeePerGas": 101 * GWEI, "maxPriorityFeePerGas": GWEI}
+        )
+        self.w3.manager.coro_request.assert_called_once_with(
+            "eth_feeHistory", ["0x4", "latest", [60]]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
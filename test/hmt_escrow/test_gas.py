@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import MagicMock
+
+from hmt_escrow.gas import GasEstimator, GasLimitExceeded
+
+RECIPIENT = "0x852023fbb19050B8291a335E5A83Ac9701E7B4E6"
+ESCROW = "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809"
+
+
+def bulk_payout(recipients, address=ESCROW):
+    txn = MagicMock()
+    txn.fn_name = "bulkPayOut"
+    txn.address = address
+    txn.estimateGas.return_value = 50000 + 25000 * recipients
+    args = ([RECIPIENT] * recipients, [1] * recipients, "url", "hash", 1)
+    return txn, args
+
+
+class GasEstimatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.estimator = GasEstimator(multiplier=1.5, uncached=())
+
+    def test_estimate_applies_multiplier(self):
+        txn, args = bulk_payout(2)
+        self.assertEqual(self.estimator.estimate(txn, args, RECIPIENT, None), 150000)
+        txn.estimateGas.assert_called_once_with({"from": RECIPIENT})
+
+    def test_estimates_are_cached_per_size_bucket(self):
+        txn, args = bulk_payout(4)
+        self.estimator.estimate(txn, args, RECIPIENT, None)
+
+        # 5 to 7 recipients share the bucket of 4, the estimate scales with them.
+        txn, args = bulk_payout(6)
+        self.assertEqual(self.estimator.estimate(txn, args, RECIPIENT, None), 337500)
+        txn.estimateGas.assert_not_called()
+
+        txn, args = bulk_payout(8)
+        self.estimator.estimate(txn, args, RECIPIENT, None)
+        txn.estimateGas.assert_called_once()
+        self.assertEqual(self.estimator.info().hits, 1)
+
+    def test_functions_are_cached_separately(self):
+        txn, args = bulk_payout(1)
+        self.estimator.estimate(txn, args, RECIPIENT, None)
+        txn.fn_name = "complete"
+        self.estimator.estimate(txn, (), RECIPIENT, None)
+        self.assertEqual(txn.estimateGas.call_count, 2)
+
+    def test_contracts_are_cached_separately(self):
+        txn, args = bulk_payout(1)
+        self.estimator.estimate(txn, args, RECIPIENT, None)
+        txn, args = bulk_payout(1, address=RECIPIENT)
+        self.estimator.estimate(txn, args, RECIPIENT, None)
+        txn.estimateGas.assert_called_once()
+
+    def test_uncached_functions(self):
+        estimator = GasEstimator(multiplier=1.5)
+        for _ in range(2):
+            txn, args = bulk_payout(2)
+            self.assertEqual(estimator.estimate(txn, args, RECIPIENT, None), 150000)
+            txn.estimateGas.assert_called_once()
+        self.assertEqual(estimator.info().currsize, 0)
+
+    def test_forget(self):
+        txn, args = bulk_payout(2)
+        self.estimator.estimate(txn, args, RECIPIENT, None)
+        self.estimator.forget(txn, args)
+        self.assertIsNone(self.estimator.cached(txn, args))
+
+    def test_ran_out(self):
+        self.assertTrue(self.estimator.ran_out({"status": 0, "gasUsed": 100}, 100))
+        self.assertFalse(self.estimator.ran_out({"status": 1, "gasUsed": 100}, 100))
+        self.assertFalse(self.estimator.ran_out({"status": 0, "gasUsed": 99}, 100))
+
+    def test_gas_limit(self):
+        txn, args = bulk_payout(99)
+        with self.assertRaises(GasLimitExceeded):
+            self.estimator.estimate(txn, args, RECIPIENT, 1000000)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import unittest
+from typing import Dict, Tuple
+
+HEAVY_MODULES = ("boto3", "botocore", "web3", "solcx", "basemodels", "cryptography")
+
+# Cumulative import time budgets in milliseconds, scaled for slow machines by
+# IMPORT_TIME_BUDGET_SCALE.
+IMPORT_TIME_BUDGETS = {
+    "hmt_escrow.crypto": 100,
+    "hmt_escrow.storage": 250,
+    "hmt_escrow.job": 3000,
+}
+IMPORT_TIME_BUDGET_SCALE = float(os.getenv("IMPORT_TIME_BUDGET_SCALE", 1))
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Imports a module in a fresh interpreter with ``-X importtime``.
+
+    Returns:
+        Dict[str, Tuple[int, int]]: the self and cumulative import times in
+        microseconds of every imported module.
+
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    def assert_not_imported(self, times, modules):
+        imported = {name.split(".")[0] for name in times}
+        self.assertFalse(imported & set(modules), sorted(imported & set(modules)))
+
+    def assert_within_budget(self, module, times):
+        budget_ms = IMPORT_TIME_BUDGETS[module] * IMPORT_TIME_BUDGET_SCALE
+        cumulative_ms = times[module][1] / 1000
+        self.assertLess(
+            cumulative_ms,
+            budget_ms,
+            f"importing {module} took {cumulative_ms:.0f}ms, over {budget_ms:.0f}ms",
+        )
+
+    def test_crypto(self):
+        times = import_times("hmt_escrow.crypto")
+        self.assert_not_imported(times, HEAVY_MODULES + ("eth_keys",))
+        self.assert_within_budget("hmt_escrow.crypto", times)
+
+    def test_storage(self):
+        times = import_times("hmt_escrow.storage")
+        self.assert_not_imported(times, HEAVY_MODULES + ("eth_keys",))
+        self.assert_within_budget("hmt_escrow.storage", times)
+
+    def test_job(self):
+        times = import_times("hmt_escrow.job")
+        self.assert_not_imported(times, ("boto3", "botocore", "solcx", "basemodels"))
+        self.assert_within_budget("hmt_escrow.job", times)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
+import json
+import threading
+import time
 import unittest
 from decimal import Decimal
 from unittest.mock import MagicMock, patch, call
 
+from web3.exceptions import TimeExhausted
+
 from hmt_escrow import utils
+from hmt_escrow.credentials import CredentialPool
 from hmt_escrow.eth_bridge import (
     deploy_factory,
     get_w3,
     Retry,
 )
 from hmt_escrow.job import (
+    _STATUS_WAITERS,
+    _after_fork,
+    _upload_executor,
     Job,
     status,
     Status,
@@ -38,6 +47,37 @@ class JobTestCase(unittest.TestCase):
         next_status = status(self.job.job_contract, self.job.gas_payer)
         self.assertEqual(next_status, Status.Launched)
 
+    def test_launch_uploads_manifest_during_escrow_creation(self):
+        """Tests the manifest upload overlaps the escrow creation"""
+        upload_started = threading.Event()
+
+        def slow_upload(msg, public_key):
+            upload_started.set()
+            time.sleep(0.5)
+            return "hash", "url"
+
+        create_escrow = self.job._create_escrow
+
+        def wait_for_upload(trusted_handlers):
+            self.assertTrue(upload_started.wait(5))
+            return create_escrow(trusted_handlers)
+
+        with patch("hmt_escrow.job.upload", side_effect=slow_upload), patch.object(
+            self.job, "_create_escrow", side_effect=wait_for_upload
+        ):
+            self.assertTrue(self.job.launch(self.rep_oracle_pub_key))
+
+        self.assertEqual(
+            (self.job.manifest_hash, self.job.manifest_url), ("hash", "url")
+        )
+        timings = self.job.launch_timings
+        self.assertGreaterEqual(timings["upload"], 0.5)
+        self.assertLess(timings["upload_wait"], timings["upload"])
+        self.assertLess(
+            timings["total"],
+            timings["create_escrow"] + timings["upload"] + timings["verify"],
+        )
+
     def test_status(self):
         lauched = self.job.launch(self.rep_oracle_pub_key)
         self.assertEqual(lauched, True)
@@ -465,6 +505,69 @@ class JobTestCase(unittest.TestCase):
         self.assertTrue(self.job.launch(self.rep_oracle_pub_key))
         self.assertEqual(self.job.status(), Status(1))
 
+    def test_wait_for_status(self):
+        self.assertTrue(self.job.launch(self.rep_oracle_pub_key))
+        self.assertFalse(self.job.wait_for_status(Status.Pending, timeout=0))
+        self.assertTrue(self.job.setup())
+        self.assertTrue(self.job.wait_for_status(Status.Pending, timeout=0))
+        self.assertTrue(self.job.wait_for_status(Status.Launched, timeout=0))
+
+        payouts = [("0x852023fbb19050B8291a335E5A83Ac9701E7B4E6", Decimal("100.0"))]
+        payout = threading.Thread(
+            target=self.job.bulk_payout, args=(payouts, {}, self.rep_oracle_pub_key)
+        )
+        payout.start()
+        self.assertTrue(self.job.wait_for_status(Status.Paid, timeout=30))
+        payout.join()
+        self.assertFalse(self.job.wait_for_status(Status.Cancelled, timeout=0))
+
+    def test_complete_blocking(self):
+        self.assertTrue(self.job.launch(self.rep_oracle_pub_key))
+        self.assertTrue(self.job.setup())
+        self.assertFalse(self.job.complete(blocking=True, timeout=0.5))
+        self.assertEqual(self.job.status(), Status.Pending)
+
+        payouts = [("0x852023fbb19050B8291a335E5A83Ac9701E7B4E6", Decimal("100.0"))]
+        self.assertTrue(self.job.bulk_payout(payouts, {}, self.rep_oracle_pub_key))
+        self.assertTrue(self.job.complete(blocking=True))
+        self.assertEqual(self.job.status(), Status.Complete)
+
+    def test_snapshot_round_trip(self):
+        self.assertTrue(self.job.launch(self.rep_oracle_pub_key))
+        snapshot = json.loads(json.dumps(self.job.to_snapshot()))
+
+        with patch.object(get_w3().provider, "make_request") as make_request, patch(
+            "hmt_escrow.job.download"
+        ) as download:
+            job = Job.from_snapshot(snapshot, self.credentials)
+            make_request.assert_not_called()
+            download.assert_not_called()
+
+        self.assertEqual(job.job_contract.address, self.job.job_contract.address)
+        self.assertEqual(
+            job.factory_contract.address, self.job.factory_contract.address
+        )
+        self.assertEqual(job.manifest_url, self.job.manifest_url)
+        self.assertEqual(job.manifest_hash, self.job.manifest_hash)
+        self.assertEqual(job.serialized_manifest, self.job.serialized_manifest)
+        self.assertEqual(job.amount, self.job.amount)
+        self.assertTrue(job.setup())
+
+    def test_snapshot_validation(self):
+        with self.assertRaises(AttributeError):
+            self.job.to_snapshot()
+
+        self.assertTrue(self.job.launch(self.rep_oracle_pub_key))
+        snapshot = self.job.to_snapshot()
+        with self.assertRaises(ValueError):
+            Job.from_snapshot(dict(snapshot, version=0), self.credentials)
+        with self.assertRaises(ValueError):
+            Job.from_snapshot(dict(snapshot, amount="many"), self.credentials)
+
+        credentials = dict(self.credentials, gas_payer_priv="00" * 32)
+        with self.assertRaises(ValueError):
+            Job.from_snapshot(snapshot, credentials)
+
     def test_job_balance(self):
         self.assertTrue(self.job.launch(self.rep_oracle_pub_key))
         self.assertTrue(self.job.setup())
@@ -566,5 +669,158 @@ class JobTestCase(unittest.TestCase):
         self.assertGreater(amount, 10000)
 
 
+class RaffleTxnTestCase(unittest.TestCase):
+    def setUp(self):
+        self.job = Job.__new__(Job)
+        self.job.hmt_server_addr = None
+        self.job.gas = 1000000
+        self.job.fee_strategy = None
+        self.job.retry = Retry(retries=2)
+        self.job.gas_payer = None
+        self.job.gas_payer_priv = None
+        self.creds = [
+            ("0x1413862C2B7054CDbfdc181B83962CB0FC11fD92", "a"),
+            ("0x61F9F0B31eacB420553da8BCC59DC617279731Ac", "b"),
+        ]
+        self.pool = CredentialPool(balances=False)
+        self.bulk_payout = MagicMock(name="bulkPayOut")
+        for target, value in (
+            ("hmt_escrow.job.get_credential_pool", self.pool),
+            ("hmt_escrow.credentials.get_w3", MagicMock()),
+        ):
+            patcher = patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def raffle(self):
+        return self.job._raffle_txn(
+            self.creds,
+            self.bulk_payout,
+            [["0x0"], [1], "url", "hash", 1],
+            "Bulk Payout",
+        )
+
+    def test_timed_out_transaction_is_not_sent_again(self):
+        """Tests a pending bulkPayOut is replaced, not sent from another account"""
+        handle = MagicMock()
+        handle.result.side_effect = TimeExhausted("still pending")
+        with patch("hmt_escrow.job.submit_transaction", return_value=handle) as submit:
+            raffled = self.raffle()
+
+        self.assertFalse(raffled["txn_succeeded"])
+        submit.assert_called_once()
+        self.assertIs(submit.call_args[0][0], self.bulk_payout)
+        self.assertEqual(submit.call_args[1]["gas_payer"], self.creds[0][0])
+        self.assertEqual(handle.speed_up.call_count, 2)
+        self.assertIsNone(self.job.gas_payer)
+
+    def test_main_credentials_timeout_is_not_raffled(self):
+        """Tests a pending transaction of the main credentials isn't sent again"""
+        self.job.gas_payer, self.job.gas_payer_priv = self.creds[0]
+        self.job.multi_credentials = self.creds[1:]
+        self.job.job_contract = MagicMock()
+        with patch(
+            "hmt_escrow.job.handle_transaction_with_retry",
+            side_effect=TimeExhausted("still pending"),
+        ) as handle, patch.object(self.job, "_raffle_txn") as raffle:
+            self.assertFalse(self.job.add_trusted_handlers([self.creds[1][0]]))
+
+        handle.assert_called_once()
+        raffle.assert_not_called()
+
+    def test_main_credentials_failure_is_raffled(self):
+        """Tests a transaction the main credentials can't send is raffled"""
+        self.job.gas_payer, self.job.gas_payer_priv = self.creds[0]
+        self.job.multi_credentials = self.creds[1:]
+        self.job.job_contract = MagicMock()
+        with patch(
+            "hmt_escrow.job.handle_transaction_with_retry",
+            side_effect=ValueError("insufficient funds"),
+        ), patch.object(
+            self.job,
+            "_raffle_txn",
+            return_value={"txn_succeeded": True, "tx_receipt": {"status": 1}},
+        ) as raffle:
+            self.assertTrue(self.job.add_trusted_handlers([self.creds[1][0]]))
+
+        raffle.assert_called_once_with(
+            self.creds[1:],
+            self.job.job_contract.functions.addTrustedHandlers,
+            [[self.creds[1][0]]],
+            "Adding trusted handlers",
+        )
+
+    def test_send_failure_falls_back_on_next_account(self):
+        """Tests a bulkPayOut which can't be sent is sent from another account"""
+        handle = MagicMock()
+        handle.result.return_value = {"status": 1}
+        with patch(
+            "hmt_escrow.job.submit_transaction",
+            side_effect=[ValueError("insufficient funds"), handle],
+        ) as submit:
+            raffled = self.raffle()
+
+        self.assertTrue(raffled["txn_succeeded"])
+        self.assertEqual(submit.call_count, 2)
+        self.assertEqual(submit.call_args[1]["gas_payer"], self.creds[1][0])
+        self.assertEqual(self.job.gas_payer, self.creds[1][0])
+        self.assertEqual(self.pool.health(self.creds[0][0]).failures, 1)
+
+
+class WaitForStatusTestCase(unittest.TestCase):
+    def setUp(self):
+        self.job = Job.__new__(Job)
+        self.job.hmt_server_addr = None
+        self.job.hmtoken_addr = "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809"
+        self.job.job_contract = MagicMock(
+            address="0x61F9F0B31eacB420553da8BCC59DC617279731Ac"
+        )
+        self.job.gas = 1000000
+        self.job.fee_strategy = None
+        self.job.retry = Retry(retries=0)
+        self.job.gas_payer, self.job.gas_payer_priv = "0x1", "a"
+        self.current = Status.Paid
+        self.job.status = lambda: self.current
+        for target in ("hmt_escrow.job.get_log_watcher", "hmt_escrow.job.get_w3"):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_complete_wakes_the_waiters(self):
+        """Tests waiting for a completion doesn't wait for the status recheck"""
+        reached = []
+        waiter = threading.Thread(
+            target=lambda: reached.append(
+                self.job.wait_for_status(Status.Complete, timeout=10)
+            )
+        )
+        start = time.monotonic()
+        waiter.start()
+        while self.job.job_contract.address not in _STATUS_WAITERS:
+            time.sleep(0.001)
+
+        def complete(*args, **kwargs):
+            self.current = Status.Complete
+
+        with patch(
+            "hmt_escrow.job.handle_transaction_with_retry", side_effect=complete
+        ):
+            self.assertTrue(self.job.complete())
+        waiter.join(5)
+        self.assertEqual(reached, [True])
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertNotIn(self.job.job_contract.address, _STATUS_WAITERS)
+
+
+class UploadExecutorTestCase(unittest.TestCase):
+    def test_executor_is_started_again_after_a_fork(self):
+        """Tests a forked child doesn't submit to the threads of its parent"""
+        executor = _upload_executor()
+        self.assertIs(_upload_executor(), executor)
+        _after_fork()
+        self.assertIsNot(_upload_executor(), executor)
+        self.assertEqual(_upload_executor().submit(lambda: 1).result(5), 1)
+
+
 if __name__ == "__main__":
     unittest.main(exit=True)
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+
+from eth_account import Account
+from eth_keys import keys
+
+from hmt_escrow import crypto
+from hmt_escrow.keyring import KeyRing, checksum_address, get_keyring
+
+ADDRESS = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+PRIV_KEY = "28e516f1e2f99e96a48a23cea1f94ee5f073403a1c68e818263f0eb898f1c8e5"
+OTHER_PRIV_KEY = "486a0621e595dd7fcbe5608cbbeec8f5a8b5cabe7637f11eccfc7acd408c3a0e"
+
+
+class KeyRingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.keyring = KeyRing(maxsize=4)
+
+    def test_same_key_whatever_its_form(self):
+        key = self.keyring.key(PRIV_KEY)
+        self.assertIs(self.keyring.key("0x" + PRIV_KEY), key)
+        self.assertIs(self.keyring.key(PRIV_KEY.encode("ascii")), key)
+        self.assertIs(self.keyring.key(bytes.fromhex(PRIV_KEY)), key)
+        self.assertIsNot(self.keyring.key(OTHER_PRIV_KEY), key)
+        self.assertEqual(len(self.keyring), 2)
+
+    def test_derives_once(self):
+        key = self.keyring.key(PRIV_KEY)
+        self.assertEqual(key.address, ADDRESS)
+        private_key, account = key.private_key, key.account
+        for _ in range(3):
+            key = self.keyring.key(PRIV_KEY)
+            self.assertIs(key.private_key, private_key)
+            self.assertIs(key.account, account)
+        self.assertEqual(
+            key.public_key, keys.PrivateKey(key.private_key_bytes).public_key
+        )
+
+    def test_matches(self):
+        key = self.keyring.key(PRIV_KEY)
+        self.assertTrue(key.matches(ADDRESS))
+        self.assertFalse(key.matches("0x61F9F0B31eacB420553da8BCC59DC617279731Ac"))
+        self.assertEqual(checksum_address(ADDRESS.lower()), ADDRESS)
+
+    def test_invalid_key(self):
+        with self.assertRaises(ValueError):
+            self.keyring.key("not a key")
+
+    def test_signs_like_account(self):
+        txn = {
+            "to": ADDRESS,
+            "value": 1,
+            "gas": 21000,
+            "gasPrice": 1,
+            "nonce": 0,
+            "chainId": 1,
+        }
+        signed = self.keyring.key(PRIV_KEY).account.sign_transaction(txn)
+        expected = Account.sign_transaction(txn, private_key=PRIV_KEY)
+        self.assertEqual(signed.rawTransaction, expected.rawTransaction)
+
+    def test_decrypt_uses_keyring(self):
+        key = get_keyring().key(PRIV_KEY)
+        public_key = key.public_key.to_bytes().hex().encode("ascii")
+        encrypted = crypto.encrypt(public_key, "message")
+        self.assertEqual(crypto.decrypt(PRIV_KEY.encode("ascii"), encrypted), "message")
+        self.assertIs(get_keyring().key(PRIV_KEY), key)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,151 @@
+import threading
+import unittest
+from time import sleep
+from unittest.mock import MagicMock, PropertyMock
+
+from hexbytes import HexBytes
+
+from hmt_escrow.logs import (
+    LogWatcher,
+    address_topic,
+    clear_log_watchers,
+    get_log_watcher,
+)
+
+ESCROW_A = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+ESCROW_B = "0x61F9F0B31eacB420553da8BCC59DC617279731Ac"
+TOKEN = "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809"
+TOPIC = b"\x01" * 32
+
+
+def log(address, *topics, block=11):
+    return {
+        "address": address,
+        "blockNumber": block,
+        "topics": [HexBytes(topic) for topic in topics],
+    }
+
+
+class LogWatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.w3 = MagicMock()
+        self.w3.eth.block_number = 10
+        self.logs = []
+        self.w3.eth.get_logs.side_effect = lambda params: [
+            log
+            for log in self.logs
+            if params["fromBlock"] <= log["blockNumber"] <= params["toBlock"]
+        ]
+        self.watcher = LogWatcher(self.w3, poll_interval=0.01, max_blocks=5)
+
+    def wait_for_head(self, head):
+        while self.watcher.head != head:
+            sleep(0.001)
+
+    def test_single_request_for_all_subscribers(self):
+        received = {ESCROW_A: [], ESCROW_B: []}
+        done = threading.Event()
+
+        def callback(address):
+            def append(log):
+                received[address].append(log)
+                if all(received.values()):
+                    done.set()
+
+            return append
+
+        subscriptions = [
+            self.watcher.subscribe(address, callback(address))
+            for address in (ESCROW_A, ESCROW_B)
+        ]
+        self.wait_for_head(10)
+
+        self.logs = [log(ESCROW_A, TOPIC), log(ESCROW_B, TOPIC), log(TOKEN, TOPIC)]
+        self.w3.eth.block_number = 11
+        self.assertTrue(done.wait(1))
+        self.assertEqual(received[ESCROW_A], [self.logs[0]])
+        self.assertEqual(received[ESCROW_B], [self.logs[1]])
+
+        params = self.w3.eth.get_logs.call_args_list[0][0][0]
+        self.assertEqual((params["fromBlock"], params["toBlock"]), (11, 11))
+        self.assertEqual(params["address"], sorted([ESCROW_A, ESCROW_B]))
+
+        for subscription in subscriptions:
+            self.watcher.unsubscribe(subscription)
+        self.assertEqual(self.watcher.subscriptions, 0)
+
+    def test_filters_topics(self):
+        received = []
+        self.watcher.subscribe(TOKEN, received.append, [TOPIC, address_topic(ESCROW_A)])
+        self.wait_for_head(10)
+
+        self.logs = [
+            log(TOKEN, TOPIC, address_topic(ESCROW_B)),
+            log(TOKEN, TOPIC, address_topic(ESCROW_A)),
+            log(TOKEN, TOPIC),
+        ]
+        self.w3.eth.block_number = 11
+        self.wait_for_head(11)
+        self.assertEqual(received, [self.logs[1]])
+
+    def test_splits_long_ranges(self):
+        self.watcher.subscribe(ESCROW_A, lambda log: None)
+        self.wait_for_head(10)
+        self.w3.eth.block_number = 22
+        self.wait_for_head(22)
+        ranges = [
+            (call[0][0]["fromBlock"], call[0][0]["toBlock"])
+            for call in self.w3.eth.get_logs.call_args_list
+        ]
+        self.assertEqual(ranges, [(11, 15), (16, 20), (21, 22)])
+
+    def test_failing_callback_does_not_stop_the_others(self):
+        received = []
+
+        def fail(log):
+            raise ValueError("boom")
+
+        self.watcher.subscribe(ESCROW_A, fail)
+        self.watcher.subscribe(ESCROW_A, received.append)
+        self.wait_for_head(10)
+        self.logs = [log(ESCROW_A, TOPIC)]
+        self.w3.eth.block_number = 11
+        self.wait_for_head(11)
+        self.assertEqual(received, self.logs)
+
+    def test_blocks_mined_before_the_first_poll_are_read(self):
+        heads = iter([10])
+        type(self.w3.eth).block_number = PropertyMock(
+            side_effect=lambda: next(heads, 12)
+        )
+        self.logs = [log(ESCROW_A, TOPIC, block=11)]
+        received = []
+        self.watcher.subscribe(ESCROW_A, received.append)
+        self.wait_for_head(12)
+        self.assertEqual(received, self.logs)
+        params = self.w3.eth.get_logs.call_args_list[0][0][0]
+        self.assertEqual((params["fromBlock"], params["toBlock"]), (11, 12))
+
+    def test_subscribers_start_from_their_own_block(self):
+        early, late = [], []
+        self.watcher.subscribe(ESCROW_A, early.append)
+        self.wait_for_head(10)
+
+        self.logs = [log(ESCROW_A, TOPIC, block=11), log(ESCROW_A, TOPIC, block=13)]
+        self.w3.eth.block_number = 12
+        self.watcher.subscribe(ESCROW_A, late.append)
+        self.w3.eth.block_number = 13
+        self.wait_for_head(13)
+        self.assertEqual(early, self.logs)
+        self.assertEqual(late, self.logs[1:])
+
+    def test_get_log_watcher_is_shared(self):
+        clear_log_watchers()
+        watcher = get_log_watcher(self.w3)
+        self.assertIs(get_log_watcher(self.w3), watcher)
+        self.assertIsNot(get_log_watcher(MagicMock()), watcher)
+        clear_log_watchers()
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
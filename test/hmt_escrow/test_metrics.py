@@ -0,0 +1,127 @@
+import unittest
+
+from web3.middleware import simple_cache_middleware
+
+from hmt_escrow.metrics import (
+    InMemorySink,
+    PrometheusSink,
+    RpcSample,
+    get_sink,
+    operation,
+    rpc_metrics_middleware,
+    set_sink,
+    tag_operation,
+)
+from hmt_escrow.providers import ProviderRegistry
+
+
+class FakeJob:
+    def __init__(self, middleware):
+        self.middleware = middleware
+
+    @tag_operation
+    def bulk_payout(self):
+        self.middleware("eth_getTransactionCount", ["0x00", "pending"])
+        return self.status()
+
+    @tag_operation
+    def status(self):
+        return self.middleware("eth_call", [{"to": "0x00"}, "latest"])
+
+
+class RpcMetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.previous_sink = get_sink()
+        self.sink = PrometheusSink()
+        set_sink(self.sink)
+        self.responses = []
+        self.middleware = rpc_metrics_middleware(self.make_request, None)
+
+    def tearDown(self):
+        set_sink(self.previous_sink)
+
+    def make_request(self, method, params):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def test_counts_per_method(self):
+        self.responses = [{"result": "0x1"}, {"result": "0x2"}, {"result": "0x0"}]
+        self.middleware("eth_call", [])
+        self.middleware("eth_call", [])
+        self.middleware("eth_blockNumber", [])
+        self.assertEqual(self.sink.count("eth_call"), 2)
+        self.assertEqual(self.sink.count("eth_blockNumber"), 1)
+        self.assertEqual(self.sink.count(), 3)
+
+        stats = self.sink.stats()[("eth_call", "")]
+        self.assertEqual(sum(stats.buckets), 2)
+        self.assertEqual(stats.request_bytes, 4)
+        self.assertEqual(stats.response_bytes, 2 * len('{"result": "0x1"}'))
+
+    def test_errors(self):
+        self.responses = [
+            {"error": {"code": -32000, "message": "execution reverted"}},
+            ConnectionError("node down"),
+        ]
+        self.middleware("eth_call", [])
+        with self.assertRaises(ConnectionError):
+            self.middleware("eth_call", [])
+
+        errors = self.sink.stats()[("eth_call", "")].errors
+        self.assertEqual(errors, {"rpc_-32000": 1, "ConnectionError": 1})
+
+    def test_tags_outermost_operation(self):
+        self.responses = [{"result": "0x1"}, {"result": "0x0"}, {"result": "0x0"}]
+        job = FakeJob(self.middleware)
+        job.bulk_payout()
+        job.status()
+        self.assertEqual(self.sink.count(operation="bulk_payout"), 2)
+        self.assertEqual(self.sink.count("eth_call", "bulk_payout"), 1)
+        self.assertEqual(self.sink.count("eth_call", "status"), 1)
+
+        with operation("refresh"):
+            self.sink.observe(RpcSample("eth_call", "refresh", 0.1, 1, 1))
+        self.assertEqual(self.sink.count(operation="refresh"), 1)
+
+    def test_prometheus_render(self):
+        self.sink.observe(RpcSample("eth_call", "status", 0.02, 90, 70))
+        self.sink.observe(RpcSample("eth_call", "status", 3, 90, 0, "Timeout"))
+        text = self.sink.render()
+        labels = 'method="eth_call",operation="status"'
+        self.assertIn(f"hmt_rpc_requests_total{{{labels}}} 2\n", text)
+        self.assertIn(f'hmt_rpc_errors_total{{{labels},error="Timeout"}} 1\n', text)
+        self.assertIn(
+            f'hmt_rpc_latency_seconds_bucket{{{labels},le="0.025"}} 1\n', text
+        )
+        self.assertIn(f'hmt_rpc_latency_seconds_bucket{{{labels},le="5.0"}} 2\n', text)
+        self.assertIn(f'hmt_rpc_latency_seconds_bucket{{{labels},le="+Inf"}} 2\n', text)
+        self.assertIn(f"hmt_rpc_latency_seconds_count{{{labels}}} 2\n", text)
+        self.assertIn(
+            f'hmt_rpc_payload_bytes_total{{{labels},direction="request"}} 180\n', text
+        )
+
+    def test_in_memory_clear(self):
+        sink = InMemorySink()
+        sink.observe(RpcSample("eth_call", "", 0.1, 1, 1))
+        sink.clear()
+        self.assertEqual(sink.count(), 0)
+
+    def test_registry_installs_middleware(self):
+        w3 = ProviderRegistry(metrics=True).get("http://localhost:8545")
+        self.assertIn("rpc_metrics", w3.middleware_onion)
+        w3 = ProviderRegistry(metrics=False).get("http://localhost:8545")
+        self.assertNotIn("rpc_metrics", w3.middleware_onion)
+
+    def test_registry_counts_requests_reaching_the_node(self):
+        w3 = ProviderRegistry(metrics=True, profile="lean").get("http://localhost:8545")
+        w3.middleware_onion.add(simple_cache_middleware, "cache")
+        w3.provider.make_request = lambda method, params: {"result": "1"}
+        self.assertEqual(w3.net.version, "1")
+        self.assertEqual(w3.net.version, "1")
+        self.assertEqual(self.sink.count("net_version"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
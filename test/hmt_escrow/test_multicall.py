@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from eth_utils import function_signature_to_4byte_selector
+from web3 import Web3
+
+from hmt_escrow.job import Status
+from hmt_escrow.multicall import TRY_AGGREGATE, read_escrows
+
+MULTICALL = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+ESCROWS = [
+    "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809",
+    "0x852023fbb19050B8291a335E5A83Ac9701E7B4E6",
+    "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92",
+]
+STATUS = function_signature_to_4byte_selector("status()")
+BALANCE = function_signature_to_4byte_selector("getBalance()")
+
+
+class ReadEscrowsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.codec = Web3().codec
+        self.w3 = MagicMock()
+        self.w3.codec = self.codec
+        self.w3.eth.call.side_effect = self.aggregate
+        patcher = patch("hmt_escrow.multicall.get_w3", return_value=self.w3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chunks = []
+
+    def aggregate(self, tx):
+        """Plays the Multicall contract: the last escrow has no code."""
+        data = bytes(tx["data"])
+        self.assertEqual(tx["to"], MULTICALL)
+        self.assertEqual(data[:4], TRY_AGGREGATE)
+        (calls,) = self.codec.decode_abi(["(address,bytes)[]"], data[4:])
+        self.chunks.append(len(calls))
+
+        results = []
+        for target, call_data in calls:
+            index = ESCROWS.index(Web3.toChecksumAddress(target))
+            if index == 2:
+                results.append((True, b""))
+            elif call_data == STATUS:
+                results.append((True, self.codec.encode_abi(["uint8"], [index])))
+            elif call_data == BALANCE:
+                results.append((True, self.codec.encode_abi(["uint256"], [index * 10])))
+            else:
+                results.append((False, b""))
+        return self.codec.encode_abi(["uint256", "(bool,bytes)[]"], [1, results])
+
+    def test_columns(self):
+        columns = read_escrows(
+            [address.lower() for address in ESCROWS],
+            ["status", "balance", "manifest_url"],
+            multicall_addr=MULTICALL,
+        )
+        self.assertEqual(columns["address"], ESCROWS)
+        self.assertEqual(columns["status"], [Status.Launched, Status.Pending, None])
+        self.assertEqual(columns["balance"], [0, 10, None])
+        self.assertEqual(columns["manifest_url"], [None, None, None])
+        self.assertEqual(self.chunks, [9])
+
+    def test_chunks_by_calldata_size(self):
+        # Each call takes 160 bytes of calldata.
+        columns = read_escrows(ESCROWS, multicall_addr=MULTICALL, max_calldata=480)
+        self.assertEqual(self.chunks, [3, 3])
+        self.assertEqual(columns["balance"], [0, 10, None])
+
+    def test_chunks_by_gas(self):
+        read_escrows(
+            ESCROWS, multicall_addr=MULTICALL, gas_limit=100000, call_gas=50000
+        )
+        self.assertEqual(self.chunks, [2, 2, 2])
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            read_escrows(ESCROWS, ["owner"], multicall_addr=MULTICALL)
+        self.w3.eth.call.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
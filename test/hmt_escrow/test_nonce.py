@@ -0,0 +1,128 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from web3 import Web3, HTTPProvider
+
+from hmt_escrow.aio.providers import get_web3 as get_async_web3
+from hmt_escrow.nonce import NonceManager, get_nonce_manager, clear_nonce_managers
+from hmt_escrow.providers import get_web3
+
+GAS_PAYER = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+
+
+class NonceManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.w3 = MagicMock()
+        self.w3.eth.get_transaction_count.return_value = 7
+        self.nonces = NonceManager(self.w3, GAS_PAYER)
+
+    def test_reserve_pipelines_nonces(self):
+        self.assertEqual([self.nonces.reserve() for _ in range(3)], [7, 8, 9])
+        self.assertEqual(self.nonces.in_flight, 3)
+        self.w3.eth.get_transaction_count.assert_called_once_with(GAS_PAYER, "pending")
+
+    def test_confirmed_nonces_leave_flight(self):
+        nonce = self.nonces.reserve()
+        self.nonces.reserve()
+        self.nonces.confirm(nonce)
+        self.assertEqual(self.nonces.in_flight, 1)
+
+    def test_released_nonces_are_reused(self):
+        first = self.nonces.reserve()
+        self.nonces.reserve()
+        self.nonces.release(first)
+        self.assertEqual(self.nonces.reserve(), first)
+        self.assertEqual(self.nonces.reserve(), 9)
+
+    def test_resync_after_error(self):
+        self.nonces.reserve()
+        nonce = self.nonces.reserve()
+        # The first one reached the node, the second was rejected.
+        self.w3.eth.get_transaction_count.return_value = 8
+        self.nonces.release(nonce)
+        self.nonces.resync()
+        self.assertEqual(self.nonces.in_flight, 0)
+        self.assertEqual(self.nonces.reserve(), 8)
+
+    def test_resync_keeps_reserved_nonces(self):
+        self.assertEqual([self.nonces.reserve() for _ in range(3)], [7, 8, 9])
+        # Only the first one was broadcast, the others are being signed.
+        self.w3.eth.get_transaction_count.return_value = 8
+        self.nonces.resync()
+        self.assertEqual(self.nonces.in_flight, 2)
+        self.assertEqual(self.nonces.reserve(), 10)
+
+    def test_resync_drops_released_nonces_known_to_the_node(self):
+        nonces = [self.nonces.reserve() for _ in range(3)]
+        self.nonces.release(nonces[0])
+        self.nonces.release(nonces[2])
+        # Another process used nonce 7 in the meantime.
+        self.w3.eth.get_transaction_count.return_value = 8
+        self.nonces.resync()
+        self.assertEqual(self.nonces.reserve(), 9)
+        self.assertEqual(self.nonces.reserve(), 10)
+
+    def test_resync_never_hands_out_reserved_nonces_twice(self):
+        reserved = []
+        lock = threading.Lock()
+
+        def send():
+            for i in range(200):
+                nonce = self.nonces.reserve()
+                with lock:
+                    reserved.append(nonce)
+                if i % 7 == 0:
+                    # A timeout: the node only saw the lowest nonces.
+                    self.nonces.resync(pending=nonce - 3)
+
+        threads = [threading.Thread(target=send) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(reserved), len(set(reserved)))
+
+    def test_syncs_when_idle(self):
+        nonce = self.nonces.reserve()
+        self.nonces.confirm(nonce)
+
+        # Another process sent transactions in the meantime.
+        self.w3.eth.get_transaction_count.return_value = 12
+        self.assertEqual(self.nonces.reserve(), 12)
+
+    def test_known_pending_count(self):
+        self.assertTrue(self.nonces.needs_sync)
+        self.assertEqual(self.nonces.reserve(pending=20), 20)
+        self.assertFalse(self.nonces.needs_sync)
+        self.assertEqual(self.nonces.reserve(pending=20), 21)
+        self.nonces.resync(pending=25)
+        self.assertEqual(self.nonces.reserve(), 25)
+        self.w3.eth.get_transaction_count.assert_not_called()
+
+    def test_get_nonce_manager_is_shared(self):
+        clear_nonce_managers()
+        manager = get_nonce_manager(self.w3, GAS_PAYER.lower())
+        self.assertIs(get_nonce_manager(self.w3, GAS_PAYER), manager)
+        self.assertIsNot(get_nonce_manager(MagicMock(), GAS_PAYER), manager)
+        clear_nonce_managers()
+
+    def test_sync_and_async_senders_share_the_manager(self):
+        clear_nonce_managers()
+        endpoint = "http://localhost:8545"
+        manager = get_nonce_manager(get_async_web3(endpoint), GAS_PAYER)
+        self.assertIs(manager.w3, get_web3(endpoint))
+
+        w3 = Web3(HTTPProvider(endpoint))
+        self.assertIs(get_nonce_manager(w3, GAS_PAYER), manager)
+        self.assertIs(manager.w3, w3)
+        self.assertIsNot(
+            get_nonce_manager(get_async_web3("http://127.0.0.1:8545"), GAS_PAYER),
+            manager,
+        )
+        clear_nonce_managers()
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,306 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+from hmt_escrow.eth_bridge import Retry
+from hmt_escrow.payouts import (
+    BULK_TRANSFER_TOPIC,
+    ChunkedPayout,
+    FileProgressStore,
+    MemoryProgressStore,
+    ProgressStore,
+    default_progress_store,
+    payout_key,
+)
+
+ESCROW = "0x6b7E3C31F34cF38d1DFC1D9A8A59482028395809"
+RECIPIENTS = [f"0x{i:040x}" for i in range(1, 251)]
+AMOUNTS = [10**18] * 250
+
+
+def bulk_transfer_log(tx_id):
+    return {
+        "address": ESCROW,
+        "topics": [HexBytes(BULK_TRANSFER_TOPIC), HexBytes(tx_id.to_bytes(32, "big"))],
+    }
+
+
+class FakeHandle(object):
+    def __init__(self, tx_id, paid=True):
+        self.txn_hash = HexBytes(tx_id.to_bytes(32, "big"))
+        self.hashes = [self.txn_hash]
+        self.nonce = tx_id
+        self.receipt = {
+            "status": 1,
+            "transactionHash": self.txn_hash,
+            "logs": [bulk_transfer_log(tx_id)] if paid else [],
+        }
+
+    def result(self):
+        return self.receipt
+
+    def abandon(self):
+        self.abandoned = True
+
+
+class ChunkedPayoutTestCase(unittest.TestCase):
+    def setUp(self):
+        self.w3 = MagicMock()
+        self.w3.eth.block_number = 100
+        self.w3.eth.get_block.return_value = {"gasLimit": 30000000}
+        self.w3.eth.get_logs.return_value = []
+        self.escrow = MagicMock()
+        self.escrow.address = ESCROW
+        self.escrow.functions.bulkPayOut.return_value.estimateGas.side_effect = (
+            Exception("no estimate")
+        )
+        self.store = MemoryProgressStore()
+        self.upload = MagicMock(return_value=("hash", "url"))
+        self.sent = []
+        self.unpaid = set()
+        patcher = patch(
+            "hmt_escrow.payouts.submit_transaction", side_effect=self.submit
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, txn_func, recipients, amounts, url, hash_, tx_id, **txn_info):
+        self.assertEqual((url, hash_), ("url", "hash"))
+        self.sent.append((tx_id, len(recipients)))
+        return FakeHandle(tx_id, paid=tx_id not in self.unpaid)
+
+    def payout(self, **kwargs):
+        txn_info = {"gas_payer": "0x01", "gas_payer_priv": "", "gas": 4712388}
+        return ChunkedPayout(self.w3, self.escrow, txn_info, store=self.store, **kwargs)
+
+    def test_splits_into_sequential_chunks(self):
+        self.assertTrue(self.payout().run(RECIPIENTS, AMOUNTS, self.upload, tx_id=5))
+        self.assertEqual(self.sent, [(5, 99), (6, 99), (7, 52)])
+        self.upload.assert_called_once()
+        self.assertIsNone(self.store.load(payout_key(ESCROW, RECIPIENTS, AMOUNTS)))
+
+    def test_chunk_size_follows_gas_estimate(self):
+        estimate = self.escrow.functions.bulkPayOut.return_value.estimateGas
+        estimate.side_effect = None
+        estimate.return_value = 60000 * 99
+        self.assertTrue(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual([size for _, size in self.sent], [62, 62, 62, 62, 2])
+
+    def test_pipelines_chunks(self):
+        settled = []
+
+        def submit(*args, **kwargs):
+            handle = self.submit(*args, **kwargs)
+            handle.result = lambda: settled.append(len(self.sent)) or handle.receipt
+            return handle
+
+        with patch("hmt_escrow.payouts.submit_transaction", side_effect=submit):
+            self.assertTrue(
+                self.payout(pipeline=2).run(RECIPIENTS, AMOUNTS, self.upload)
+            )
+        # The first chunk is awaited once the third one is due.
+        self.assertEqual(settled, [2, 3, 3])
+
+    def test_resumes_after_failure(self):
+        self.unpaid = {2}
+        self.assertFalse(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        record = self.store.load(payout_key(ESCROW, RECIPIENTS, AMOUNTS))
+        self.assertEqual(
+            [bool(c.get("paid")) for c in record["chunks"]], [True, False, True]
+        )
+
+        self.unpaid = set()
+        self.sent = []
+        self.assertTrue(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual(self.sent, [(2, 99)])
+        self.upload.assert_called_once()
+
+    def test_resume_skips_chunks_paid_on_chain(self):
+        key = payout_key(ESCROW, RECIPIENTS, AMOUNTS)
+        self.store.save(
+            key,
+            {
+                "escrow": ESCROW,
+                "url": "url",
+                "hash": "hash",
+                "from_block": 90,
+                "chunks": [
+                    {"tx_id": 1, "start": 0, "end": 99, "paid": True},
+                    {
+                        "tx_id": 2,
+                        "start": 99,
+                        "end": 198,
+                        "txn_hashes": ["0x02"],
+                        "nonce": 2,
+                    },
+                    {"tx_id": 3, "start": 198, "end": 250},
+                ],
+            },
+        )
+        self.w3.eth.get_logs.return_value = [bulk_transfer_log(2)]
+        self.assertTrue(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual(self.sent, [(3, 52)])
+        self.upload.assert_not_called()
+        self.assertEqual(self.w3.eth.get_logs.call_args[0][0]["fromBlock"], 90)
+
+    def test_resume_waits_for_pending_chunks(self):
+        key = payout_key(ESCROW, RECIPIENTS, AMOUNTS)
+        record = {
+            "escrow": ESCROW,
+            "url": "url",
+            "hash": "hash",
+            "from_block": 90,
+            "chunks": [
+                {"tx_id": 1, "start": 0, "end": 99, "paid": True},
+                {
+                    "tx_id": 2,
+                    "start": 99,
+                    "end": 198,
+                    "txn_hashes": ["0x02"],
+                    "nonce": 2,
+                },
+                {"tx_id": 3, "start": 198, "end": 250},
+            ],
+        }
+        self.store.save(key, record)
+        self.w3.eth.get_transaction_receipt.side_effect = TransactionNotFound("0x02")
+        self.w3.eth.wait_for_transaction_receipt.side_effect = TimeExhausted(
+            "still pending"
+        )
+        self.assertFalse(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+
+        # Nothing is sent while the chunk may still be mined.
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.store.load(key)["chunks"][1]["txn_hashes"], ["0x02"])
+
+        self.w3.eth.wait_for_transaction_receipt.side_effect = None
+        self.w3.eth.wait_for_transaction_receipt.return_value = FakeHandle(2).receipt
+        self.assertTrue(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual(self.sent, [(3, 52)])
+
+    def pending_record(self):
+        key = payout_key(ESCROW, RECIPIENTS, AMOUNTS)
+        self.store.save(
+            key,
+            {
+                "escrow": ESCROW,
+                "url": "url",
+                "hash": "hash",
+                "from_block": 90,
+                "chunks": [
+                    {"tx_id": 1, "start": 0, "end": 99, "paid": True},
+                    {
+                        "tx_id": 2,
+                        "start": 99,
+                        "end": 198,
+                        "txn_hashes": ["0x02", "0x12"],
+                        "nonce": 7,
+                    },
+                    {"tx_id": 3, "start": 198, "end": 250, "paid": True},
+                ],
+            },
+        )
+        self.w3.eth.get_transaction_receipt.side_effect = TransactionNotFound("0x02")
+        return key
+
+    def test_timed_out_chunk_keeps_its_replacements(self):
+        replaced = HexBytes(b"\x12" * 32)
+
+        def submit(*args, **kwargs):
+            handle = self.submit(*args, **kwargs)
+            if args[5] == 2:
+                handle.hashes.append(replaced)
+                handle.result = MagicMock(side_effect=TimeExhausted("still pending"))
+                self.timed_out = handle
+            return handle
+
+        with patch("hmt_escrow.payouts.submit_transaction", side_effect=submit):
+            payout = self.payout(retry=Retry(retries=0))
+            self.assertFalse(payout.run(RECIPIENTS, AMOUNTS, self.upload))
+
+        chunk = self.store.load(payout_key(ESCROW, RECIPIENTS, AMOUNTS))["chunks"][1]
+        self.assertEqual(
+            chunk["txn_hashes"],
+            [HexBytes((2).to_bytes(32, "big")).hex(), replaced.hex()],
+        )
+        self.assertEqual(chunk["nonce"], 2)
+        self.assertTrue(self.timed_out.abandoned)
+
+    def test_resume_waits_for_a_pending_replacement(self):
+        key = self.pending_record()
+
+        def get_transaction(txn_hash):
+            if txn_hash != "0x12":
+                raise TransactionNotFound(txn_hash)
+            return {"hash": txn_hash}
+
+        self.w3.eth.get_transaction.side_effect = get_transaction
+        self.w3.eth.wait_for_transaction_receipt.side_effect = TimeExhausted(
+            "still pending"
+        )
+        self.assertFalse(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual(self.sent, [])
+        self.assertEqual(
+            self.w3.eth.wait_for_transaction_receipt.call_args[0][0], "0x12"
+        )
+        self.assertIn("txn_hashes", self.store.load(key)["chunks"][1])
+
+    def test_resume_waits_while_the_nonce_is_pending(self):
+        """Tests an unknown transaction with the chunk's nonce keeps it from being resent"""
+        self.pending_record()
+        self.w3.eth.get_transaction.side_effect = TransactionNotFound("0x02")
+        self.w3.eth.get_transaction_count.side_effect = (
+            lambda address, block="latest": 8 if block == "pending" else 7
+        )
+        self.assertFalse(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual(self.sent, [])
+
+    def test_resume_resends_dropped_chunks(self):
+        self.pending_record()
+        self.w3.eth.get_transaction.side_effect = TransactionNotFound("0x02")
+        self.w3.eth.get_transaction_count.return_value = 7
+        self.assertTrue(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual(self.sent, [(2, 99)])
+
+    def test_resume_checks_the_logs_when_the_nonce_was_mined(self):
+        self.pending_record()
+        self.w3.eth.get_transaction.side_effect = TransactionNotFound("0x02")
+        self.w3.eth.get_transaction_count.return_value = 8
+        self.w3.eth.get_logs.side_effect = [[], [bulk_transfer_log(2)]]
+        self.assertTrue(self.payout().run(RECIPIENTS, AMOUNTS, self.upload))
+        self.assertEqual(self.sent, [])
+
+    def test_default_store_survives_restarts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with patch("hmt_escrow.payouts.PAYOUT_PROGRESS_DIR", directory):
+                store = default_progress_store()
+                self.assertIsInstance(store, FileProgressStore)
+                self.assertEqual(store.directory, directory)
+        with patch("hmt_escrow.payouts.PAYOUT_PROGRESS_DIR", ""):
+            self.assertIsInstance(default_progress_store(), MemoryProgressStore)
+
+    def test_file_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = FileProgressStore(directory)
+            self.assertIsNone(store.load("key"))
+            store.save("key", {"chunks": [{"tx_id": 1}]})
+            self.assertEqual(
+                FileProgressStore(directory).load("key"), {"chunks": [{"tx_id": 1}]}
+            )
+            store.delete("key")
+            self.assertIsNone(store.load("key"))
+
+    def test_stores_implement_every_method(self):
+        class LoadOnlyStore(ProgressStore):
+            def load(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            LoadOnlyStore()
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,241 @@
+import os
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+from web3.providers import HTTPProvider, WebsocketProvider
+
+from hmt_escrow.eth_bridge import get_w3
+from hmt_escrow.logs import _WATCHERS, get_log_watcher
+from hmt_escrow.nonce import clear_nonce_managers, get_nonce_manager
+from hmt_escrow.receipts import _WAITERS, get_receipt_waiter
+from hmt_escrow.providers import (
+    CompositeProvider,
+    ProviderRegistry,
+    apply_middleware_profile,
+    build_provider,
+    REGISTRY,
+)
+
+
+class ProvidersTestCase(unittest.TestCase):
+    def setUp(self):
+        REGISTRY.clear()
+
+    def tearDown(self):
+        REGISTRY.clear()
+
+    def test_get_w3_is_shared_per_endpoint(self):
+        w3 = get_w3("http://localhost:8545")
+        self.assertIs(get_w3("http://localhost:8545"), w3)
+        self.assertIsNot(get_w3("http://127.0.0.1:8545"), w3)
+
+    def test_get_w3_defaults_to_env_endpoint(self):
+        with patch.dict(os.environ, {"HMT_ETH_SERVER": "http://ganache:8545"}):
+            w3 = get_w3()
+        self.assertEqual(w3.provider.endpoint_uri, "http://ganache:8545")
+        self.assertIs(get_w3("http://ganache:8545"), w3)
+
+    def test_geth_poa_middleware_injected_once(self):
+        w3 = get_w3("http://localhost:8545")
+        middleware_count = len(w3.middleware_onion)
+        self.assertIn(geth_poa_middleware, w3.middleware_onion)
+        self.assertEqual(
+            len(get_w3("http://localhost:8545").middleware_onion), middleware_count
+        )
+
+    def test_http_provider_pool_size(self):
+        provider = build_provider("http://localhost:8545", pool_size=32)
+        self.assertIsInstance(provider, HTTPProvider)
+
+        from web3._utils.request import _get_session
+
+        session = _get_session(provider.endpoint_uri)
+        self.assertEqual(session.get_adapter("http://localhost")._pool_maxsize, 32)
+        self.assertEqual(session.headers["Connection"], "keep-alive")
+
+        build_provider("http://localhost:8545", keep_alive=0)
+        session = _get_session(provider.endpoint_uri)
+        self.assertEqual(session.headers["Connection"], "close")
+
+    def test_websocket_provider_keep_alive(self):
+        provider = build_provider("ws://localhost:8546", keep_alive=15)
+        self.assertIsInstance(provider, WebsocketProvider)
+        self.assertEqual(provider.conn.websocket_kwargs["ping_interval"], 15)
+
+    def test_configure_drops_connections(self):
+        registry = ProviderRegistry(pool_size=1)
+        w3 = registry.get("http://localhost:8545")
+        registry.configure(pool_size=4)
+        self.assertEqual(registry.pool_size, 4)
+        self.assertIsNot(registry.get("http://localhost:8545"), w3)
+
+    def test_clear_drops_helpers_of_web3_instances(self):
+        cleared = []
+        registry = ProviderRegistry()
+        registry.on_clear(lambda: cleared.append(True))
+        registry.configure(pool_size=4)
+        self.assertEqual(cleared, [True])
+
+        w3 = get_w3("http://localhost:8545")
+        get_receipt_waiter(w3)
+        get_log_watcher(w3)
+        REGISTRY.configure(pool_size=4)
+        self.assertNotIn(w3, _WAITERS)
+        self.assertNotIn(w3, _WATCHERS)
+
+    def test_nonce_managers_follow_the_registry(self):
+        clear_nonce_managers()
+        w3 = get_w3("http://localhost:8545")
+        manager = get_nonce_manager(w3, "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92")
+        REGISTRY.clear()
+        new_w3 = get_w3("http://localhost:8545")
+        self.assertIs(
+            get_nonce_manager(new_w3, "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"),
+            manager,
+        )
+        self.assertIs(manager.w3, new_w3)
+        clear_nonce_managers()
+
+    def test_comma_separated_endpoints(self):
+        w3 = get_w3("http://node-a:8545, http://node-b:8545")
+        self.assertIsInstance(w3.provider, CompositeProvider)
+        self.assertEqual(
+            w3.provider.endpoints, ["http://node-a:8545", "http://node-b:8545"]
+        )
+        self.assertIsInstance(w3.provider.providers[1], HTTPProvider)
+
+    def test_lean_middleware_profile(self):
+        w3 = ProviderRegistry(profile="lean").get("http://localhost:8545")
+        self.assertNotIn(geth_poa_middleware, w3.middleware_onion)
+        for name in ("name_to_address", "attrdict", "validation", "gas_estimate"):
+            self.assertNotIn(name, w3.middleware_onion)
+        for name in ("request_param_normalizer", "pythonic", "abi"):
+            self.assertIn(name, w3.middleware_onion)
+
+    def test_custom_middleware_profile(self):
+        registry = ProviderRegistry(profile="custom", middlewares=["geth_poa", "abi"])
+        w3 = registry.get("http://localhost:8545")
+        self.assertIn(geth_poa_middleware, w3.middleware_onion)
+        self.assertIn("abi", w3.middleware_onion)
+        self.assertEqual(len(w3.middleware_onion), 2)
+
+        with self.assertRaises(ValueError):
+            apply_middleware_profile(Web3(), "custom", ["ens"])
+        with self.assertRaises(ValueError):
+            registry.configure(profile="minimal")
+
+
+class FakeNode(object):
+    def __init__(self, head: int, latency: float = 0.0):
+        self.head = head
+        self.latency = latency
+        self.down = False
+        self.error = None
+        self.calls = []
+
+    def make_request(self, method, params):
+        self.calls.append(method)
+        if self.down:
+            raise ConnectionError("node down")
+        if self.error is not None:
+            return {"jsonrpc": "2.0", "id": 1, "error": self.error}
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 1, "result": hex(self.head)}
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x0"}
+
+
+class CompositeProviderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.nodes = [FakeNode(100), FakeNode(100), FakeNode(100)]
+        self.provider = CompositeProvider(
+            ["http://a", "http://b", "http://c"],
+            max_lag=3,
+            head_check_interval=3600,
+            error_cooldown=3600,
+            providers=self.nodes,
+        )
+        # Node b answers fastest, then c, then a.
+        for stats, latency in zip(self.provider.stats, (0.3, 0.1, 0.2)):
+            stats.latency = latency
+        self.provider._check_heads()
+        for node in self.nodes:
+            node.calls.clear()
+
+    def calls(self, method):
+        return [node.calls.count(method) for node in self.nodes]
+
+    def test_reads_go_to_fastest_node(self):
+        self.provider.make_request("eth_call", [])
+        self.assertEqual(self.calls("eth_call"), [0, 1, 0])
+        self.assertEqual(self.calls("eth_blockNumber"), [0, 0, 0])
+
+    def test_writes_stick_to_first_node(self):
+        self.provider.make_request("eth_sendRawTransaction", ["0x00"])
+        self.provider.make_request("eth_getTransactionCount", ["0x00", "pending"])
+        self.assertEqual(self.calls("eth_sendRawTransaction"), [1, 0, 0])
+        self.assertEqual(self.calls("eth_getTransactionCount"), [1, 0, 0])
+
+    def test_fails_over_and_skips_failing_node(self):
+        self.nodes[1].down = True
+        self.provider.make_request("eth_call", [])
+        self.assertEqual(self.calls("eth_call"), [0, 1, 1])
+        self.assertGreater(self.provider.stats[1].error_rate, 0)
+
+        self.provider.make_request("eth_call", [])
+        self.assertEqual(self.calls("eth_call"), [0, 1, 2])
+
+    def test_raises_when_all_nodes_fail(self):
+        for node in self.nodes:
+            node.down = True
+        with self.assertRaises(ConnectionError):
+            self.provider.make_request("eth_call", [])
+
+    def test_lagging_node_ejected_until_it_catches_up(self):
+        self.nodes[1].head = 90
+        self.provider._check_heads()
+        self.provider.make_request("eth_call", [])
+        self.assertTrue(self.provider.stats[1].lagging)
+        self.assertEqual(self.calls("eth_call"), [0, 0, 1])
+
+        self.nodes[1].head = 99
+        self.provider._check_heads()
+        self.provider.make_request("eth_call", [])
+        self.assertFalse(self.provider.stats[1].lagging)
+        self.assertEqual(self.calls("eth_call"), [0, 1, 1])
+
+    def test_heads_are_checked_in_background(self):
+        self.provider.head_check_interval = 0.01
+        self.nodes[1].head = 90
+        self.provider.make_request("eth_call", [])
+        self.assertEqual(self.calls("eth_blockNumber"), [0, 0, 0])
+        for _ in range(1000):
+            if self.provider.stats[1].lagging:
+                break
+            time.sleep(0.001)
+        self.assertTrue(self.provider.stats[1].lagging)
+        self.assertEqual(self.provider._head_checker.name, "hmt-head-check")
+
+    def test_error_responses_are_counted(self):
+        self.nodes[1].error = {"code": -32000, "message": "execution reverted"}
+        response = self.provider.make_request("eth_call", [])
+        self.assertIn("error", response)
+        self.assertGreater(self.provider.stats[1].error_rate, 0)
+        self.assertTrue(self.provider.stats[1].healthy(time.monotonic()))
+
+        self.nodes[1].error = {"code": -32005, "message": "limit exceeded"}
+        self.provider.make_request("eth_call", [])
+        self.assertFalse(self.provider.stats[1].healthy(time.monotonic()))
+        self.provider.make_request("eth_call", [])
+        self.assertEqual(self.calls("eth_call"), [0, 2, 1])
+
+    def test_is_connected(self):
+        self.nodes[0].isConnected = MagicMock(return_value=False)
+        self.nodes[1].isConnected = MagicMock(return_value=True)
+        self.assertTrue(self.provider.isConnected())
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
@@ -0,0 +1,74 @@
+import unittest
+from time import sleep
+from unittest.mock import MagicMock
+
+from web3.exceptions import TransactionNotFound
+
+from hmt_escrow.receipts import (
+    ReceiptWaiter,
+    clear_receipt_waiters,
+    get_receipt_waiter,
+)
+
+TXN_A = b"\x0a" * 32
+TXN_B = b"\x0b" * 32
+TXN_C = b"\x0c" * 32
+
+
+class ReceiptWaiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.w3 = MagicMock()
+        self.w3.eth.block_number = 10
+        self.blocks = {11: {"transactions": [TXN_A, TXN_B]}}
+        self.w3.eth.get_block.side_effect = lambda number: self.blocks[number]
+        self.mined = {}
+        self.w3.eth.get_transaction_receipt.side_effect = self.receipt
+        self.waiter = ReceiptWaiter(self.w3, poll_interval=0.01)
+
+    def receipt(self, txn_hash):
+        if txn_hash not in self.mined:
+            raise TransactionNotFound(txn_hash)
+        return {"blockHash": b"1", "transactionHash": txn_hash}
+
+    def test_resolves_from_new_blocks(self):
+        futures = [self.waiter.watch(txn_hash) for txn_hash in (TXN_A, TXN_B)]
+        self.assertIs(self.waiter.watch(TXN_A), futures[0])
+        while (
+            self.waiter._last_block is None
+            or self.w3.eth.get_transaction_receipt.call_count < 2
+        ):
+            sleep(0.001)
+
+        self.mined = {TXN_A, TXN_B}
+        self.w3.eth.block_number = 11
+        receipts = [future.result(1) for future in futures]
+        self.assertEqual([r["transactionHash"] for r in receipts], [TXN_A, TXN_B])
+
+        # Every transaction was looked up at most when it started being
+        # watched and once more when its block came in, the block was read once.
+        self.assertLessEqual(self.w3.eth.get_transaction_receipt.call_count, 4)
+        self.w3.eth.get_block.assert_called_once_with(11)
+        self.assertEqual(self.waiter.waiting, 0)
+
+    def test_resolves_transactions_mined_before_watching(self):
+        self.mined = {TXN_C}
+        future = self.waiter.watch(TXN_C)
+        self.assertEqual(future.result(1)["transactionHash"], TXN_C)
+        self.w3.eth.get_block.assert_not_called()
+
+    def test_forget_cancels_future(self):
+        future = self.waiter.watch(TXN_A)
+        self.waiter.forget(TXN_A)
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self.waiter.waiting, 0)
+
+    def test_get_receipt_waiter_is_shared(self):
+        clear_receipt_waiters()
+        waiter = get_receipt_waiter(self.w3)
+        self.assertIs(get_receipt_waiter(self.w3), waiter)
+        self.assertIsNot(get_receipt_waiter(MagicMock()), waiter)
+        clear_receipt_waiters()
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)
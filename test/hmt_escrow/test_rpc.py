@@ -0,0 +1,92 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+
+from hmt_escrow.eth_bridge import get_contract
+from hmt_escrow.kvstore_abi import abi as kvstore_abi
+from hmt_escrow.rpc import batch_call
+
+GAS_PAYER = "0x1413862C2B7054CDbfdc181B83962CB0FC11fD92"
+KVSTORE = "0xbcF8274FAb0cbeD0099B2cAFe862035a6217Bf44"
+
+
+def encoded(w3, value):
+    return "0x" + w3.codec.encode_abi(["string"], [value]).hex().replace("0x", "")
+
+
+class BatchCallTestCase(unittest.TestCase):
+    def setUp(self):
+        self.w3 = Web3(Web3.HTTPProvider("http://localhost:8545"))
+        self.kvstore = get_contract("KVStore", KVSTORE, kvstore_abi)
+        self.functions = [
+            self.kvstore.functions.get(GAS_PAYER, key) for key in ("a", "b", "c")
+        ]
+
+    def reply(self, response):
+        patcher = patch("hmt_escrow.rpc.make_post_request")
+        post = patcher.start()
+        self.addCleanup(patcher.stop)
+        post.side_effect = lambda uri, data, **kwargs: json.dumps(
+            response(json.loads(data))
+        ).encode()
+        return post
+
+    def test_one_request_for_all_calls(self):
+        # The node may answer the batch out of order.
+        post = self.reply(
+            lambda requests: [
+                {"jsonrpc": "2.0", "id": request["id"], "result": encoded(self.w3, v)}
+                for request, v in reversed(list(zip(requests, ["a", "b", "c"])))
+            ]
+        )
+        results = batch_call(self.w3, self.functions, GAS_PAYER, 100000)
+
+        self.assertEqual(results, ["a", "b", "c"])
+        post.assert_called_once()
+        requests = json.loads(post.call_args[0][1])
+        self.assertEqual([r["method"] for r in requests], ["eth_call"] * 3)
+        self.assertEqual(requests[0]["params"][0]["to"], KVSTORE)
+        self.assertEqual(requests[0]["params"][0]["gas"], hex(100000))
+
+    def test_failed_call(self):
+        self.reply(
+            lambda requests: [
+                {"jsonrpc": "2.0", "id": 0, "result": encoded(self.w3, "a")},
+                {"jsonrpc": "2.0", "id": 1, "error": {"message": "reverted"}},
+                {"jsonrpc": "2.0", "id": 2, "result": encoded(self.w3, "c")},
+            ]
+        )
+        with self.assertRaises(ContractLogicError):
+            batch_call(self.w3, self.functions, GAS_PAYER, 100000)
+
+        results = batch_call(
+            self.w3, self.functions, GAS_PAYER, 100000, return_exceptions=True
+        )
+        self.assertEqual(results[0], "a")
+        self.assertIsInstance(results[1], ContractLogicError)
+        self.assertEqual(results[2], "c")
+
+    def test_falls_back_without_batch_support(self):
+        self.reply(
+            lambda requests: {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {"message": "batch not supported"},
+            }
+        )
+        eth_call = MagicMock(
+            side_effect=[bytes.fromhex(encoded(self.w3, v)[2:]) for v in "abc"]
+        )
+        with patch.object(self.w3.eth, "call", eth_call):
+            results = batch_call(self.w3, self.functions, GAS_PAYER, 100000)
+
+        self.assertEqual(results, ["a", "b", "c"])
+        self.assertEqual(eth_call.call_count, 3)
+        self.assertEqual(eth_call.call_args[0][0]["gas"], 100000)
+
+
+if __name__ == "__main__":
+    unittest.main(exit=True)